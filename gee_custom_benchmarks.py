@@ -0,0 +1,634 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the gee_custom_utilities pipeline.
+
+Generates synthetic VNP46A2-style HDF5 tiles and matching GeoTIFFs, synthetic
+daily tract CSVs in the layout read by the plotting scripts, and a local fake
+of the Earth Engine server behind time_series_regions_reducer, fc_to_dict and
+delete_collection_contents, so the library functions themselves are timed. Each benchmark reports wall time, throughput and
+peak (Python-allocated) memory over a range of sizes, and the results are
+saved as JSON so runs can be compared:
+
+    python gee_custom_benchmarks.py --output bench.json
+    python gee_custom_benchmarks.py --quick --only analytics reducer
+
+HDF5 conversion benchmarks need h5py and GDAL and are skipped without them. The reducer and assets
+benchmarks need the earthengine-api package, whose bundled algorithm signatures
+let the fake run without credentials or network.
+
+The imports benchmark times a fresh import of the package and of each
+subsystem against IMPORT_BUDGETS; the script exits with status 1 when an
+import goes over its budget.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import gee_custom_utilities as gcu
+
+
+# =============================================================================
+# %% 1 - SYNTHETIC DATA
+# =============================================================================
+
+#Subdatasets of a VNP46A2 tile and their data types
+BM_LAYERS = [('DNB_BRDF-Corrected_NTL', 'uint16'),
+             ('DNB_Lunar_Irradiance', 'uint16'),
+             ('Gap_Filled_DNB_BRDF-Corrected_NTL', 'uint16'),
+             ('Latest_High_Quality_Retrieval', 'uint8'),
+             ('Mandatory_Quality_Flag', 'uint8'),
+             ('QF_Cloud_Mask', 'uint16'),
+             ('Snow_Flag', 'uint8')]
+
+
+def bm_filename(day, h=8, v=5, extension='.h5'):
+    """BUILD A VNP46A2 FILE NAME FOR A DAY OF 2020"""
+
+    return 'VNP46A2.A2020' + '{:03d}'.format(day) + '.h' + '{:02d}'.format(h) + 'v' + '{:02d}'.format(v) + \
+        '.001.2020256150417' + extension
+
+
+def make_hd5_tiles(folder, days, size=240, seed=0):
+    """WRITE SYNTHETIC VNP46A2-STYLE HDF5 TILES
+
+    Args:
+        folder: Str, directory to write the tiles in
+        days: int, number of daily tiles
+        size: int, tile side in pixels (2400 for real tiles)
+        seed: int, random seed
+
+    Returns:
+        paths: List of str, paths of the written tiles
+    """
+
+    import h5py
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for day in range(1, days + 1):
+        path = os.path.join(folder, bm_filename(day))
+        with h5py.File(path, 'w') as f:
+            f.attrs['HorizontalTileNumber'] = np.bytes_('08')
+            f.attrs['VerticalTileNumber'] = np.bytes_('05')
+            fields = f.create_group('HDFEOS/GRIDS/VNP_Grid_DNB/Data Fields')
+            for name, dtype in BM_LAYERS:
+                high = 65535 if dtype == 'uint16' else 255
+                fields.create_dataset(name, data=rng.integers(0, high, (size, size)).astype(dtype))
+        paths.append(path)
+    return paths
+
+
+def make_geotiffs(folder, days, size=240, bands=len(BM_LAYERS), seed=0):
+    """WRITE SYNTHETIC GEOTIFFS ON THE GRID OF TILE h08v05, AS bm_hd5_to_geotiff DOES
+
+    Returns:
+        paths: List of str, paths of the written geotiffs
+    """
+
+    from osgeo import gdal
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for day in range(1, days + 1):
+        path = os.path.join(folder, bm_filename(day, extension='.tif'))
+        dataset = gdal.GetDriverByName('GTiff').Create(path, size, size, bands, gdal.GDT_UInt16)
+        dataset.SetGeoTransform((-100, 10 / size, 0, 40, 0, -10 / size))
+        dataset.SetProjection('EPSG:4326')
+        for band in range(bands):
+            dataset.GetRasterBand(band + 1).WriteArray(rng.integers(0, 5000, (size, size)).astype('uint16'))
+        dataset = None
+        paths.append(path)
+    return paths
+
+
+def make_tract_tables(days=365, tracts=4, seed=0):
+    """BUILD SYNTHETIC TABLES IN THE LAYOUTS READ BY THE PLOTTING SCRIPTS
+
+    Args:
+        days: int, number of days from 2019-12-01
+        tracts: int, number of census tracts
+        seed: int, random seed
+
+    Returns:
+        nightlights: DataFrame like dailyEastPaloAltoAveragesTable.csv (system:index, NAME, mean, median)
+        mobility: DataFrame like the Google mobility county CSV (date and percent change columns)
+        spend: DataFrame like the Replica spend CSV (tract, week_starting, restaurants_bars_spend_fullweek)
+    """
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2019-12-01', periods=days, freq='D')
+    names = [str(6120 + i) for i in range(tracts)]
+
+    nightlights = pd.DataFrame({
+        'system:index': np.tile(dates.strftime('%Y-%m-%d') + '_00000000000000000000', tracts),
+        'NAME': np.repeat(names, days),
+        'mean': rng.gamma(4, 5, days * tracts),
+        'median': rng.gamma(4, 4, days * tracts)})
+
+    mobility = pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'transit_stations_percent_change_from_baseline': rng.normal(-30, 10, days),
+        'workplaces_percent_change_from_baseline': rng.normal(-20, 10, days),
+        'retail_and_recreation_percent_change_from_baseline': rng.normal(-25, 10, days)})
+
+    weeks = pd.date_range('2019-12-30', periods=max(days // 7, 1), freq='7D')
+    spend = pd.DataFrame({
+        'tract': np.repeat([name + '.00' for name in names], len(weeks)),
+        'week_starting': np.tile(weeks.strftime('%m-%d-%Y'), tracts),
+        'restaurants_bars_spend_fullweek': rng.gamma(5, 2000, len(weeks) * tracts)})
+
+    return nightlights, mobility, spend
+
+
+def write_tract_csvs(folder, days=365, tracts=4, seed=0):
+    """WRITE THE SYNTHETIC TRACT TABLES OF make_tract_tables AS CSV FILES
+
+    Returns:
+        paths: Dictionary of 'nightlights', 'mobility' and 'spend' CSV paths
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    for key, table in zip(('nightlights', 'mobility', 'spend'), make_tract_tables(days, tracts, seed)):
+        paths[key] = os.path.join(folder, key + '.csv')
+        table.to_csv(paths[key], index=False)
+    return paths
+
+
+# =============================================================================
+# %% 2 - FAKE EARTH ENGINE BACKEND
+# =============================================================================
+
+class FakeEarthEngine():
+    """LOCAL FAKE OF THE EARTH ENGINE SERVER BEHIND THE REDUCER, FEATURE AND ASSET FUNCTIONS
+
+    install() initializes the ee client offline with the algorithm signatures
+    shipped with the earthengine-api package, and replaces the ee.data calls
+    that reach the server (computeValue, listAssets, deleteAsset) with local
+    stubs. The library functions then build their real expressions, and every
+    getInfo is answered by compute_value from the image collections in images
+    and the tables in tables. Every call sleeps for a fixed round-trip latency
+    plus a per-element cost, and returns payloads shaped like the ones the real
+    calls return. fc_schema and fc_page plug into the schemaFunction and
+    pageFunction arguments of fc_to_batches.
+
+    Args:
+        features: int, number of regions in the reduction geometry
+        latency: float, seconds per request
+        perElement: float, seconds per returned element
+        seed: int, random seed
+    """
+
+    def __init__(self, features=100, latency=0.05, perElement=1e-6, seed=0):
+        self.features = ['tract_' + str(i) for i in range(features)]
+        self.latency = latency
+        self.perElement = perElement
+        self.rng = np.random.default_rng(seed)
+        self.images = {}
+        self.tables = {}
+        self.assets = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def install(self):
+        """INITIALIZE ee OFFLINE AND ROUTE ITS SERVER CALLS TO THIS FAKE"""
+
+        import ee
+        from ee import apitestcase
+
+        ee.Reset()
+        ee.data._install_cloud_api_resource = lambda: None
+        ee.data.getAlgorithms = apitestcase.GetAlgorithms
+        ee.deprecation._FetchDataCatalogStac = lambda: {}
+        ee.Initialize(None, '', project='fake-project')
+        ee.data.computeValue = self.compute_value
+        ee.data.listAssets = self.list_assets
+        ee.data.deleteAsset = self.delete_asset
+
+    def _request(self, elements):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency + elements * self.perElement)
+
+    #Expression evaluation
+    @staticmethod
+    def _name(eeObject):
+        func = getattr(eeObject, 'func', None)
+        return func.getSignature().get('name') if func is not None else None
+
+    def _find(self, eeObject, name):
+        """FIRST CALL OF THE ALGORITHM name IN AN EXPRESSION, DEPTH FIRST"""
+
+        if self._name(eeObject) == name:
+            return eeObject
+        for arg in (getattr(eeObject, 'args', None) or {}).values():
+            found = self._find(arg, name)
+            if found is not None:
+                return found
+        return None
+
+    def _times(self, collection):
+        """system:time_start OF THE IMAGES OF AN IMAGE COLLECTION EXPRESSION, AFTER ITS DATE FILTERS"""
+
+        if self._name(collection) == 'ImageCollection.load':
+            return self.images[collection.args['id']]
+        times = self._times(collection.args['collection'])
+        if self._name(collection) == 'Collection.filter':
+            dateRange = collection.args['filter'].args['leftValue'].args
+            times = [t for t in times if dateRange['start'] <= t < dateRange['end']]
+        return times
+
+    def compute_value(self, eeObject):
+        """ANSWER ee.data.computeValue FOR THE EXPRESSIONS BUILT BY THE LIBRARY FUNCTIONS"""
+
+        name = self._name(eeObject)
+        if name == 'Collection.reduceColumns':
+            #Date range of _collection_date_range
+            times = self._times(eeObject.args['collection'])
+            self._request(2)
+            return {'min': min(times), 'max': max(times)} if times else {'min': None, 'max': None}
+        if name == 'List.get':
+            #Rows of time_series_regions_reducer, with -999999 for nulls
+            times = self._times(self._find(eeObject, 'Collection.reduceColumns').args['collection'])
+            with self.lock:
+                values = self.rng.gamma(4, 5, (len(times), len(self.features)))
+                values[self.rng.random(values.shape) < 0.02] = -999999
+            self._request(values.size + len(times))
+            return [row + [t] for row, t in zip(values.tolist(), times)]
+        if name == 'List.add':
+            #Column names of time_series_regions_reducer
+            self._request(len(self.features) + 1)
+            return self.features + ['system:time_start']
+        if name == 'Dictionary.fromLists':
+            #fc_to_dict, columns named by the first feature
+            fc = self.tables[self._find(eeObject, 'Collection.loadTable').args['tableId']]
+            self._request(sum(len(record) for record in fc))
+            return {name: [record.get(name) for record in fc] for name in fc[0]}
+        if name == 'Collection.size':
+            #Size of the collection emptied by delete_collection_contents
+            self._request(1)
+            return len(self.assets)
+        if name == 'List.map':
+            #Image ids of delete_collection_contents
+            self._request(len(self.assets))
+            return [asset.rsplit('/', 1)[-1] for asset in self.assets]
+        raise NotImplementedError('FakeEarthEngine cannot compute ' + str(name))
+
+    #Flat reducer payload
+    def flat_info(self, times, stats=('mean',)):
+        """PAYLOAD OF THE SINGLE getInfo OF _flat_regions_reducer"""
+
+        rows = []
+        for i, t in enumerate(times):
+            for feature in self.features:
+                for stat in stats:
+                    if self.rng.random() > 0.02:
+                        rows.append(['img' + str(i), feature, stat, float(self.rng.gamma(4, 5))])
+        self._request(len(rows) * 4)
+        return {'rows': rows, 'features': self.features,
+                'images': [['img' + str(i), t] for i, t in enumerate(times)]}
+
+    #FeatureCollection payloads. Records carry system:index like the real features
+    def fc_schema(self, fc, pageSize):
+        self._request(1)
+        return len(fc), sorted(set(key for record in fc[:pageSize] for key in record))
+
+    def fc_page(self, fc, offset, pageSize):
+        page = fc[offset:offset + pageSize]
+        self._request(sum(len(record) for record in page))
+        return page
+
+    #Asset management
+    def list_assets(self, params):
+        offset = int(params.get('pageToken') or 0)
+        page = self.assets[offset:offset + params['pageSize']]
+        self._request(len(page))
+        response = {'assets': [{'name': name} for name in page]}
+        if offset + params['pageSize'] < len(self.assets):
+            response['nextPageToken'] = str(offset + params['pageSize'])
+        return response
+
+    def delete_asset(self, name):
+        self._request(1)
+
+
+# =============================================================================
+# %% 3 - MEASUREMENT
+# =============================================================================
+
+def measure(function, *args, **kwargs):
+    """RUN A FUNCTION ONCE, MEASURING WALL TIME AND PEAK PYTHON-ALLOCATED MEMORY
+
+    The progress the function prints is discarded, so it does not mix into the results table.
+
+    Returns:
+        result: return value of the function
+        seconds: float, wall time
+        peakBytes: int, peak memory traced by tracemalloc during the call
+    """
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peakBytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peakBytes
+
+
+def record(results, benchmark, variant, size, unit, seconds, peakBytes, **extra):
+    """APPEND ONE MEASUREMENT TO THE RESULTS AND PRINT IT"""
+
+    entry = {'benchmark': benchmark, 'variant': variant, 'size': size, 'unit': unit,
+             'seconds': seconds, 'throughput': size / seconds if seconds > 0 else None,
+             'peakBytes': peakBytes}
+    entry.update(extra)
+    results.append(entry)
+    print('{:<12} {:<28} {:>8} {:<8} {:>9.3f} s {:>12.1f} {}/s {:>8.1f} MB'.format(
+        benchmark, variant, size, unit, seconds, entry['throughput'] or 0, unit, peakBytes / 1e6))
+
+
+# =============================================================================
+# %% 4 - BENCHMARKS
+# =============================================================================
+
+def avg_and_change_iterrows(dataf, columnList, periodLength, baselines):
+    """ORIGINAL AvgAndChange LOOP OF THE PLOTTING SCRIPTS, KEPT AS THE BASELINE"""
+
+    dataf_out = dataf
+    for index, row in dataf.iterrows():
+        dfDate = index
+        rollingSet = dataf[(dataf.index > (dfDate - datetime.timedelta(days=(periodLength + 1)))) &
+                        (dataf.index < (dfDate + datetime.timedelta(days=1)))]
+        for entry, baseline in zip(columnList, baselines):
+            rollingAvg = rollingSet[entry].mean()
+            dataf_out.loc[index,'Rolling Average of ' + entry] = rollingAvg
+            dataf_out.loc[index, 'Rolling Average Percent Change of ' + entry] = (rollingAvg - baseline)/baseline
+            dataf_out.loc[index, 'Percent Change of ' + entry] = (row[entry] - baseline)/baseline
+    return dataf_out
+
+
+def bench_analytics(results, quick=False):
+    """ROLLING AVERAGE AND BASELINE CHANGE: ORIGINAL LOOP VERSUS rolling_avg_and_change"""
+
+    sizes = [(90, 1), (365, 1)] if quick else [(90, 1), (365, 1), (730, 1), (365, 50), (1095, 300)]
+    for days, tracts in sizes:
+        nightlights = make_tract_tables(days, tracts)[0]
+        nightlights.index = pd.to_datetime(nightlights['system:index'].str[0:10])
+        window = (datetime.datetime(2020, 1, 2), datetime.datetime(2020, 2, 7))
+        rows = len(nightlights)
+
+        _, seconds, peak = measure(gcu.rolling_avg_and_change, nightlights, ['mean', 'median'], 14,
+                                   baselineWindow=window, groupby='NAME')
+        record(results, 'analytics', 'rolling_avg_and_change', rows, 'rows', seconds, peak, tracts=tracts)
+
+        #The quadratic loop is only run on single-tract sizes it can finish
+        if tracts == 1 and days <= 730:
+            single = nightlights.drop(columns='NAME')
+            _, seconds, peak = measure(avg_and_change_iterrows, single.copy(), ['mean', 'median'], 14, [20.0, 16.0])
+            record(results, 'analytics', 'AvgAndChange iterrows', rows, 'rows', seconds, peak, tracts=tracts)
+
+
+def bench_reducer(results, quick=False):
+    """REDUCER DATAFRAME ASSEMBLY: SINGLE REQUEST, DATE-CHUNKED REQUESTS AND FLAT PIVOT"""
+
+    try:
+        import ee
+    except ImportError:
+        print('reducer      skipped, ee is required')
+        return
+
+    sizes = [(365, 50)] if quick else [(365, 50), (1095, 200), (2190, 500)]
+    for days, features in sizes:
+        fake = FakeEarthEngine(features=features)
+        fake.install()
+        start = int(pd.Timestamp('2018-01-01').value // 10**6)
+        fake.images['projects/fake/assets/daily'] = [start + day * 86400000 for day in range(days)]
+        imgcol = ee.ImageCollection('projects/fake/assets/daily')
+        geometry = ee.FeatureCollection('projects/fake/assets/tracts')
+
+        _, seconds, peak = measure(gcu.time_series_regions_reducer, imgcol, ['DNB'], geometry, FeatureID='NAME')
+        record(results, 'reducer', 'single request', days, 'images', seconds, peak, features=features)
+
+        for workers in ([4] if quick else [1, 4, 8]):
+            _, seconds, peak = measure(gcu.time_series_regions_reducer_chunked, imgcol, ['DNB'], geometry,
+                                       dateChunks='QS', workers=workers, FeatureID='NAME')
+            record(results, 'reducer', 'chunked QS workers=' + str(workers), days, 'images', seconds, peak,
+                   features=features)
+
+        info = fake.flat_info(fake.images['projects/fake/assets/daily'])
+        _, seconds, peak = measure(gcu._pivot_flat_rows, info, ['mean'], ['mean'], singleLevel=True)
+        record(results, 'reducer', 'flat rows pivot', days, 'images', seconds, peak, features=features)
+
+
+def check_fc_paging(fake, tableId, pageSize):
+    """CHECK THAT THE PAGED FEATURECOLLECTION EXPORTS MATCH THE SINGLE-REQUEST fc_to_dict OUTPUT
+
+    Raises AssertionError when fc_to_dataframe or fc_to_dict_async(pageSize=...) lose
+    or change a column of the unpaged export, e.g. system:index.
+    """
+
+    import asyncio
+    import ee
+
+    table = fake.tables[tableId]
+    unpaged = gcu.fc_to_dict(ee.FeatureCollection(tableId)).getInfo()
+    paged = gcu.fc_to_dataframe(table, pageSize=pageSize, schemaFunction=fake.fc_schema, pageFunction=fake.fc_page)
+    pd.testing.assert_frame_equal(paged[sorted(unpaged)], pd.DataFrame(unpaged)[sorted(unpaged)])
+
+    pagedDict = asyncio.run(gcu.fc_to_dict_async(table, pageSize=pageSize, schemaFunction=fake.fc_schema,
+                                                 pageFunction=fake.fc_page))
+    assert pagedDict == unpaged, 'fc_to_dict_async(pageSize=...) does not match fc_to_dict'
+
+
+def bench_assets(results, quick=False):
+    """ASSET MANAGEMENT LOOPS: COLLECTION DELETION AND FEATURECOLLECTION EXPORT"""
+
+    try:
+        import ee
+    except ImportError:
+        print('assets       skipped, ee is required')
+        return
+
+    #delete_collection_contents sleeps 0.5 s per asset, so it only deletes the first assets
+    serialSize = 10
+    sizes = [200] if quick else [200, 2000, 20000]
+    for size in sizes:
+        fake = FakeEarthEngine(latency=0.002)
+        fake.install()
+        fake.assets = ['projects/fake/assets/collection/img' + str(i) for i in range(size)]
+
+        if size == sizes[0]:
+            assets = fake.assets
+            fake.assets = assets[:serialSize]
+            _, seconds, peak = measure(gcu.delete_collection_contents, 'projects/fake/assets/collection')
+            record(results, 'assets', 'serial delete', serialSize, 'assets', seconds, peak)
+            fake.assets = assets
+
+        _, seconds, peak = measure(gcu.delete_collection_contents_batched, 'projects/fake/assets/collection',
+                                   workers=16, rate=10000)
+        record(results, 'assets', 'batched delete workers=16', size, 'assets', seconds, peak)
+
+        table = [{'system:index': str(i), 'NAME': 'tract_' + str(i), 'mean': float(i), 'median': float(i) / 2,
+                  'day': i % 365} for i in range(size * 10)]
+        fake.tables['projects/fake/assets/table'] = table
+        check_fc_paging(fake, 'projects/fake/assets/table', pageSize=5000)
+        _, seconds, peak = measure(lambda: sum(len(batch) for batch in gcu.fc_to_batches(
+            table, pageSize=5000, schemaFunction=fake.fc_schema, pageFunction=fake.fc_page)))
+        record(results, 'assets', 'fc_to_batches', size * 10, 'features', seconds, peak)
+
+
+def bench_conversion(results, quick=False):
+    """HDF5 TO GEOTIFF CONVERSION: gdal_merge.py PATH, IN-MEMORY PATH AND PROCESS POOL"""
+
+    try:
+        import h5py
+        from osgeo import gdal
+    except ImportError:
+        print('conversion   skipped, h5py and GDAL are required')
+        return
+
+    sizes = [4] if quick else [4, 16]
+    for days in sizes:
+        workdir = tempfile.mkdtemp(prefix='bm_bench_')
+        try:
+            hd5Folder = os.path.join(workdir, 'hd5')
+            make_hd5_tiles(hd5Folder, days, size=240 if quick else 1200)
+            variants = [('gdal_merge serial', {}),
+                        ('in-memory serial', {'inMemory': True}),
+                        ('in-memory workers=4', {'inMemory': True, 'workers': 4}),
+                        ('in-memory deflate cog', {'inMemory': True, 'compress': 'DEFLATE', 'cog': True})]
+            if shutil.which('gdal_merge.py') is None:
+                variants = variants[1:]
+            for variant, options in variants:
+                geotiffFolder = os.path.join(workdir, 'tif_' + str(len(results)))
+                os.makedirs(geotiffFolder)
+                converted, seconds, peak = measure(gcu.bm_hd5_to_geotiff, hd5Folder, geotiffFolder, **options)
+                outputBytes = sum(os.path.getsize(os.path.join(geotiffFolder, name)) for name in os.listdir(geotiffFolder))
+                failed = sum(1 for result in converted if result[2] is not None)
+                record(results, 'conversion', variant, days, 'files', seconds, peak,
+                       outputBytes=outputBytes, failed=failed)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+#Import-time budgets in seconds, for a fresh interpreter. The package itself and
+#the subsystems without third-party dependencies must stay near-instant
+IMPORT_BUDGETS = {'gee_custom_utilities': 0.05,
+                  'gee_custom_utilities.instrumentation': 0.05,
+                  'gee_custom_utilities.assets': 0.1,
+                  'gee_custom_utilities.analysis': 1.0,
+                  'gee_custom_utilities.blackmarble': 1.0,
+                  'gee_custom_utilities.bm_names': 0.05,
+                  'gee_custom_utilities.zonal': 1.5,
+                  'gee_custom_utilities.cube': 1.5,
+                  'gee_custom_utilities.ee_processing': 2.0,
+                  'gee_custom_utilities.display': 2.5,
+                  'gee_custom_utilities.pipeline': 0.1,
+                  'gee_custom_utilities.ee_async': 0.1}
+
+#Third-party modules reported as loaded by each import
+HEAVY_MODULES = ['ee', 'folium', 'pandas', 'numpy', 'osgeo', 'dateutil']
+
+IMPORT_PROBE = '''import sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(seconds, ' '.join(name for name in {heavy} if name in sys.modules))
+'''
+
+
+def bench_imports(results, quick=False):
+    """IMPORT TIME OF THE PACKAGE AND EACH SUBSYSTEM IN A FRESH INTERPRETER, AGAINST IMPORT_BUDGETS"""
+
+    repeats = 1 if quick else 5
+    packageFolder = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=packageFolder + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    for module, budget in IMPORT_BUDGETS.items():
+        timings = []
+        for _ in range(repeats):
+            completed = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+            if completed.returncode != 0:
+                break
+            seconds, _, loaded = completed.stdout.decode().strip().partition(' ')
+            timings.append(float(seconds))
+        if not timings:
+            print('imports      skipped ' + module + ', ' + completed.stderr.decode().strip().splitlines()[-1])
+            continue
+
+        #Best of the repeats, the least disturbed by the machine
+        seconds = min(timings)
+        record(results, 'imports', module.replace('gee_custom_utilities', 'gcu'), 1, 'imports', seconds, 0,
+               budgetSeconds=budget, overBudget=seconds > budget, loaded=loaded.split())
+        if seconds > budget:
+            print('imports      OVER BUDGET ' + module + ': ' + str(round(seconds, 3)) + ' s > ' + str(budget) + ' s')
+
+
+BENCHMARKS = {'imports': bench_imports,
+              'analytics': bench_analytics,
+              'reducer': bench_reducer,
+              'assets': bench_assets,
+              'conversion': bench_conversion}
+
+
+def run(only=None, quick=False, output=None):
+    """RUN THE BENCHMARKS AND OPTIONALLY SAVE THE RESULTS AS JSON
+
+    Args:
+        only: List of str, names of the benchmarks to run (keys of BENCHMARKS). If None, all are run
+        quick: Boolean, run only the smallest sizes
+        output: Str, path of the JSON file to write
+
+    Returns:
+        report: Dictionary with run metadata and the list of measurements
+    """
+
+    results = []
+    for name, benchmark in BENCHMARKS.items():
+        if only is None or name in only:
+            benchmark(results, quick=quick)
+
+    report = {'timestamp': datetime.datetime.now().isoformat(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'cpus': os.cpu_count(),
+              'numpy': np.__version__,
+              'pandas': pd.__version__,
+              'quick': quick,
+              'results': results}
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=1)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='path of the JSON file to write the results to')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--quick', action='store_true', help='run only the smallest sizes')
+    arguments = parser.parse_args()
+    report = run(only=arguments.only, quick=arguments.quick, output=arguments.output)
+    sys.exit(1 if any(result.get('overBudget') for result in report['results']) else 0)
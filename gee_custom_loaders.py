@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Typed loaders for the tables read by the plotting scripts.
+
+Covers the daily nightlights averages exported from Earth Engine, the Google
+mobility county CSVs and the Replica spend CSVs. Each loader reads the CSV
+with explicit dtypes, parses dates in one vectorized pass, stores tract IDs
+as categoricals and returns a table indexed by 'Date'. The parsed table is
+cached as Parquet next to the source (<csv>.parquet, with a <csv>.parquet.json
+sidecar) and rebuilt when the source changes:
+
+    import gee_custom_loaders as gcl
+    df = gcl.load_nightlights('dailyEastPaloAltoAveragesTable.csv')
+    dfMob = gcl.load_replica_spend('replica_spend.csv')
+
+The Parquet cache needs pyarrow (or fastparquet). Without it tables are
+parsed on every call.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+#Bump when the parsed layout changes, to invalidate existing caches
+LOADER_VERSION = 1
+
+#Reducer statistic columns of the nightlights exports
+NIGHTLIGHTS_STATISTICS = ['mean', 'median', 'min', 'max', 'stdDev', 'count']
+
+#Region columns of the Google mobility CSVs, stored as categoricals
+MOBILITY_CATEGORIES = ['country_region_code', 'country_region', 'sub_region_1', 'sub_region_2',
+                       'metro_area', 'iso_3166_2_code', 'census_fips_code', 'place_id']
+
+
+# =============================================================================
+# %% 1 - CACHE
+# =============================================================================
+
+def _file_digest(path, blockSize=1 << 20):
+    """COMPUTE THE HEX MD5 DIGEST OF A FILE, READING IT IN BLOCKS"""
+
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(csvPath):
+    """PATHS OF THE PARQUET CACHE AND ITS JSON SIDECAR FOR A SOURCE CSV"""
+
+    return csvPath + '.parquet', csvPath + '.parquet.json'
+
+
+def _read_cache(csvPath, key, hashCheck):
+    """LOAD THE CACHED TABLE OF A CSV IF IT IS STILL VALID
+
+    The cache is valid when it was built by the same loader and options (key)
+    and the source has the same size and mtime. If only the mtime changed and
+    hashCheck is set, the source is hashed and the cache kept if the content
+    is unchanged.
+
+    Args:
+        csvPath: Str, path of the source CSV
+        key: Dictionary, loader name, options and version the cache must match
+        hashCheck: Boolean, compare content hashes when the mtime changed
+
+    Returns:
+        df: Dataframe, the cached table, or None if there is no valid cache
+    """
+
+    parquetPath, metaPath = _cache_paths(csvPath)
+    if not (os.path.exists(parquetPath) and os.path.exists(metaPath)):
+        return None
+    with open(metaPath) as f:
+        meta = json.load(f)
+
+    stat = os.stat(csvPath)
+    if meta.get('key') != key or meta.get('size') != stat.st_size:
+        return None
+    if meta.get('mtime') != stat.st_mtime_ns:
+        if not hashCheck or meta.get('md5') != _file_digest(csvPath):
+            return None
+
+        #Content unchanged, record the new mtime to skip hashing next time
+        meta['mtime'] = stat.st_mtime_ns
+        with open(metaPath, 'w') as f:
+            json.dump(meta, f)
+
+    try:
+        return pd.read_parquet(parquetPath)
+    except ImportError:
+        return None
+
+
+def _write_cache(csvPath, key, df):
+    """SAVE A PARSED TABLE AS PARQUET NEXT TO ITS SOURCE CSV
+
+    Silently skipped when no Parquet engine is installed or the source
+    directory is read-only.
+    """
+
+    parquetPath, metaPath = _cache_paths(csvPath)
+    stat = os.stat(csvPath)
+    meta = {'key': key, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'md5': _file_digest(csvPath)}
+    try:
+        df.to_parquet(parquetPath + '.tmp')
+        os.replace(parquetPath + '.tmp', parquetPath)
+        with open(metaPath, 'w') as f:
+            json.dump(meta, f)
+    except (ImportError, OSError):
+        if os.path.exists(parquetPath + '.tmp'):
+            os.remove(parquetPath + '.tmp')
+
+
+def _cached_load(csvPath, parser, key, cache, hashCheck):
+    """RETURN THE CACHED TABLE OF A CSV, PARSING AND CACHING IT IF NEEDED"""
+
+    csvPath = os.path.abspath(csvPath)
+    if cache:
+        df = _read_cache(csvPath, key, hashCheck)
+        if df is not None:
+            return df
+    df = parser(csvPath)
+    if cache:
+        _write_cache(csvPath, key, df)
+    return df
+
+
+def clear_cache(csvPath):
+    """DELETE THE PARQUET CACHE OF A SOURCE CSV
+
+    Args:
+        csvPath: Str, path of the source CSV
+
+    Returns:
+        N/A
+    """
+
+    for path in _cache_paths(os.path.abspath(csvPath)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# =============================================================================
+# %% 2 - LOADERS
+# =============================================================================
+
+def _header(csvPath):
+    """READ THE COLUMN NAMES OF A CSV"""
+
+    return list(pd.read_csv(csvPath, nrows=0).columns)
+
+
+def load_nightlights(csvPath, tractColumn='NAME', cache=True, hashCheck=True):
+    """LOAD A DAILY NIGHTLIGHTS AVERAGES TABLE EXPORTED FROM EARTH ENGINE
+
+    Args:
+        csvPath: Str, path of the CSV, e.g. dailyEastPaloAltoAveragesTable.csv
+        tractColumn: Str, column of region names, stored as a categorical. Ignored
+            if the table has no such column (e.g. county-wide averages)
+        cache: Boolean, read and write the Parquet cache next to the CSV
+        hashCheck: Boolean, keep the cache when only the mtime of the CSV changed
+            but its content hash did not
+
+    Returns:
+        df: Dataframe indexed by 'Date' (from the first 10 characters of system:index),
+            sorted by date, with float64 statistic columns
+    """
+
+    def parse(path):
+        columns = _header(path)
+        dtypes = {column: 'float64' for column in NIGHTLIGHTS_STATISTICS if column in columns}
+        dtypes['system:index'] = 'str'
+        if tractColumn in columns:
+            dtypes[tractColumn] = 'category'
+        df = pd.read_csv(path, dtype=dtypes)
+        df['Date'] = pd.to_datetime(df['system:index'].str[0:10], format='%Y-%m-%d')
+        return df.set_index('Date').sort_index(kind='stable')
+
+    key = {'loader': 'nightlights', 'tractColumn': tractColumn, 'version': LOADER_VERSION}
+    return _cached_load(csvPath, parse, key, cache, hashCheck)
+
+
+def load_mobility(csvPath, cache=True, hashCheck=True):
+    """LOAD A GOOGLE COMMUNITY MOBILITY REPORT CSV
+
+    Args:
+        csvPath: Str, path of the CSV, e.g. santaClara_county_full.csv
+        cache: Boolean, read and write the Parquet cache next to the CSV
+        hashCheck: Boolean, keep the cache when only the mtime of the CSV changed
+            but its content hash did not
+
+    Returns:
+        df: Dataframe indexed by 'Date', sorted by date, with categorical region
+            columns and float64 *_percent_change_from_baseline columns
+    """
+
+    def parse(path):
+        columns = _header(path)
+        dtypes = {column: 'category' for column in MOBILITY_CATEGORIES if column in columns}
+        dtypes.update({column: 'float64' for column in columns if column.endswith('_percent_change_from_baseline')})
+        df = pd.read_csv(path, dtype=dtypes)
+        df['Date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+        return df.drop(columns='date').set_index('Date').sort_index(kind='stable')
+
+    key = {'loader': 'mobility', 'version': LOADER_VERSION}
+    return _cached_load(csvPath, parse, key, cache, hashCheck)
+
+
+def load_replica_spend(csvPath, nameLength=4, cache=True, hashCheck=True):
+    """LOAD A REPLICA SPEND-BY-TRACT CSV
+
+    Args:
+        csvPath: Str, path of the CSV, e.g. ..._spend-by-merchant-location_in-person-spend_tract_-full-week_...csv
+        nameLength: int, number of leading characters of the tract ID giving the tract
+            NAME used in the nightlights export (e.g. '6120.00' -> '6120'), added as a
+            categorical 'NAME' column. If None, no NAME column is added
+        cache: Boolean, read and write the Parquet cache next to the CSV
+        hashCheck: Boolean, keep the cache when only the mtime of the CSV changed
+            but its content hash did not
+
+    Returns:
+        df: Dataframe indexed by 'Date' (from week_starting), sorted by date, with a
+            categorical 'tract' column and float64 spend columns
+    """
+
+    def parse(path):
+        columns = _header(path)
+        dtypes = {column: 'float64' for column in columns if '_spend' in column}
+        dtypes['tract'] = 'str'
+        df = pd.read_csv(path, dtype=dtypes)
+        df['Date'] = pd.to_datetime(df['week_starting'], format='%m-%d-%Y')
+        if nameLength is not None:
+            df['NAME'] = df['tract'].str[0:nameLength].astype('category')
+        df['tract'] = df['tract'].astype('category')
+        return df.drop(columns='week_starting').set_index('Date').sort_index(kind='stable')
+
+    key = {'loader': 'replica_spend', 'nameLength': nameLength, 'version': LOADER_VERSION}
+    return _cached_load(csvPath, parse, key, cache, hashCheck)
+
+
+def split_tracts(df, tractColumn='NAME', tracts=None):
+    """SPLIT A LOADED TABLE INTO ONE TABLE PER TRACT
+
+    Args:
+        df: Dataframe, table returned by one of the loaders
+        tractColumn: Str, categorical column of tract IDs
+        tracts: List of str, tracts to return, in order. If None, every tract
+            present in the table, in order of the categories
+
+    Returns:
+        tractTables: Dictionary of tract ID to Dataframe, indexed by 'Date'
+    """
+
+    groups = {str(tract): group for tract, group in df.groupby(tractColumn, observed=True, sort=True)}
+    if tracts is None:
+        return groups
+    return {str(tract): groups.get(str(tract), df.iloc[0:0]) for tract in tracts}
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless small-multiples plots comparing nightlights with spend or mobility.
+
+Renders the twin-axis comparison of the plotting scripts for any number of
+tracts, as paged grids of panels written to PNG and/or PDF. Figures are drawn
+with matplotlib's object API and the Agg canvas, without pyplot, so no display
+is needed and pages can be rendered in parallel on a process pool:
+
+    import datetime
+    import gee_custom_utilities as gcu
+    import gee_custom_plots as gcp
+    aligned = gcu.align_tract_series(nightlights, [(spend, {'restaurants_bars_spend_fullweek': 'Transactions'})])
+    changes = gcu.rolling_avg_and_change(aligned.reset_index(level=0), ['median', 'Transactions'], 14,
+                                         baselineWindow=(datetime.datetime(2019, 12, 31), datetime.datetime(2020, 3, 1)),
+                                         groupby='NAME')
+    df = changes.set_index('NAME', append=True).swaplevel()
+    gcp.plot_tract_comparisons(df, 'figures/', 'Rolling Average Percent Change of median',
+                               'Rolling Average Percent Change of Transactions', workers=8, formats=('png', 'pdf'))
+
+Percent changes are fractions of the baseline and fit the default ylim=(-1, 1);
+pass ylim=None to plot raw columns such as 'Transactions'.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def _tract_pages(df, leftColumn, rightColumn, tracts, perPage):
+    """SPLIT A TIDY (TRACT, DATE) TABLE INTO PAGES OF PER-TRACT SERIES
+
+    Returns:
+        pages: List of lists of (tract, left series, right series) tuples
+    """
+
+    panels = []
+    for tract in tracts:
+        tractData = df.xs(tract, level=0)
+        panels.append((tract, tractData[leftColumn].dropna(), tractData[rightColumn].dropna()))
+    return [panels[i:i + perPage] for i in range(0, len(panels), perPage)]
+
+
+def _render_tract_page(panels, pagePath, formats, rows, cols, options):
+    """DRAW ONE PAGE OF TWIN-AXIS PANELS AND SAVE IT IN EACH FORMAT
+
+    Args:
+        panels: List of (tract, left series, right series) tuples, at most rows*cols
+        pagePath: Str, output path without extension
+        formats: List of str, file extensions, e.g. ['png', 'pdf']
+        rows: int, number of panel rows
+        cols: int, number of panel columns
+        options: Dictionary of labels, colors, limits and dpi (see plot_tract_comparisons)
+
+    Returns:
+        paths: List of str, written files
+    """
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import matplotlib.dates as mdates
+
+    #Drop empty rows of a partial last page
+    rows = min(rows, -(-len(panels) // cols))
+    fig = Figure(figsize=(cols * options['panelSize'][0], rows * options['panelSize'][1]))
+    FigureCanvasAgg(fig)
+    axs = fig.subplots(rows, cols, squeeze=False)
+
+    for increm, ax in enumerate(axs.flat):
+        if increm >= len(panels):
+            ax.set_axis_off()
+            continue
+        tract, left, right = panels[increm]
+        ax2 = ax.twinx() # Create another axes that shares the same x-axis as ax.
+        ax.plot(left.index, left.to_numpy(), color=options['leftColor'], linestyle='--', label=options['leftLabel'])
+        ax2.plot(right.index, right.to_numpy(), color=options['rightColor'], label=options['rightLabel'])
+        if options['ylim'] is not None:
+            ax.set_ylim(*options['ylim'])
+            ax2.set_ylim(*options['ylim'])
+
+        #Legend on the first panel, axis labels on the outer panels only
+        if increm == 0:
+            lines, labels = ax.get_legend_handles_labels()
+            lines2, labels2 = ax2.get_legend_handles_labels()
+            ax2.legend(lines + lines2, labels + labels2, loc=9)
+        if increm % cols == 0:
+            ax.set_ylabel(options['leftLabel'], size=12)
+        if increm % cols == cols - 1 or increm == len(panels) - 1:
+            ax2.set_ylabel(options['rightLabel'], size=12)
+        if increm + cols >= len(panels):
+            ax.set_xlabel('Date', size=12)
+        locator = mdates.AutoDateLocator(maxticks=6)
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        ax.set_title(options['titlePrefix'] + str(tract))
+
+    fig.tight_layout()
+    paths = []
+    for extension in formats:
+        path = pagePath + '.' + extension
+        fig.savefig(path, dpi=options['dpi'])
+        paths.append(path)
+    return paths
+
+
+def plot_tract_comparisons(df,
+                           outputFolder,
+                           leftColumn,
+                           rightColumn,
+                           tracts=None,
+                           rows=3,
+                           cols=3,
+                           formats=('png',),
+                           workers=4,
+                           filePrefix='tracts',
+                           leftLabel='Nightlights',
+                           rightLabel='Replica Spend',
+                           leftColor='orange',
+                           rightColor='blue',
+                           ylim=(-1, 1),
+                           titlePrefix='Tract ',
+                           panelSize=(5, 3.5),
+                           dpi=150):
+    """RENDER TWIN-AXIS NIGHTLIGHTS COMPARISONS FOR MANY TRACTS AS PAGED GRIDS
+
+    Args:
+        df: tidy DataFrame indexed by (tract, date), e.g. from gee_custom_utilities.align_tract_series.
+            rolling_avg_and_change needs a date index, so apply it per tract on
+            df.reset_index(level=0) with groupby='NAME' and restore the (tract, date) index
+            with set_index('NAME', append=True).swaplevel(), as in the module example
+        outputFolder: Str, directory to write the pages to, created if missing
+        leftColumn: Str, column drawn dashed on the left axis (nightlights)
+        rightColumn: Str, column drawn on the right axis (spend or mobility)
+        tracts: List of str, tracts to plot, in order. If None, every tract in df
+        rows: int, number of panel rows per page
+        cols: int, number of panel columns per page
+        formats: List of str, file formats of each page, 'png' and/or 'pdf'
+        workers: int, number of processes rendering pages. If None, pages are rendered in this process
+        filePrefix: Str, page files are named filePrefix + '_page001.png' etc.
+        leftLabel: Str, left axis label and legend entry
+        rightLabel: Str, right axis label and legend entry
+        leftColor: Str, color of the left series
+        rightColor: Str, color of the right series
+        ylim: Tuple of floats, limits of both y axes, suited to percent changes. If None, each axis
+            is scaled to its data, e.g. for raw spend or radiance columns
+        titlePrefix: Str, panel titles are titlePrefix + tract
+        panelSize: Tuple of floats, width and height of one panel in inches
+        dpi: int, resolution of raster formats
+
+    Returns:
+        paths: List of str, written files in page order
+    """
+
+    if tracts is None:
+        tracts = list(df.index.get_level_values(0).unique())
+    os.makedirs(outputFolder, exist_ok=True)
+    options = {'leftLabel': leftLabel, 'rightLabel': rightLabel, 'leftColor': leftColor, 'rightColor': rightColor,
+               'ylim': ylim, 'titlePrefix': titlePrefix, 'panelSize': panelSize, 'dpi': dpi}
+
+    pages = _tract_pages(df, leftColumn, rightColumn, tracts, rows * cols)
+    pagePaths = [os.path.join(outputFolder, filePrefix + '_page' + '{:03d}'.format(i + 1)) for i in range(len(pages))]
+    results = [None] * len(pages)
+
+    index = 0
+    if workers is None:
+        for i, (panels, pagePath) in enumerate(zip(pages, pagePaths)):
+            results[i] = _render_tract_page(panels, pagePath, formats, rows, cols, options)
+
+            #Report on progress
+            index+=1
+            percentageComplete = index/len(pages)*100
+            print(str(percentageComplete) + "% Complete")
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_render_tract_page, panels, pagePath, formats, rows, cols, options): i
+                       for i, (panels, pagePath) in enumerate(zip(pages, pagePaths))}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+                #Report on progress
+                index+=1
+                percentageComplete = index/len(pages)*100
+                print(str(percentageComplete) + "% Complete")
+
+    return [path for paths in results for path in paths]
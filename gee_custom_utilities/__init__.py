@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon May 10 13:20:12 2021
+
+@author: jackreid
+"""
+
+"""NOTE: The various functions in this module make use of the Google Earth Engine
+Python API (ee) and the Google Cloud command line python application (gsutil).
+
+The first time you use ee, you will be required to authenticate and subsequent times
+will require you initialize prior to calling it. You can see more information on this here:
+https://developers.google.com/earth-engine/guides/python_install
+
+gsutil requires that you log-on to your Google Cloud account for some of the calls
+performed in this modeule. You can do this by running "gsutil config" in a command
+line and following the prompts.
+"""
+
+"""SUBSYSTEMS: The utilities are split into subsystems that are only imported,
+together with their dependencies, the first time one of their names is used:
+
+    display          folium maps of ee images (ee, folium)
+    ee_processing    FeatureCollection export and regions reducers (ee, pandas, numpy)
+    assets           Cloud Storage uploads and collection deletion (ee only to delete)
+    blackmarble      Black Marble HDF5 conversion and import (osgeo.gdal, ee only to import)
+    bm_names         Black Marble file and asset names (standard library only)
+    analysis         rolling averages and tract alignment (pandas, numpy)
+    zonal            local zonal statistics over GeoTIFFs (osgeo, pandas, numpy)
+    cube             memory-mapped GeoTIFF time series cube (osgeo, pandas, numpy)
+    pipeline         streaming convert, upload and ingest (blackmarble, ee only to ingest)
+    ee_async         asyncio variants of the getInfo-bound helpers (ee through the wrapped helpers)
+
+gcu.bm_hd5_to_geotiff(...) therefore loads GDAL but not ee or folium, and
+gcu.time_series_regions_reducer(...) loads ee but not GDAL. Subsystems can also be
+imported directly, e.g. from gee_custom_utilities.blackmarble import bm_hd5_to_geotiff.
+Module-level settings such as MAP_ID_TTL must be changed on their subsystem
+(gcu.display.MAP_ID_TTL = 600), since gcu.MAP_ID_TTL is a copy of the value.
+"""
+
+import importlib
+
+from .instrumentation import (add_instrumentation_sink, remove_instrumentation_sink,
+                              JsonLinesSink, StageTotals)
+
+
+#Names defined by each subsystem
+_SUBSYSTEMS = {
+    'instrumentation': ['_instrumentation_sinks', '_NULL_TIMER', 'add_instrumentation_sink',
+                        'remove_instrumentation_sink', '_emit', '_count', '_progress', '_StageTimer', '_timed',
+                        '_get_info', 'JsonLinesSink', 'StageTotals'],
+    'display': ['MAP_ID_TTL', '_map_id_cache', '_map_id_lock', 'clear_map_id_cache', 'get_tile_url',
+                'add_ee_layer', 'add_ee_layers'],
+    'ee_processing': ['fc_to_dict', '_fc_schema', '_fc_page', 'fc_to_batches', 'fc_to_dataframe',
+                      'time_series_regions_reducer', '_stats_reducer', '_stat_output_names', '_flat_regions_reducer',
+                      '_pivot_flat_rows', '_multi_stat_regions_reducer', 'RegionsReducerCache',
+                      '_cached_time_series_regions_reducer', '_collection_id', 'PartialResultError',
+                      '_collection_date_range', '_date_chunks',
+                      'time_series_regions_reducer_chunked'],
+    'assets': ['format_dir_nospace', 'format_dir_space', 'gcloud_upload', '_file_md5', '_load_manifest',
+               '_save_manifest', 'gcloud_upload_batched', 'delete_collection_contents', '_TokenBucket',
+               '_is_quota_error', 'OPERATION_TASK_STATES', 'list_task_states', 'list_collection_assets', 'delete_collection_contents_batched'],
+    'blackmarble': ['BM_MASK_RULES', 'BM_RADIANCE_FILL', '_bm_tile_bounds', '_bm_layer_name',
+                    '_bm_hd5_file_to_geotiff', '_bm_creation_options', '_bm_hd5_file_to_geotiff_vrt',
+                    '_bm_mask_block', '_bm_hd5_file_to_masked_geotiff', '_bm_hd5_convert_task', 'bm_hd5_to_geotiff',
+                    '_bm_raster_bounds', '_bm_mosaic_name', '_bm_mosaic_day', '_bm_mosaic_task', 'bm_daily_mosaics',
+                    '_list_bucket', 'bmA2_gee_import', 'bmA2_gee_import_batched'],
+    'bm_names': ['parse_bm_filename', '_unique_asset_names'],
+    'analysis': ['_convert_timeunit', '_time_column', 'rolling_avg_and_change', '_tract_frame',
+                 'align_tract_series', '_resample_tract_frame'],
+    'zonal': ['_weight_matrix_cache', '_weight_matrix_lock', '_regions_fingerprint', '_region_weight_matrix',
+              '_cached_region_weight_matrix', '_grouped_region_stats', '_local_reduce_file', '_bm_time_start',
+              'local_regions_reducer'],
+    'cube': ['BlackMarbleCube'],
+    'pipeline': ['PIPELINE_STAGES', 'PIPELINE_LIVE_TASK_STATES', '_default_convert_function',
+                 '_default_upload_function', '_with_retries', 'bm_pipeline'],
+    'ee_async': ['DEFAULT_PROJECT_LIMIT', 'AsyncEERunner', 'get_async_runner', 'set_async_runner',
+                 'time_series_regions_reducer_async', 'regions_reducer_many_async', 'fc_to_dict_async',
+                 'delete_collection_contents_async'],
+    }
+
+_NAME_TO_SUBSYSTEM = {name: subsystem for subsystem, names in _SUBSYSTEMS.items() for name in names}
+
+__all__ = sorted(name for name in _NAME_TO_SUBSYSTEM if not name.startswith('_'))
+
+
+def __getattr__(name):
+    """IMPORT THE SUBSYSTEM DEFINING A NAME THE FIRST TIME THE NAME IS USED"""
+
+    if name in _SUBSYSTEMS:
+        return importlib.import_module('.' + name, __name__)
+    if name not in _NAME_TO_SUBSYSTEM:
+        raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+    module = importlib.import_module('.' + _NAME_TO_SUBSYSTEM[name], __name__)
+    value = getattr(module, name)
+
+    #Functions and classes are cached so later lookups skip __getattr__; settings
+    #and caches are looked up on their subsystem every time
+    if callable(value):
+        globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_NAME_TO_SUBSYSTEM) | set(_SUBSYSTEMS))
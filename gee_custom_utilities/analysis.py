@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Nightlights time series analysis: rolling averages, baseline changes and tract alignment.
+"""
+
+from datetime import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+
+# =============================================================================
+# %% 5 - NIGHTLIGHTS TIME SERIES ANALYSIS
+# =============================================================================
+
+def _convert_timeunit(df, timeunit):
+    """CONVERT THE system:time_start COLUMN OF A REDUCER DATAFRAME TO DATETIMES IF REQUESTED
+    
+    Args:
+        df: Dataframe with a system:time_start column in milliseconds
+        timeunit: str, format of timescale. If 'date', system:time_start is converted to datetime
+    
+    Returns:
+        df: Dataframe with converted system:time_start column
+    """
+    
+    if timeunit == 'date':
+        timeColumn = _time_column(df)
+        df[timeColumn] = [dt.fromtimestamp(value / 1000) for value in df[timeColumn]]
+    
+    return df
+
+
+def _time_column(df):
+    """GET THE LABEL OF THE system:time_start COLUMN OF A REDUCER DATAFRAME
+    
+    Args:
+        df: Dataframe returned by time_series_regions_reducer
+    
+    Returns:
+        label: 'system:time_start', or ('system:time_start', '') for MultiIndex columns
+    """
+    
+    if isinstance(df.columns, pd.MultiIndex):
+        return ('system:time_start', '')
+    return 'system:time_start'
+
+
+def rolling_avg_and_change(dataf,
+                           columnList,
+                           periodLength,
+                           baselines=None,
+                           baselineWindow=None,
+                           groupby=None,
+                           avgLabel='Rolling Average of '):
+    """COMPUTE ROLLING AVERAGES AND PERCENT CHANGES FROM A BASELINE
+        (vectorized replacement for the AvgAndChange loop of the plotting scripts)
+    
+    For each row dated d, the rolling average covers every row of the same group
+    dated strictly between d - (periodLength + 1) days and d + 1 day, which is the
+    window AvgAndChange uses. Windows are resolved with a sorted search and 
+    cumulative sums, so each group is handled in a single pass instead of 
+    re-filtering the whole DataFrame for every row.
+    
+    Args:
+        dataf: DataFrame with a DatetimeIndex (or an index convertible to one)
+        columnList: List of strings, columns to average and compare to baseline
+        periodLength: int, length of the rolling window in days
+        baselines: List of floats, one baseline per entry in columnList, applied to every group.
+            If None, baselines are computed per group from baselineWindow
+        baselineWindow: Tuple of datetimes (start, end), the baseline of each column is the
+            mean over rows dated strictly between start and end
+        groupby: str or list of str, column(s) identifying independent series (e.g. census tracts).
+            If None, the whole DataFrame is treated as one series
+        avgLabel: str, prefix of the rolling average columns
+            ('Rolling Average of ' or '30 Day Average of ' in the plotting scripts)
+    
+    Returns:
+        dataf_out: copy of dataf with, for each entry in columnList, the columns
+            avgLabel + entry, 'Rolling Average Percent Change of ' + entry and 'Percent Change of ' + entry
+    """
+    
+    if baselines is None and baselineWindow is None:
+        raise ValueError('Either baselines or baselineWindow must be provided')
+    
+    dataf_out = dataf.copy()
+    
+    #Collect dates and values as numpy arrays
+    dates = np.asarray(pd.DatetimeIndex(dataf.index), dtype='datetime64[ns]')
+    values = dataf[columnList].to_numpy(dtype=float)
+    rollingAvg = np.full(values.shape, np.nan)
+    baselineArr = np.full(values.shape, np.nan)
+    
+    #Identify row positions of each group
+    if groupby is None:
+        groupPositions = [np.arange(len(dataf))]
+    else:
+        groupPositions = list(dataf.reset_index(drop=True).groupby(groupby, sort=False).indices.values())
+    
+    window_back = np.timedelta64(periodLength + 1, 'D')
+    window_forward = np.timedelta64(1, 'D')
+    
+    for positions in groupPositions:
+        
+        #Sort each group by date
+        order = positions[np.argsort(dates[positions], kind='stable')]
+        groupDates = dates[order]
+        groupValues = values[order]
+        
+        #Locate window bounds for every row at once
+        left = np.searchsorted(groupDates, groupDates - window_back, side='right')
+        right = np.searchsorted(groupDates, groupDates + window_forward, side='left')
+        
+        #Windowed means from cumulative sums, ignoring NaN like DataFrame.mean
+        valid = ~np.isnan(groupValues)
+        zeroRow = np.zeros((1, groupValues.shape[1]))
+        cumSum = np.vstack([zeroRow, np.cumsum(np.where(valid, groupValues, 0), axis=0)])
+        cumCount = np.vstack([zeroRow, np.cumsum(valid, axis=0)])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rollingAvg[order] = (cumSum[right] - cumSum[left]) / (cumCount[right] - cumCount[left])
+        
+        #Compute group baselines if none were provided
+        if baselines is None:
+            inBaseline = ((groupDates > np.datetime64(baselineWindow[0], 'ns')) &
+                          (groupDates < np.datetime64(baselineWindow[1], 'ns')))
+            baseValues = groupValues[inBaseline]
+            baseValid = valid[inBaseline]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                groupBaseline = np.where(baseValid, baseValues, 0).sum(axis=0) / baseValid.sum(axis=0)
+            baselineArr[order] = groupBaseline
+    
+    if baselines is not None:
+        baselineArr[:] = np.asarray(baselines, dtype=float)
+    
+    #Write output columns in the same order as AvgAndChange
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i, entry in enumerate(columnList):
+            dataf_out[avgLabel + entry] = rollingAvg[:, i]
+            dataf_out['Rolling Average Percent Change of ' + entry] = (rollingAvg[:, i] - baselineArr[:, i]) / baselineArr[:, i]
+            dataf_out['Percent Change of ' + entry] = (values[:, i] - baselineArr[:, i]) / baselineArr[:, i]
+    
+    return dataf_out
+
+
+def _tract_frame(dataf, columns, tractColumn):
+    """SELECT COLUMNS OF A DATE-INDEXED TABLE AS A FLAT FRAME WITH 'Date' AND STRING TRACT COLUMNS
+    
+    Args:
+        dataf: DataFrame with a DatetimeIndex
+        columns: List or dictionary of columns to keep, a dictionary renames them
+        tractColumn: Str, column of tract IDs. Tables without it are treated as
+            covering every tract (e.g. county-wide mobility)
+    
+    Returns:
+        frame: DataFrame with 'Date', the tract column if present, and the selected columns
+        hasTract: Boolean, whether the table has a tract column
+    """
+    
+    if not isinstance(columns, dict):
+        columns = {column: column for column in columns}
+    frame = dataf[list(columns)].rename(columns=columns)
+    frame.insert(0, 'Date', pd.DatetimeIndex(dataf.index).astype('datetime64[ns]'))
+    hasTract = tractColumn in dataf.columns
+    if hasTract:
+        frame.insert(0, tractColumn, dataf[tractColumn].astype(str).to_numpy())
+    return frame.reset_index(drop=True), hasTract
+
+
+def align_tract_series(base,
+                       others,
+                       tractColumn='NAME',
+                       baseColumns=('mean', 'median'),
+                       how='asof',
+                       tolerance=None,
+                       direction='backward',
+                       freq='W-MON',
+                       aggregate='mean'):
+    """ALIGN DAILY NIGHTLIGHTS WITH SPEND AND MOBILITY SERIES FOR EVERY TRACT AT ONCE
+    
+    With how='asof', each row of base is matched to the latest row of every
+    other table for the same tract dated at or before it (a keyed as-of join),
+    so daily nightlights pick up the value of the week a weekly spend series
+    starts on. With how='resample', base and others are all aggregated per
+    tract into bins of freq (left-labelled, so weekly bins carry the
+    week_starting date of Replica tables) and joined on the bins.
+    
+    Args:
+        base: DataFrame with a DatetimeIndex and tractColumn, e.g. from gee_custom_loaders.load_nightlights
+        others: List of (DataFrame, columns) tuples, each DataFrame with a DatetimeIndex and, optionally,
+            tractColumn; tables without it (e.g. county-wide mobility) apply to every tract. columns is a list
+            of columns to take or a dictionary renaming them, e.g. {'restaurants_bars_spend_fullweek': 'Transactions'}
+        tractColumn: Str, column of tract IDs shared by the tables (compared as strings)
+        baseColumns: List or dictionary of columns to take from base
+        how: Str, 'asof' or 'resample'
+        tolerance: Str or timedelta, with how='asof', the largest gap between a base date and a
+            matched date (e.g. '6D' for weekly tables). If None, any earlier row matches
+        direction: Str, with how='asof', 'backward', 'forward' or 'nearest' (see pandas.merge_asof)
+        freq: Str, with how='resample', pandas frequency of the bins, e.g. 'W-MON' or 'D'
+        aggregate: Str, with how='resample', aggregation of values within a bin, e.g. 'mean' or 'sum'
+    
+    Returns:
+        df: tidy DataFrame indexed by (tractColumn, 'Date') with the base columns followed by the
+            columns of each other table, one row per base row (or per base bin), NaN where unmatched
+    """
+    
+    if how not in ('asof', 'resample'):
+        raise ValueError("how must be 'asof' or 'resample'")
+    
+    df, _ = _tract_frame(base, baseColumns, tractColumn)
+    if how == 'asof':
+        df = df.sort_values('Date', kind='stable')
+        if tolerance is not None:
+            tolerance = pd.Timedelta(tolerance)
+    else:
+        df = _resample_tract_frame(df, [tractColumn], freq, aggregate)
+    
+    for dataf, columns in others:
+        other, hasTract = _tract_frame(dataf, columns, tractColumn)
+        overlap = set(other.columns).intersection(df.columns) - {'Date', tractColumn}
+        if overlap:
+            raise ValueError('Columns present in more than one table: ' + ', '.join(sorted(overlap)))
+        keys = [tractColumn] if hasTract else []
+        if how == 'asof':
+            df = pd.merge_asof(df, other.sort_values('Date', kind='stable'), on='Date', 
+                               by=keys or None, tolerance=tolerance, direction=direction)
+        else:
+            df = df.merge(_resample_tract_frame(other, keys, freq, aggregate), 
+                          on=keys + ['Date'], how='left')
+    
+    return df.set_index([tractColumn, 'Date']).sort_index()
+
+
+def _resample_tract_frame(frame, keys, freq, aggregate):
+    """AGGREGATE A FLAT FRAME OF _tract_frame INTO LEFT-LABELLED DATE BINS PER TRACT"""
+    
+    grouper = pd.Grouper(key='Date', freq=freq, label='left', closed='left')
+    return frame.groupby(keys + [grouper], observed=True).agg(aggregate).reset_index()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+General Earth Engine asset management: Cloud Storage uploads and collection deletion.
+
+ee is only imported by the functions that call it, so uploads run without the
+Earth Engine API installed.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .instrumentation import _count, _get_info, _progress, _timed
+
+
+# =============================================================================
+# %% 3 - GENERAL GEE ASSET MANAGEMENT      
+# =============================================================================
+
+def format_dir_nospace(dirpath):
+    """ESCAPE SPACES IN DIRECTORY PATH
+    
+    Args:
+        dirpath: Str, directory path to be corrected
+    
+    Returns:
+        dirpath: Str, directory path with escaped spaces and appended backslash
+    """
+    
+    dirpath = dirpath.replace(" ", "\ ")
+    if dirpath[-1] != '/':
+        dirpath = dirpath + '/'
+    return dirpath
+
+def format_dir_space(dirpath):
+    """REMOVE ESCAPED SPACES FROM DIRECTORY PATH
+    
+    Args:
+        dirpath: Str, directory path to be corrected
+    
+    Returns:
+        dirpath: Str, directory path with plain spaces and appended backslash
+    """
+    
+    dirpath = dirpath.replace("\ ", " ")
+    if dirpath[-1] != '/':
+        dirpath = dirpath + '/'
+    return dirpath
+
+def gcloud_upload(geotiffFolder, bucket, workers=None, **kwargs):
+    """UPLOAD BATCH OF GEOTIFF IMAGES TO GOOGLE CLOUD STORAGE
+    
+    Args:
+        geotiffFolder: Str, path of directory containing geotiff images to be uploaded
+        bucket: Str, name of Google Cloud bucket to place images in
+        workers: int, if provided, upload concurrently and resumably with gcloud_upload_batched
+        **kwargs: further arguments passed to gcloud_upload_batched
+    
+    Returns:
+        N/A, or the summary of gcloud_upload_batched if workers is provided
+    """
+    
+    if workers is not None:
+        return gcloud_upload_batched(geotiffFolder, bucket, workers=workers, **kwargs)
+    
+    #Format directory path and generate list of files to be converted
+    geotiffFolder = format_dir_nospace(geotiffFolder)
+    filenames = subprocess.getoutput('find ' + geotiffFolder + " -name '*.tif'")
+    totalLength = len(filenames.splitlines())
+    index = 0
+    
+    #Iterate through and upload each image
+    for file in filenames.splitlines():
+        with _timed('gsutil_cp', file=file):
+            subprocess.call(['gsutil', '-m', 'cp', file, 'gs://' + bucket + '/'])
+        _count('files', stage='upload')
+        _count('bytes', os.path.getsize(file), stage='upload')
+        _count('remote_calls', stage='upload')
+        index+=1
+        percentageComplete = index/totalLength*100
+        print(str(percentageComplete) + "% Complete")
+        _progress('gcloud_upload', index, totalLength)
+
+
+def _file_md5(path, blockSize=1 << 20):
+    """COMPUTE THE HEX MD5 DIGEST OF A FILE, READING IT IN BLOCKS
+    
+    Args:
+        path: Str, path of the file
+        blockSize: int, number of bytes read at a time
+    
+    Returns:
+        digest: Str, hex md5 digest
+    """
+    
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _load_manifest(manifestPath):
+    """LOAD A JSON MANIFEST, OR AN EMPTY ONE IF THE FILE DOES NOT EXIST"""
+    
+    if os.path.exists(manifestPath):
+        with open(manifestPath) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_manifest(manifest, manifestPath):
+    """WRITE A JSON MANIFEST ATOMICALLY, SO A CRASH NEVER LEAVES IT HALF WRITTEN"""
+    
+    tempPath = manifestPath + '.tmp'
+    with open(tempPath, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tempPath, manifestPath)
+
+
+def gcloud_upload_batched(geotiffFolder,
+                          bucket,
+                          workers=4,
+                          batchSize=20,
+                          retries=3,
+                          backoff=1.0,
+                          manifestPath=None,
+                          transferCommand=('gsutil', '-m', 'cp')):
+    """UPLOAD GEOTIFF IMAGES TO GOOGLE CLOUD STORAGE CONCURRENTLY AND RESUMABLY
+    
+    Files are uploaded in batches, each batch as a single transfer command with
+    several source files, and batches run concurrently. After each successful batch,
+    the size and md5 of its files are recorded in a local manifest, so a rerun
+    skips files that were already uploaded unchanged to the same bucket.
+    
+    Args:
+        geotiffFolder: Str, path of directory containing geotiff images to be uploaded (searched recursively)
+        bucket: Str, name of Google Cloud bucket to place images in
+        workers: int, number of transfer commands running at the same time
+        batchSize: int, number of files passed to each transfer command
+        retries: int, number of times a failed batch is retried
+        backoff: float, seconds to wait before the first retry, doubled for each further retry
+        manifestPath: Str, path of the JSON manifest of uploaded files. 
+            Defaults to .gcloud_upload_manifest.json in geotiffFolder
+        transferCommand: Sequence of str, command prefix run as transferCommand + files + [destination]
+    
+    Returns:
+        summary: Dictionary with lists of 'uploaded' and 'skipped' files and 'failed' (file, error) tuples
+    """
+    
+    #Generate list of files to be uploaded without going through a shell
+    geotiffFolder = format_dir_space(geotiffFolder)
+    filenames = sorted(os.path.join(root, name) 
+                       for root, dirs, files in os.walk(geotiffFolder) 
+                       for name in files if name.endswith('.tif'))
+    destination = 'gs://' + bucket + '/'
+    if manifestPath is None:
+        manifestPath = os.path.join(geotiffFolder, '.gcloud_upload_manifest.json')
+    manifest = _load_manifest(manifestPath)
+    
+    #Skip files already uploaded with the same size and checksum
+    summary = {'uploaded': [], 'skipped': [], 'failed': []}
+    pending = []
+    for file in filenames:
+        entry = manifest.get(os.path.abspath(file))
+        size = os.path.getsize(file)
+        if (entry is not None and entry['destination'] == destination and entry['size'] == size
+                and entry['md5'] == _file_md5(file)):
+            summary['skipped'].append(file)
+        else:
+            pending.append(file)
+    print('FILES TO UPLOAD: ', len(pending), ' SKIPPED: ', len(summary['skipped']))
+    
+    batches = [pending[i:i + batchSize] for i in range(0, len(pending), batchSize)]
+    lock = threading.Lock()
+    
+    #Upload one batch, retrying with backoff, and record it in the manifest
+    def run_batch(batch):
+        for attempt in range(retries + 1):
+            with _timed('gsutil_cp', files=len(batch)):
+                completed = subprocess.run(list(transferCommand) + batch + [destination],
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _count('remote_calls', stage='upload')
+            if completed.returncode == 0:
+                break
+            if attempt == retries:
+                raise RuntimeError(completed.stderr.decode(errors='replace').strip() 
+                                   or 'exit code ' + str(completed.returncode))
+            _count('retries', stage='upload')
+            time.sleep(backoff * 2 ** attempt)
+        _count('files', len(batch), stage='upload')
+        _count('bytes', sum(os.path.getsize(file) for file in batch), stage='upload')
+        
+        entries = {os.path.abspath(file): {'size': os.path.getsize(file), 
+                                           'md5': _file_md5(file), 
+                                           'destination': destination} for file in batch}
+        with lock:
+            manifest.update(entries)
+            _save_manifest(manifest, manifestPath)
+    
+    index = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            if future.exception() is None:
+                summary['uploaded'].extend(batch)
+            else:
+                summary['failed'].extend((file, repr(future.exception())) for file in batch)
+            
+            #Report on progress
+            index+=len(batch)
+            percentageComplete = index/len(pending)*100
+            print(str(percentageComplete) + "% Complete")
+            _progress('gcloud_upload', index, len(pending))
+    
+    summary['uploaded'].sort()
+    summary['failed'].sort()
+    return summary
+        
+
+def delete_collection_contents(collection_title, workers=None, **kwargs):
+    """DELETES ALL IMAGES IN A GEE IMAGE COLLECTION
+    
+    Args:
+        collection_title: Str, full path of image collection    
+        workers: int, if provided, list assets page by page and delete them concurrently
+            with delete_collection_contents_batched
+        **kwargs: further arguments passed to delete_collection_contents_batched
+    Returns:
+        new_list: List, list of deleted images by id, or the summary of
+            delete_collection_contents_batched if workers is provided
+    """
+    
+    if workers is not None:
+        return delete_collection_contents_batched(collection_title, workers=workers, **kwargs)
+    
+    import ee
+    
+    collect = ee.ImageCollection(collection_title)
+    collection_size = int(_get_info(collect.size(), 'delete_collection_contents'))
+    collect_list = collect.toList(collection_size)
+
+    def get_ids(inp):
+        return ee.Image(inp).id()
+
+    id_list = ee.List(collect_list.map(get_ids))
+
+
+    new_list = _get_info(id_list, 'delete_collection_contents')
+    print('NUMBER OF IMAGES TO BE DELETED: ', len(new_list))
+    collectstring = collection_title + '/'
+      
+    for index, entry in enumerate(new_list, 1):
+        delete_string = collectstring + entry
+        print(delete_string)
+        with _timed('delete_asset', asset=delete_string):
+            ee.data.deleteAsset(delete_string)
+        _count('remote_calls', stage='delete')
+        _progress('delete_collection_contents', index, len(new_list))
+        time.sleep(0.5)
+    
+    return new_list
+
+
+class _TokenBucket():
+    """THREAD-SAFE TOKEN BUCKET RATE LIMITER
+    
+    Args:
+        rate: float, tokens added per second
+        capacity: int, maximum number of tokens, i.e. the largest burst allowed
+    """
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """BLOCK UNTIL A TOKEN IS AVAILABLE AND TAKE IT"""
+        
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_quota_error(error):
+    """CHECK WHETHER AN EARTH ENGINE ERROR IS A RATE OR QUOTA LIMIT THAT IS WORTH RETRYING"""
+    
+    message = str(error).lower()
+    return any(text in message for text in ('quota', 'rate limit', 'too many requests', '429'))
+
+
+#Task states of getTaskStatus for the operation states of ee.data.listOperations
+OPERATION_TASK_STATES = {'PENDING': 'READY', 'RUNNING': 'RUNNING', 'CANCELLING': 'CANCEL_REQUESTED',
+                         'SUCCEEDED': 'COMPLETED', 'FAILED': 'FAILED', 'CANCELLED': 'CANCELLED'}
+
+
+def list_task_states(taskIds, listOperations=None):
+    """GET THE STATE OF MANY EARTH ENGINE TASKS FROM ONE LISTING OF THE PROJECT OPERATIONS
+    
+    ee.data.getTaskStatus requests every task id separately. ee.data.listOperations
+    lists the recent operations of the project page by page instead, so a poll costs
+    one request per page of operations however many tasks are polled.
+    
+    Args:
+        taskIds: List of str, ids of the tasks, as returned by ee.data.newTaskId
+        listOperations: callable with the signature of ee.data.listOperations. Defaults to ee.data.listOperations
+    
+    Returns:
+        statuses: Dictionary of task id to a status dictionary with 'id', 'state' (READY, RUNNING,
+            CANCEL_REQUESTED, COMPLETED, FAILED, CANCELLED, or UNKNOWN for tasks missing from the
+            listing) and 'error_message' for failed tasks, as returned by ee.data.getTaskStatus
+    """
+    
+    if listOperations is None:
+        import ee
+        listOperations = ee.data.listOperations
+    
+    with _timed('task_status', tasks=len(taskIds)):
+        operations = listOperations()
+    _count('remote_calls', stage='task_status')
+    
+    wanted = set(taskIds)
+    statuses = {}
+    for operation in operations:
+        taskId = operation['name'].rsplit('/', 1)[-1]
+        if taskId not in wanted:
+            continue
+        state = operation.get('metadata', {}).get('state', 'UNKNOWN')
+        status = {'id': taskId, 'state': OPERATION_TASK_STATES.get(state, state)}
+        if operation.get('done') and 'error' in operation:
+            status['error_message'] = operation['error'].get('message', status['state'])
+        statuses[taskId] = status
+    for taskId in wanted - set(statuses):
+        statuses[taskId] = {'id': taskId, 'state': 'UNKNOWN'}
+    return statuses
+
+
+def list_collection_assets(collection_title, pageSize=1000, listAssets=None):
+    """LIST THE ASSETS OF A GEE IMAGE COLLECTION PAGE BY PAGE
+    
+    Args:
+        collection_title: Str, full path of image collection
+        pageSize: int, number of assets requested per page
+        listAssets: callable with the signature of ee.data.listAssets. Defaults to ee.data.listAssets
+    
+    Returns:
+        names: List of str, full asset names of the images in the collection
+    """
+    
+    if listAssets is None:
+        import ee
+        listAssets = ee.data.listAssets
+    
+    names = []
+    pageToken = None
+    while True:
+        params = {'parent': collection_title, 'pageSize': pageSize}
+        if pageToken:
+            params['pageToken'] = pageToken
+        with _timed('list_assets', parent=collection_title):
+            response = listAssets(params)
+        _count('remote_calls', stage='list')
+        names.extend(asset['name'] for asset in response.get('assets', []))
+        pageToken = response.get('nextPageToken')
+        if not pageToken:
+            return names
+
+
+def delete_collection_contents_batched(collection_title,
+                                       workers=8,
+                                       rate=10,
+                                       retries=5,
+                                       backoff=1.0,
+                                       dryRun=False,
+                                       pageSize=1000,
+                                       listAssets=None,
+                                       deleteAsset=None):
+    """DELETES ALL IMAGES IN A GEE IMAGE COLLECTION CONCURRENTLY UNDER A RATE LIMIT
+    
+    Assets are listed page by page with ee.data.listAssets instead of loading the
+    whole collection into one list, then deleted from a thread pool. A token bucket
+    keeps the deletion rate under the given number of requests per second, and
+    deletions that fail with a quota or rate-limit error are retried with backoff.
+    
+    Args:
+        collection_title: Str, full path of image collection
+        workers: int, number of deletions in flight at the same time
+        rate: float, maximum number of deletion requests per second
+        retries: int, number of times a deletion failing on quota is retried
+        backoff: float, seconds to wait before the first retry, doubled for each further retry
+        dryRun: Boolean, only list the assets that would be deleted
+        pageSize: int, number of assets requested per listing page
+        listAssets: callable with the signature of ee.data.listAssets. Defaults to ee.data.listAssets
+        deleteAsset: callable with the signature of ee.data.deleteAsset. Defaults to ee.data.deleteAsset
+    
+    Returns:
+        summary: Dictionary with lists of 'assets' listed, 'deleted' assets and 'failed' (asset, error) tuples
+    """
+    
+    if deleteAsset is None:
+        import ee
+        deleteAsset = ee.data.deleteAsset
+    
+    names = list_collection_assets(collection_title, pageSize=pageSize, listAssets=listAssets)
+    print('NUMBER OF IMAGES TO BE DELETED: ', len(names))
+    summary = {'assets': names, 'deleted': [], 'failed': []}
+    if dryRun:
+        return summary
+    
+    bucket = _TokenBucket(rate, capacity=max(1, int(rate)))
+    
+    #Delete one asset, retrying quota errors with backoff
+    def delete(name):
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            _count('remote_calls', stage='delete')
+            try:
+                with _timed('delete_asset', asset=name):
+                    deleteAsset(name)
+                return
+            except Exception as e:
+                if attempt == retries or not _is_quota_error(e):
+                    raise
+            _count('retries', stage='delete')
+            time.sleep(backoff * 2 ** attempt)
+    
+    index = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(delete, name): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            if future.exception() is None:
+                summary['deleted'].append(name)
+            else:
+                summary['failed'].append((name, repr(future.exception())))
+            
+            #Report on progress
+            index+=1
+            _progress('delete_collection_contents', index, len(names))
+            if index % 100 == 0 or index == len(names):
+                percentageComplete = index/len(names)*100
+                print(str(percentageComplete) + "% Complete")
+    
+    summary['deleted'].sort()
+    summary['failed'].sort()
+    return summary
@@ -0,0 +1,923 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Black Marble nightlights conversion from HDF5 to GeoTIFF and import into Earth Engine.
+
+ee is only imported by the import functions, so conversion runs on GDAL
+workers without the Earth Engine API installed.
+"""
+
+import functools
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+from osgeo import gdal
+from osgeo import ogr
+from osgeo import osr
+
+from .assets import format_dir_nospace, format_dir_space, list_task_states
+from .bm_names import parse_bm_filename, _unique_asset_names
+from .instrumentation import _count, _progress, _timed
+
+
+# =============================================================================
+# %% 4 - BLACK MARBLE NIGHTLIGHTS CONVERSION AND IMPORT           
+# =============================================================================
+
+#Default VNP46A2 quality rules of the masking stage. A pixel is masked when the
+#value of the given bits (first, last, inclusive; all bits if None) of a layer is
+#in reject
+BM_MASK_RULES = [
+    {'layer': 'Mandatory_Quality_Flag', 'bits': None, 'reject': [2, 255]}, #poor quality, fill
+    {'layer': 'QF_Cloud_Mask', 'bits': (6, 7), 'reject': [2, 3]}, #probably / confident cloudy
+    {'layer': 'QF_Cloud_Mask', 'bits': (8, 8), 'reject': [1]}, #cloud shadow
+    {'layer': 'QF_Cloud_Mask', 'bits': (9, 9), 'reject': [1]}, #cirrus
+    ]
+
+#Fill value of the VNP46A2 radiance layers, used as nodata of the masked band
+BM_RADIANCE_FILL = 65535
+
+
+def _bm_tile_bounds(rlayer):
+    """DERIVE THE BOUNDING BOX OF A BLACK MARBLE TILE FROM ITS H/V TILE NUMBERS
+    
+    Args:
+        rlayer: gdal.Dataset, opened hd5 subdataset
+    
+    Returns:
+        bounds: List of ints, [West, North, East, South] bounding coordinates in EPSG:4326
+    """
+    
+    HorizontalTileNumber = int(rlayer.GetMetadata_Dict()["HorizontalTileNumber"])
+    VerticalTileNumber = int(rlayer.GetMetadata_Dict()["VerticalTileNumber"])
+    WestBoundCoord = (10*HorizontalTileNumber) - 180
+    NorthBoundCoord = 90-(10*VerticalTileNumber)
+    EastBoundCoord = WestBoundCoord + 10
+    SouthBoundCoord = NorthBoundCoord - 10
+    return [WestBoundCoord, NorthBoundCoord, EastBoundCoord, SouthBoundCoord]
+
+
+def _bm_layer_name(subhdflayer):
+    """GENERATE THE FILE-SAFE NAME OF AN HD5 SUBDATASET FROM ITS LONG NAME
+    
+    Args:
+        subhdflayer: Str, gdal subdataset name, e.g.
+            HDF5:"/path/VNP46A2.A2020001.h08v05.001.2020256150417.h5"://HDFEOS/GRIDS/VNP_Grid_DNB/Data_Fields/Mandatory_Quality_Flag
+    
+    Returns:
+        outputNameNoSpace: Str, last component of the subdataset path (e.g. Mandatory_Quality_Flag),
+            with spaces and colons replaced by underscores
+    """
+    
+    outputName = subhdflayer.rsplit('/', 1)[-1]
+    return outputName.strip().replace(" ","_").replace(":","_")
+
+
+def _bm_hd5_file_to_geotiff(hd5Path, geotiffFolder, tempFolder):
+    """CONVERT A SINGLE HD5 BLACK MARBLE IMAGE TO GEOTIFF
+    
+    Args:
+        hd5Path: Str, path of the hd5 image to be converted
+        geotiffFolder: Str, path of target directory to place the geotiff
+        tempFolder: Str, path of directory for the temporary per-layer rasters.
+            Should not be shared with other conversions running at the same time
+    
+    Returns:
+        outputPath: Str, path of the generated geotiff
+    """
+    
+    #Format relevant directory paths
+    geotiffFolder_space = format_dir_space(geotiffFolder)
+    geotiffFolder = format_dir_nospace(geotiffFolder)
+    tempFolder = format_dir_nospace(tempFolder)
+    tempFolder_space = format_dir_space(tempFolder)
+    
+    #Get File Name Prefix
+    rasterFilePre = os.path.basename(hd5Path)[:-3]
+    print(rasterFilePre)
+
+    fileExtension = "_BBOX.tif"
+    
+    ## Open HDF file
+    hdflayer = gdal.Open(hd5Path, gdal.GA_ReadOnly)
+    
+    # Open raster layer
+    for layer in hdflayer.GetSubDatasets():
+        
+        #hdflayer.GetSubDatasets()[0][0] - for first layer
+        #hdflayer.GetSubDatasets()[1][0] - for second layer ...etc
+        subhdflayer = layer[0]
+        rlayer = gdal.Open(subhdflayer, gdal.GA_ReadOnly)
+    
+        #Subset the Long Name and Generate Name of Temporary Files
+        outputNameNoSpace = _bm_layer_name(subhdflayer)
+        outputNameFinal = rasterFilePre + outputNameNoSpace + fileExtension
+        outputFolder = tempFolder_space            
+        outputRaster = outputFolder + outputNameFinal
+        
+        #Collect bounding box coordinates
+        WestBoundCoord, NorthBoundCoord, EastBoundCoord, SouthBoundCoord = _bm_tile_bounds(rlayer)
+        
+        #Set projection
+        EPSG = "-a_srs EPSG:4326" #WGS84
+        translateOptionText = EPSG+" -a_ullr " + str(WestBoundCoord) + " " + str(NorthBoundCoord) + " " + str(EastBoundCoord) + " " + str(SouthBoundCoord)
+        translateoptions = gdal.TranslateOptions(gdal.ParseCommandLine(translateOptionText))
+        
+        #Generate layers as temporary raster files
+        with _timed('gdal_translate', file=hd5Path, layer=outputNameNoSpace):
+            gdal.Translate(outputRaster,rlayer, options=translateoptions)
+        
+    #Combine temporary rasters into geotiff
+    filepre = rasterFilePre
+    commandtext = 'gdal_merge.py -separate -o ' + geotiffFolder + filepre + '.tif ' + tempFolder + filepre + '*tif'
+    with _timed('gdal_merge', file=hd5Path):
+        returncode = subprocess.call(commandtext, shell=True)
+    
+    #Remove temporary raster riles
+    subprocess.call('rm ' + tempFolder + filepre + '*tif', shell=True)
+    
+    if returncode != 0:
+        raise RuntimeError('gdal_merge.py failed for ' + hd5Path + ' with exit code ' + str(returncode))
+    
+    return geotiffFolder_space + filepre + '.tif'
+
+
+def _bm_creation_options(outputType, compress=None, predictor=None, cog=False):
+    """BUILD GDAL CREATION OPTIONS FOR COMPRESSED AND/OR CLOUD OPTIMIZED GEOTIFF OUTPUT
+    
+    Args:
+        outputType: int, gdal data type of the output bands
+        compress: Str, compression method, or None for no compression
+        predictor: int, 2 or 3, or None to choose from outputType
+        cog: Boolean, options for the COG driver instead of the GTiff driver
+    
+    Returns:
+        options: List of str, gdal creation options
+    """
+    
+    options = []
+    if cog:
+        options += ['BLOCKSIZE=512', 'OVERVIEWS=AUTO', 'OVERVIEW_RESAMPLING=NEAREST']
+    if compress is not None:
+        isFloat = outputType in (gdal.GDT_Float32, gdal.GDT_Float64)
+        if predictor is None:
+            predictor = 3 if isFloat else 2
+        options.append('COMPRESS=' + compress.upper())
+        if cog:
+            options.append('PREDICTOR=' + ('FLOATING_POINT' if predictor == 3 else 'STANDARD'))
+        else:
+            options.append('PREDICTOR=' + str(predictor))
+    return options
+
+
+def _bm_hd5_file_to_geotiff_vrt(hd5Path, geotiffFolder, bands=None, compress=None, predictor=None, cog=False):
+    """CONVERT A SINGLE HD5 BLACK MARBLE IMAGE TO GEOTIFF THROUGH IN-MEMORY VRTS
+    
+    Each subdataset is georeferenced as a VRT in /vsimem, the VRTs are stacked
+    as separate bands and the stack is written to the geotiff in a single
+    gdal.Translate. Band order, data type, georeferencing and nodata follow the
+    gdal_merge.py -separate output of _bm_hd5_file_to_geotiff: bands are ordered by
+    sorted temporary file name, every band takes the data type of the first band
+    and no nodata value is set. A GeoTIFF holds a single data type, so a subset of
+    bands is instead written in the widest data type of the selected bands, which
+    keeps every value of every band.
+    
+    Args:
+        hd5Path: Str, path of the hd5 image to be converted
+        geotiffFolder: Str, path of target directory to place the geotiff
+        bands: List of str, subdataset names to keep (e.g. 'DNB_BRDF-Corrected_NTL', 'Mandatory_Quality_Flag').
+            If None, every subdataset is kept. Kept bands stay in the default band order. Raises
+            ValueError if a name is not a subdataset of the file or the list is empty
+        compress: Str, GeoTIFF compression ('DEFLATE', 'ZSTD', 'LZW'...). If None, output is uncompressed
+        predictor: int, GeoTIFF predictor used with compress, 2 (horizontal differencing) or 3 (floating point).
+            If None, 2 is used for integer bands and 3 for floating point bands
+        cog: Boolean, write a Cloud Optimized GeoTIFF (internal tiles and overviews) with the COG driver
+    
+    Returns:
+        outputPath: Str, path of the generated geotiff
+    """
+    
+    #Get File Name Prefix
+    rasterFilePre = os.path.basename(hd5Path)[:-3]
+    print(rasterFilePre)
+    memPrefix = '/vsimem/' + uuid.uuid4().hex + '/'
+    outputPath = os.path.join(format_dir_space(geotiffFolder), rasterFilePre + '.tif')
+    
+    ## Open HDF file
+    hdflayer = gdal.Open(hd5Path, gdal.GA_ReadOnly)
+    subdatasets = [layer[0] for layer in hdflayer.GetSubDatasets()]
+    if bands is not None:
+        available = set(subhdflayer.rsplit('/', 1)[-1] for subhdflayer in subdatasets)
+        missing = sorted(set(bands) - available)
+        if missing or not bands:
+            raise ValueError('Subdatasets not found in ' + hd5Path + ': ' + (', '.join(missing) or 'empty band selection'))
+        subdatasets = [subhdflayer for subhdflayer in subdatasets if subhdflayer.rsplit('/', 1)[-1] in bands]
+    if not subdatasets:
+        raise ValueError('No subdatasets in ' + hd5Path)
+    
+    #Georeference each subdataset as an in-memory VRT
+    layerVRTs = {}
+    layerTypes = []
+    memFiles = []
+    try:
+        for subhdflayer in subdatasets:
+            rlayer = gdal.Open(subhdflayer, gdal.GA_ReadOnly)
+            layerTypes.append(rlayer.GetRasterBand(1).DataType)
+            
+            outputNameFinal = rasterFilePre + _bm_layer_name(subhdflayer) + "_BBOX.tif"
+            layerVRT = memPrefix + outputNameFinal + '.vrt'
+            memFiles.append(layerVRT)
+            translateoptions = gdal.TranslateOptions(format='VRT',
+                                                     outputSRS='EPSG:4326', #WGS84
+                                                     outputBounds=_bm_tile_bounds(rlayer))
+            gdal.Translate(layerVRT, rlayer, options=translateoptions)
+            layerVRTs[outputNameFinal] = layerVRT
+        
+        #Stack layers in the order gdal_merge.py receives them from the shell glob
+        stackList = [layerVRTs[name] for name in sorted(layerVRTs)]
+        stackPath = memPrefix + 'stack.vrt'
+        memFiles.append(stackPath)
+        stackVRT = gdal.BuildVRT(stackPath, stackList, separate=True)
+        if bands is None:
+            outputType = stackVRT.GetRasterBand(1).DataType
+        else:
+            outputType = functools.reduce(gdal.DataTypeUnion, layerTypes)
+        
+        #Write all bands to the geotiff at once
+        with _timed('gdal_translate', file=hd5Path, layers=len(stackList)):
+            gdal.Translate(outputPath, stackVRT,
+                           options=gdal.TranslateOptions(format='COG' if cog else 'GTiff',
+                                                         outputType=outputType,
+                                                         noData='none',
+                                                         creationOptions=_bm_creation_options(outputType, compress, predictor, cog)))
+        stackVRT = None
+    finally:
+        for memFile in memFiles:
+            gdal.Unlink(memFile)
+    
+    return outputPath
+
+
+def _bm_mask_block(radiance, layers, rules, fillValue=BM_RADIANCE_FILL):
+    """APPLY QUALITY BITMASK RULES TO A BLOCK OF RADIANCE
+    
+    Args:
+        radiance: numpy array, block of the radiance layer
+        layers: Dictionary of layer name to numpy array, matching blocks of the quality layers
+        rules: List of dictionaries with 'layer', 'bits' and 'reject' keys (see BM_MASK_RULES)
+        fillValue: number, value written to masked pixels
+    
+    Returns:
+        masked: numpy array, copy of radiance with masked pixels set to fillValue
+    """
+    
+    bad = radiance == fillValue
+    for rule in rules:
+        values = layers[rule['layer']]
+        if rule.get('bits') is not None:
+            first, last = rule['bits']
+            values = (values >> first) & ((1 << (last - first + 1)) - 1)
+        bad |= np.isin(values, rule['reject'])
+    return np.where(bad, np.asarray(fillValue, dtype=radiance.dtype), radiance)
+
+
+def _bm_hd5_file_to_masked_geotiff(hd5Path, geotiffFolder, maskRules=None, radianceLayer='DNB_BRDF-Corrected_NTL',
+                                   blockSize=512, compress=None, predictor=None, cog=False):
+    """CONVERT A SINGLE HD5 BLACK MARBLE IMAGE TO A GEOTIFF OF QUALITY-MASKED RADIANCE
+    
+    The radiance and the quality layers named by the rules are read in windows
+    of blockSize x blockSize pixels, masked with _bm_mask_block and written to
+    a single-band geotiff whose nodata is BM_RADIANCE_FILL, so peak memory is
+    bounded by the window size rather than the tile size.
+    
+    Args:
+        hd5Path: Str, path of the hd5 image to be converted
+        geotiffFolder: Str, path of target directory to place the geotiff
+        maskRules: List of dictionaries, masking rules (see BM_MASK_RULES). If None, BM_MASK_RULES
+        radianceLayer: Str, subdataset name of the radiance to mask
+        blockSize: int, width and height in pixels of the windows read and written at once
+        compress: Str, GeoTIFF compression ('DEFLATE', 'ZSTD', 'LZW'...). If None, output is uncompressed
+        predictor: int, GeoTIFF predictor used with compress. If None, 2 for the integer radiance
+        cog: Boolean, write a Cloud Optimized GeoTIFF with the COG driver
+    
+    Returns:
+        outputPath: Str, path of the generated geotiff
+    """
+    
+    if maskRules is None:
+        maskRules = BM_MASK_RULES
+    
+    #Get File Name Prefix
+    rasterFilePre = os.path.basename(hd5Path)[:-3]
+    print(rasterFilePre)
+    outputPath = os.path.join(format_dir_space(geotiffFolder), rasterFilePre + '.tif')
+    
+    ## Open the radiance and quality subdatasets
+    hdflayer = gdal.Open(hd5Path, gdal.GA_ReadOnly)
+    subdatasets = {layer[0].rsplit('/', 1)[-1]: layer[0] for layer in hdflayer.GetSubDatasets()}
+    missing = [name for name in [radianceLayer] + [rule['layer'] for rule in maskRules] if name not in subdatasets]
+    if missing:
+        raise ValueError('Subdatasets not found in ' + hd5Path + ': ' + ', '.join(sorted(set(missing))))
+    radiance = gdal.Open(subdatasets[radianceLayer], gdal.GA_ReadOnly)
+    qualityLayers = {name: gdal.Open(subdatasets[name], gdal.GA_ReadOnly) for name in set(rule['layer'] for rule in maskRules)}
+    
+    #Georeference the output from the tile numbers
+    xsize, ysize = radiance.RasterXSize, radiance.RasterYSize
+    WestBoundCoord, NorthBoundCoord, EastBoundCoord, SouthBoundCoord = _bm_tile_bounds(radiance)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326) #WGS84
+    outputType = radiance.GetRasterBand(1).DataType
+    
+    #The COG driver cannot be written block by block, so write a tiled GTiff in memory and copy it
+    if cog:
+        targetPath = '/vsimem/' + uuid.uuid4().hex + '.tif'
+        creationOptions = ['TILED=YES']
+    else:
+        targetPath = outputPath
+        creationOptions = ['TILED=YES', 'BLOCKXSIZE=' + str(min(blockSize, 512)), 'BLOCKYSIZE=' + str(min(blockSize, 512))]
+        creationOptions += _bm_creation_options(outputType, compress, predictor, cog=False)
+    target = gdal.GetDriverByName('GTiff').Create(targetPath, xsize, ysize, 1, outputType, options=creationOptions)
+    try:
+        target.SetGeoTransform([WestBoundCoord, (EastBoundCoord - WestBoundCoord) / xsize, 0,
+                                NorthBoundCoord, 0, (SouthBoundCoord - NorthBoundCoord) / ysize])
+        target.SetProjection(srs.ExportToWkt())
+        targetBand = target.GetRasterBand(1)
+        targetBand.SetNoDataValue(BM_RADIANCE_FILL)
+        
+        #Mask window by window
+        with _timed('bm_mask', file=hd5Path):
+            for yoff in range(0, ysize, blockSize):
+                for xoff in range(0, xsize, blockSize):
+                    window = (xoff, yoff, min(blockSize, xsize - xoff), min(blockSize, ysize - yoff))
+                    layers = {name: dataset.GetRasterBand(1).ReadAsArray(*window) for name, dataset in qualityLayers.items()}
+                    block = _bm_mask_block(radiance.GetRasterBand(1).ReadAsArray(*window), layers, maskRules)
+                    targetBand.WriteArray(block, xoff, yoff)
+        targetBand = None
+        
+        if cog:
+            with _timed('gdal_translate', file=hd5Path, format='COG'):
+                gdal.Translate(outputPath, target,
+                               options=gdal.TranslateOptions(format='COG',
+                                                             creationOptions=_bm_creation_options(outputType, compress, predictor, cog=True)))
+    finally:
+        target = None
+        if cog:
+            gdal.Unlink(targetPath)
+    
+    return outputPath
+
+
+def _bm_hd5_convert_task(hd5Path, geotiffFolder, tempFolder, inMemory=False, **outputOptions):
+    """RUN ONE HD5 CONVERSION IN ITS OWN TEMPORARY DIRECTORY, REPORTING FAILURES
+    
+    Args:
+        hd5Path: Str, path of the hd5 image to be converted
+        geotiffFolder: Str, path of target directory to place the geotiff
+        tempFolder: Str, parent directory for the private temporary directory
+        inMemory: Boolean, use the in-memory VRT conversion, which needs no temporary directory
+        **outputOptions: band selection and compression options of _bm_hd5_file_to_geotiff_vrt,
+            or, if they include maskRules, options of _bm_hd5_file_to_masked_geotiff
+    
+    Returns:
+        result: Tuple of (hd5Path, path of the geotiff or None, error message or None)
+    """
+    
+    if inMemory:
+        try:
+            converter = _bm_hd5_file_to_masked_geotiff if 'maskRules' in outputOptions else _bm_hd5_file_to_geotiff_vrt
+            with _timed('bm_convert', file=hd5Path, inMemory=True):
+                outputPath = converter(hd5Path, geotiffFolder, **outputOptions)
+            _count('files', stage='convert')
+            _count('bytes', os.path.getsize(outputPath), stage='convert')
+            return (hd5Path, outputPath, None)
+        except Exception as e:
+            return (hd5Path, None, repr(e))
+    
+    taskFolder = tempfile.mkdtemp(prefix='hd5_', dir=tempFolder)
+    try:
+        with _timed('bm_convert', file=hd5Path, inMemory=False):
+            outputPath = _bm_hd5_file_to_geotiff(hd5Path, geotiffFolder, taskFolder)
+        _count('files', stage='convert')
+        _count('bytes', os.path.getsize(outputPath), stage='convert')
+        return (hd5Path, outputPath, None)
+    except Exception as e:
+        return (hd5Path, None, repr(e))
+    finally:
+        shutil.rmtree(taskFolder, ignore_errors=True)
+
+
+def bm_hd5_to_geotiff(hd5Folder, geotiffFolder, workers=None, inMemory=False,
+                      bands=None, compress=None, predictor=None, cog=False,
+                      mask=None, radianceLayer='DNB_BRDF-Corrected_NTL', blockSize=512):
+    """ Based on NASA's Black Marble OpenHDF5.py"""
+    """CONVERT A BATCH OF HD5 BLACK MARBLE IMAGES TO GEOTIFF
+    
+    Args:
+        hd5Folder: Str, path of directory containing hd5 images to be converted
+        geotiffFolder: Str, path of target directory to place geotiffs
+        workers: int, number of processes to convert files in parallel. If None,
+            files are converted one by one in the current process
+        inMemory: Boolean, georeference and stack the subdatasets as in-memory VRTs and
+            write each geotiff in one pass, instead of writing temporary per-layer
+            geotiffs and merging them with gdal_merge.py
+        bands: List of str, subdataset names to keep, e.g. ['DNB_BRDF-Corrected_NTL', 'Mandatory_Quality_Flag'].
+            If None, every subdataset is written
+        compress: Str, GeoTIFF compression, 'DEFLATE' or 'ZSTD' (or any other GDAL method). If None, uncompressed
+        predictor: int, predictor used with compress, 2 for integer data, 3 for floating point.
+            If None, chosen from the output data type
+        cog: Boolean, write Cloud Optimized GeoTIFFs with internal tiling and overviews
+            (requires GDAL >= 3.1). bands, compress and cog imply inMemory
+        mask: List of masking rules (see BM_MASK_RULES), or True for BM_MASK_RULES. If provided,
+            each geotiff holds only radianceLayer, with pixels failing a rule set to the
+            BM_RADIANCE_FILL nodata value, so quality flags need not be re-applied downstream.
+            Cannot be combined with bands
+        radianceLayer: Str, subdataset masked when mask is provided
+        blockSize: int, size in pixels of the square windows read, masked and written at once
+            when mask is provided, bounding peak memory
+    
+    Returns:
+        results: List of (hd5 path, geotiff path or None, error message or None) tuples,
+            in sorted order of the hd5 file names. Failed files do not stop the batch
+    """
+    
+    #Band selection, masking and output layout are only available in the in-memory path
+    outputOptions = {}
+    if mask is not None and mask is not False:
+        if bands is not None:
+            raise ValueError('bands cannot be combined with mask, the masked output only holds radianceLayer')
+        inMemory = True
+        outputOptions = {'maskRules': BM_MASK_RULES if mask is True else mask, 'radianceLayer': radianceLayer,
+                         'blockSize': blockSize, 'compress': compress, 'predictor': predictor, 'cog': cog}
+    elif bands is not None or compress is not None or cog:
+        inMemory = True
+        outputOptions = {'bands': bands, 'compress': compress, 'predictor': predictor, 'cog': cog}
+    
+    #Check if suitable temprary directory is available, create one if not
+    temp_check = os.path.join(os.getcwd(), 'temp_dir_for_hd5')
+    if inMemory:
+        tempFolder = None
+    elif os.path.exists(temp_check):
+        if os.path.isdir(temp_check):
+            tempFolder = temp_check
+        else:
+            tempFolder = os.path.join(temp_check, str(round(time.time())))
+            os.mkdir(tempFolder)
+    else:
+        os.mkdir(temp_check)
+        tempFolder = temp_check
+    
+    ## List input raster files
+    hd5Folder = os.path.abspath(hd5Folder)
+    geotiffFolder = os.path.abspath(geotiffFolder)
+    rasterFiles = [os.path.join(hd5Folder, file) for file in sorted(os.listdir(hd5Folder))]
+    
+    index = 0
+    totalLength = len(rasterFiles)
+    results = []
+    
+    if workers is None:
+        for file in rasterFiles:
+            results.append(_bm_hd5_convert_task(file, geotiffFolder, tempFolder, inMemory, **outputOptions))
+            
+            #Report on progress
+            index+=1
+            percentageComplete = index/totalLength*100
+            print(str(percentageComplete) + "% Complete")
+            _progress('bm_hd5_to_geotiff', index, totalLength)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_bm_hd5_convert_task, file, geotiffFolder, tempFolder, inMemory, **outputOptions)
+                       for file in rasterFiles]
+            for future in as_completed(futures):
+                
+                #Report on progress
+                index+=1
+                percentageComplete = index/totalLength*100
+                print(str(percentageComplete) + "% Complete")
+                _progress('bm_hd5_to_geotiff', index, totalLength)
+        
+        #Keep results in input order regardless of completion order
+        results = [future.result() for future in futures]
+    
+    #Report failed files
+    for file, outputPath, error in results:
+        if error is not None:
+            print('FAILED: ' + file + ' ' + error)
+    
+    #Remove temporary directory if nothing else is left in it
+    if tempFolder is not None:
+        try:
+            os.rmdir(tempFolder)
+        except OSError:
+            pass
+    
+    return results
+
+
+def _bm_raster_bounds(dataset):
+    """GET THE [West, South, East, North] BOUNDS OF A NORTH-UP RASTER"""
+    
+    geoTransform = dataset.GetGeoTransform()
+    east = geoTransform[0] + geoTransform[1] * dataset.RasterXSize
+    south = geoTransform[3] + geoTransform[5] * dataset.RasterYSize
+    return [geoTransform[0], south, east, geoTransform[3]]
+
+
+def _bm_mosaic_name(tileNames, aoiName):
+    """NAME A DAILY MOSAIC SO parse_bm_filename READS ITS DAY AND A PER-DAY ASSET NAME
+    
+    Args:
+        tileNames: List of str, base names of the tiles of one day, e.g. 'VNP46A2.A2020001.h08v05.001.2020256150417.tif'
+        aoiName: Str, tag replacing the h/v tile component
+    
+    Returns:
+        name: Str, e.g. 'VNP46A2.A2020001.aoi.001.2020001000000.tif', acquired at midnight of the day
+    """
+    
+    product, dateName, _, collection = tileNames[0].split('.')[0:4]
+    return '.'.join([product, dateName, aoiName, collection, dateName[1:8] + '000000', 'tif'])
+
+
+def _bm_mosaic_day(tilePaths, outputPath, bounds, geometry=None, noData=None, compress='DEFLATE', predictor=None, cog=False):
+    """MOSAIC THE TILES OF ONE DAY THROUGH A VRT AND CROP THEM TO AN AREA OF INTEREST
+    
+    Args:
+        tilePaths: List of str, geotiffs of one acquisition day
+        outputPath: Str, path of the cropped mosaic
+        bounds: List of floats, [West, South, East, North] area of interest in EPSG:4326
+        geometry: Str, GeoJSON text or path of a vector file. If provided, pixels outside
+            it are set to noData after cropping to bounds
+        noData: number, nodata of the mosaic. If None, the nodata of the tiles, or
+            BM_RADIANCE_FILL when a geometry is provided and the tiles have none
+        compress: Str, GeoTIFF compression. If None, output is uncompressed
+        predictor: int, GeoTIFF predictor used with compress. If None, chosen from the data type
+        cog: Boolean, write a Cloud Optimized GeoTIFF with the COG driver
+    
+    Returns:
+        outputPath: Str, path of the mosaic, or None if no tile intersects bounds
+    """
+    
+    #Only reference tiles intersecting the area of interest
+    intersecting = []
+    for tilePath in tilePaths:
+        tile = gdal.Open(tilePath, gdal.GA_ReadOnly)
+        tileBounds = _bm_raster_bounds(tile)
+        tile = None
+        if (tileBounds[0] < bounds[2] and tileBounds[2] > bounds[0] and
+                tileBounds[1] < bounds[3] and tileBounds[3] > bounds[1]):
+            intersecting.append(tilePath)
+    if not intersecting:
+        return None
+    
+    vrtPath = '/vsimem/' + uuid.uuid4().hex + '.vrt'
+    try:
+        with _timed('gdal_buildvrt', file=outputPath, tiles=len(intersecting)):
+            mosaic = gdal.BuildVRT(vrtPath, intersecting, outputBounds=bounds)
+        first = mosaic.GetRasterBand(1)
+        outputType = first.DataType
+        if noData is None:
+            noData = first.GetNoDataValue()
+        if noData is None and geometry is not None:
+            noData = BM_RADIANCE_FILL
+        creationOptions = _bm_creation_options(outputType, compress, predictor, cog)
+        outputFormat = 'COG' if cog else 'GTiff'
+        if not cog:
+            creationOptions = ['TILED=YES'] + creationOptions
+        
+        #A bounding box is a pixel window of the VRT, a geometry needs a cutline
+        if geometry is None:
+            with _timed('gdal_translate', file=outputPath):
+                gdal.Translate(outputPath, mosaic,
+                               options=gdal.TranslateOptions(format=outputFormat,
+                                                             noData='none' if noData is None else noData,
+                                                             creationOptions=creationOptions))
+        else:
+            with _timed('gdal_warp', file=outputPath):
+                gdal.Warp(outputPath, mosaic,
+                          options=gdal.WarpOptions(format=outputFormat,
+                                                   cutlineDSName=geometry,
+                                                   cropToCutline=False,
+                                                   dstNodata=noData,
+                                                   creationOptions=creationOptions))
+        mosaic = None
+    finally:
+        gdal.Unlink(vrtPath)
+    
+    return outputPath
+
+
+def _bm_mosaic_task(day, tilePaths, outputPath, bounds, **options):
+    """RUN ONE DAILY MOSAIC, REPORTING FAILURES
+    
+    Returns:
+        result: Tuple of (day, path of the mosaic or None, error message or None)
+    """
+    
+    try:
+        with _timed('bm_mosaic', day=day, tiles=len(tilePaths)):
+            outputPath = _bm_mosaic_day(tilePaths, outputPath, bounds, **options)
+        if outputPath is not None:
+            _count('files', stage='mosaic')
+            _count('bytes', os.path.getsize(outputPath), stage='mosaic')
+        return (day, outputPath, None)
+    except Exception as e:
+        return (day, None, repr(e))
+
+
+def bm_daily_mosaics(geotiffFolder,
+                     mosaicFolder,
+                     bounds=None,
+                     geometry=None,
+                     aoiName='aoi',
+                     workers=None,
+                     noData=None,
+                     compress='DEFLATE',
+                     predictor=None,
+                     cog=False):
+    """MOSAIC CONVERTED BLACK MARBLE TILES BY DAY AND CROP THEM TO AN AREA OF INTEREST
+    
+    Tiles written by bm_hd5_to_geotiff are grouped by acquisition day (the
+    A<year><day> component of their names), the tiles of each day that
+    intersect the area of interest are mosaicked through a VRT, and one
+    compact geotiff per day is written, cropped to the area of interest.
+    Mosaic names keep the VNP46A2 layout, with aoiName in place of the h/v
+    tile and a per-day product component, so gcloud_upload and
+    bmA2_gee_import handle them like tiles and create one asset per day.
+    
+    Args:
+        geotiffFolder: Str, path of directory containing the converted geotiffs
+        mosaicFolder: Str, path of target directory to place the daily mosaics
+        bounds: List of floats, [West, South, East, North] area of interest in EPSG:4326.
+            If None, the extent of geometry
+        geometry: Dictionary (GeoJSON) or Str (path of a vector file), area of interest.
+            Pixels outside it are set to nodata
+        aoiName: Str, tag of the area of interest in the mosaic file names (no dots)
+        workers: int, number of processes mosaicking days in parallel. If None, days are
+            mosaicked one by one in the current process
+        noData: number, nodata of the mosaics. If None, the nodata of the tiles (e.g. the
+            masked radiance of bm_hd5_to_geotiff(mask=True)), or BM_RADIANCE_FILL when
+            geometry is provided and the tiles have none
+        compress: Str, GeoTIFF compression, 'DEFLATE' by default. If None, uncompressed
+        predictor: int, predictor used with compress. If None, chosen from the data type
+        cog: Boolean, write Cloud Optimized GeoTIFFs
+    
+    Returns:
+        results: List of (day, mosaic path or None, error message or None) tuples in date
+            order. The path is None without an error when no tile of the day intersects
+    """
+    
+    if bounds is None and geometry is None:
+        raise ValueError('Either bounds or geometry must be provided')
+    if '.' in aoiName:
+        raise ValueError('aoiName cannot contain dots, they separate the components of the file name')
+    
+    #Derive bounds from the geometry, passing GeoJSON to GDAL as text
+    if isinstance(geometry, dict):
+        geometry = json.dumps(geometry)
+    if bounds is None:
+        layer = ogr.Open(geometry).GetLayer()
+        minX, maxX, minY, maxY = layer.GetExtent()
+        bounds = [minX, minY, maxX, maxY]
+    
+    #Group tiles by acquisition day
+    geotiffFolder = os.path.abspath(geotiffFolder)
+    mosaicFolder = os.path.abspath(mosaicFolder)
+    os.makedirs(mosaicFolder, exist_ok=True)
+    days = {}
+    for file in sorted(os.listdir(geotiffFolder)):
+        parts = file.split('.')
+        
+        #Only h/v tiles, never mosaics written to (or copied into) the same folder
+        if (file.endswith('.tif') and len(parts) == 6 and parts[1].startswith('A')
+                and re.fullmatch(r'h\d\dv\d\d', parts[2])):
+            days.setdefault(parts[1], []).append(file)
+    print('DAYS: ', len(days), ' TILES: ', sum(len(files) for files in days.values()))
+    
+    options = {'geometry': geometry, 'noData': noData, 'compress': compress, 'predictor': predictor, 'cog': cog}
+    tasks = [(day, [os.path.join(geotiffFolder, file) for file in files],
+              os.path.join(mosaicFolder, _bm_mosaic_name(files, aoiName))) for day, files in sorted(days.items())]
+    
+    index = 0
+    totalLength = len(tasks)
+    results = []
+    
+    if workers is None:
+        for day, tilePaths, outputPath in tasks:
+            results.append(_bm_mosaic_task(day, tilePaths, outputPath, bounds, **options))
+            
+            #Report on progress
+            index+=1
+            percentageComplete = index/totalLength*100
+            print(str(percentageComplete) + "% Complete")
+            _progress('bm_daily_mosaics', index, totalLength)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_bm_mosaic_task, day, tilePaths, outputPath, bounds, **options)
+                       for day, tilePaths, outputPath in tasks]
+            for future in as_completed(futures):
+                
+                #Report on progress
+                index+=1
+                percentageComplete = index/totalLength*100
+                print(str(percentageComplete) + "% Complete")
+                _progress('bm_daily_mosaics', index, totalLength)
+        
+        #Keep results in date order regardless of completion order
+        results = [future.result() for future in futures]
+    
+    #Report failed days
+    for day, outputPath, error in results:
+        if error is not None:
+            print('FAILED: ' + day + ' ' + error)
+    
+    return results
+
+        
+def _list_bucket(bucket):
+    """LIST THE FILE NAMES OF A GOOGLE CLOUD STORAGE BUCKET WITH gsutil ls"""
+    
+    filenames_raw = subprocess.getoutput('gsutil ls gs://' + bucket)
+    return [x[5:] for x in filenames_raw.split()]
+
+
+def bmA2_gee_import(bucket, destination, workers=None, **kwargs):
+    """IMPORT A COLLECTION OF VNP46A2 GEOTIFFS FROM GOOGLE CLOUD STORAGE INTO 
+        A GOOGLE EARTH ENGINE IMAGE COLLECTION
+    
+    Args:
+        bucket: Str, name of Google Cloud Storage bucket containing geotiff images to be imported
+        destination: Str, name of Google Earth Engine Image Collection to place images in
+        workers: int, if provided, submit ingestion tasks through the Python API with
+            bmA2_gee_import_batched instead of one earthengine command per file
+        **kwargs: further arguments passed to bmA2_gee_import_batched
+
+    Returns:
+        N/A, or the summary of bmA2_gee_import_batched if workers is provided
+    """
+    
+    if workers is not None:
+        return bmA2_gee_import_batched(bucket, destination, workers=workers, **kwargs)
+
+    #Generate list of files to be imported
+    filenames_split = _list_bucket(bucket)
+    totalLength = len(filenames_split)
+    print('Total Files ', totalLength)
+    
+    #Generate unique asset id names to avoid overwrites
+    base_names = [os.path.basename(os.path.normpath(file)) for file in filenames_split]
+    parsed = [parse_bm_filename(base_name) for base_name in base_names]
+    assetnames = _unique_asset_names([assetname for assetname, time_start in parsed])
+    
+    #Iterate through each filename
+    index = 0
+    for base_name, (_, time_start), assetname in zip(base_names, parsed, assetnames):
+        
+        vdate = time_start.strftime('%Y-%m-%dT%H:%M:%S')
+        timestring = ' --time_start=' + vdate
+        
+        #Generate command sequence for importing the asset
+        assetstring = ' --asset_id=users/' + destination + '/' + assetname
+        bucketstring = ' gs://' + bucket + '/' + base_name
+        commandstring = 'earthengine upload image' + assetstring + timestring + bucketstring
+        print(commandstring)
+        
+        #Run the command sequence
+        with _timed('earthengine_upload', asset=assetname):
+            subprocess.call(commandstring,
+                            shell=True)
+        _count('remote_calls', stage='ingest')
+        
+        index+=1
+        percentageComplete = index/totalLength*100
+        print(str(percentageComplete) + "% Complete")
+        _progress('bmA2_gee_import', index, totalLength)
+
+
+def bmA2_gee_import_batched(bucket,
+                            destination,
+                            workers=8,
+                            filenames=None,
+                            wait=True,
+                            pollInterval=10,
+                            unknownPolls=6,
+                            startIngestion=None,
+                            listOperations=None,
+                            newTaskId=None):
+    """IMPORT VNP46A2 GEOTIFFS FROM GOOGLE CLOUD STORAGE INTO A GOOGLE EARTH ENGINE 
+        IMAGE COLLECTION BY SUBMITTING INGESTION TASKS IN BULK
+    
+    Ingestion manifests are submitted with ee.data.startIngestion from a bounded
+    thread pool, then the submitted tasks are polled with ee.data.listOperations
+    until they finish, and a throughput report is printed. Each polling round lists
+    the operations of the project once (one request per page of operations, see
+    list_task_states) instead of requesting every task id separately. A task
+    missing from the listing, e.g. submitted too recently to be listed, is
+    polled again and only reported as UNKNOWN once it has been missing from
+    more than unknownPolls rounds in a row.
+    
+    Args:
+        bucket: Str, name of Google Cloud Storage bucket containing geotiff images to be imported
+        destination: Str, name of Google Earth Engine Image Collection to place images in (under users/)
+        workers: int, number of submissions in flight at the same time
+        filenames: List of str, names of the files in the bucket to import. If None, the bucket is listed with gsutil ls
+        wait: Boolean, poll the submitted tasks until every task has finished
+        pollInterval: float, seconds between polling rounds
+        unknownPolls: int, number of polling rounds in a row a task may be missing from the listing
+            before it is reported as UNKNOWN
+        startIngestion: callable with the signature of ee.data.startIngestion. Defaults to ee.data.startIngestion
+        listOperations: callable with the signature of ee.data.listOperations. Defaults to ee.data.listOperations
+        newTaskId: callable with the signature of ee.data.newTaskId. Defaults to ee.data.newTaskId
+
+    Returns:
+        summary: Dictionary with 'tasks' {asset id: task id}, 'states' {asset id: final state},
+            'failed' list of (asset id, error) tuples and 'submitSeconds' and 'totalSeconds' timings
+    """
+    
+    if startIngestion is None or newTaskId is None:
+        import ee
+    if startIngestion is None:
+        startIngestion = ee.data.startIngestion
+    if newTaskId is None:
+        newTaskId = ee.data.newTaskId
+    if filenames is None:
+        filenames = _list_bucket(bucket)
+    
+    #Build one ingestion manifest per file
+    base_names = [os.path.basename(os.path.normpath(file)) for file in filenames]
+    parsed = [parse_bm_filename(base_name) for base_name in base_names]
+    assetnames = _unique_asset_names([assetname for assetname, time_start in parsed])
+    manifests = []
+    for base_name, (_, time_start), assetname in zip(base_names, parsed, assetnames):
+        manifests.append({
+            'name': 'projects/earthengine-legacy/assets/users/' + destination + '/' + assetname,
+            'tilesets': [{'sources': [{'uris': ['gs://' + bucket + '/' + base_name]}]}],
+            'startTime': time_start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            })
+    print('Total Files ', len(manifests))
+    
+    summary = {'tasks': {}, 'states': {}, 'failed': []}
+    startTime = time.time()
+    
+    #Submit one ingestion task
+    def submit(manifest):
+        requestId = newTaskId()[0]
+        with _timed('start_ingestion', asset=manifest['name']):
+            response = startIngestion(requestId, manifest)
+        _count('remote_calls', stage='ingest')
+        return response.get('id', requestId) if isinstance(response, dict) else requestId
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(submit, manifest): manifest['name'] for manifest in manifests}
+        for future in as_completed(futures):
+            assetId = futures[future]
+            if future.exception() is None:
+                summary['tasks'][assetId] = future.result()
+            else:
+                summary['failed'].append((assetId, repr(future.exception())))
+    summary['submitSeconds'] = time.time() - startTime
+    print('SUBMITTED ', len(summary['tasks']), ' TASKS IN ', round(summary['submitSeconds'], 1), ' s (',
+          round(len(summary['tasks']) / max(summary['submitSeconds'], 1e-9), 2), ' tasks/s)')
+    
+    #Poll the submitted tasks until all have finished
+    assetByTask = {taskId: assetId for assetId, taskId in summary['tasks'].items()}
+    pending = list(assetByTask) if wait else []
+    unknownCounts = {}
+    while pending:
+        stillPending = []
+        for status in list_task_states(pending, listOperations=listOperations).values():
+            assetId = assetByTask[status['id']]
+            if status['state'] == 'UNKNOWN':
+                unknownCounts[status['id']] = unknownCounts.get(status['id'], 0) + 1
+            else:
+                unknownCounts.pop(status['id'], None)
+            if (status['state'] in ('COMPLETED', 'FAILED', 'CANCELLED')
+                    or unknownCounts.get(status['id'], 0) > unknownPolls):
+                summary['states'][assetId] = status['state']
+                if status['state'] != 'COMPLETED':
+                    summary['failed'].append((assetId, status.get('error_message', status['state'])))
+            else:
+                stillPending.append(status['id'])
+        pending = stillPending
+        
+        #Report on progress
+        percentageComplete = len(summary['states'])/max(len(assetByTask), 1)*100
+        print(str(percentageComplete) + "% Complete")
+        _progress('bmA2_gee_import', len(summary['states']), len(assetByTask))
+        if pending:
+            time.sleep(pollInterval)
+    
+    summary['totalSeconds'] = time.time() - startTime
+    completed = sum(1 for state in summary['states'].values() if state == 'COMPLETED')
+    print('COMPLETED ', completed, ' FAILED ', len(summary['failed']), ' IN ', round(summary['totalSeconds'], 1), ' s (',
+          round(completed / max(summary['totalSeconds'], 1e-9), 2), ' images/s)')
+    
+    summary['failed'].sort()
+    return summary
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Black Marble file and asset names.
+
+Only uses the standard library, so the pipeline, the cube and the zonal
+statistics can parse file names without importing GDAL through blackmarble.
+"""
+
+import os
+from datetime import datetime as dt
+from datetime import timedelta
+
+
+# =============================================================================
+# %% 10 - BLACK MARBLE FILE AND ASSET NAMES
+# =============================================================================
+
+def parse_bm_filename(file):
+    """PARSE THE ASSET ID NAME AND ACQUISITION TIME OF A VNP46A2 FILE NAME
+    
+    Args:
+        file: Str, path or name of a Black Marble file, e.g. 'VNP46A2.A2020001.h08v05.001.2020256150417.tif'
+    
+    Returns:
+        assetname: Str, central component of the asset id (the last 13 characters before the extension)
+        time_start: datetime, acquisition day combined with the hour, minute and second of the product name
+    """
+    
+    #Identify base name of the file and the date of image to serve as central component of asset id        
+    base_name = os.path.basename(os.path.normpath(file))
+    sep = '.'
+    date_name = base_name.split(sep)[1]
+    year = date_name[1:5]
+    daynum = date_name[5:8]
+    prod_name = base_name.split(sep)[4]
+    hour = prod_name[7:9]
+    minute = prod_name[9:11]
+    second = prod_name[11:13]
+    fulldate = dt(int(year), 1, 1) + timedelta(int(daynum) - 1)
+    time_start = fulldate.replace(hour=int(hour), minute=int(minute), second=int(second))
+    
+    #Concatante asset id name
+    assetname = base_name[-17:-4]
+    
+    return assetname, time_start
+
+
+def _unique_asset_names(assetnames):
+    """APPEND A COUNTER TO REPEATED ASSET NAMES TO AVOID OVERWRITES
+    
+    Args:
+        assetnames: List of str, asset names in import order
+    
+    Returns:
+        uniquenames: List of str, the n-th repeat of a name gets '_n' appended
+    """
+    
+    counts = {}
+    uniquenames = []
+    for assetname in assetnames:
+        assetflag = counts.get(assetname, 0)
+        counts[assetname] = assetflag + 1
+        uniquenames.append(assetname if assetflag == 0 else assetname + '_' + str(assetflag))
+    return uniquenames
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chunked memory-mapped time series cube of converted Black Marble GeoTIFFs.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from osgeo import gdal
+
+from .bm_names import parse_bm_filename
+
+
+# =============================================================================
+# %% 7 - LOCAL BLACK MARBLE TIME SERIES CUBE
+# =============================================================================
+
+class BlackMarbleCube():
+    """CHUNKED, MEMORY-MAPPED (time, band, y, x) CUBE OF DAILY BLACK MARBLE GEOTIFFS
+    
+    The raster grid is split into square spatial chunks. Each chunk is one raw 
+    binary file holding a (time, band, chunk y, chunk x) array, so appending a day 
+    appends one slab to every chunk file, and a query memory-maps and reads only 
+    the chunks its window touches. Dates come from the file names, parsed as in 
+    bmA2_gee_import, and are kept in cube.json with the grid metadata.
+    
+    Args:
+        path: Str, directory of an existing cube (see BlackMarbleCube.build to create one)
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'cube.json')) as f:
+            self.meta = json.load(f)
+    
+    @classmethod
+    def build(cls, path, rasterFiles, chunkSize=256):
+        """BUILD A CUBE FROM GEOTIFFS WRITTEN BY bm_hd5_to_geotiff
+        
+        Args:
+            path: Str, directory to create the cube in
+            rasterFiles: Str path of a directory of geotiffs, or list of geotiff paths. All must share one grid
+            chunkSize: int, side in pixels of the square spatial chunks
+        
+        Returns:
+            cube: BlackMarbleCube
+        """
+        
+        if isinstance(rasterFiles, str):
+            rasterFiles = [os.path.join(rasterFiles, name) for name in os.listdir(rasterFiles) if name.endswith('.tif')]
+        rasterFiles = sorted(rasterFiles, key=lambda rasterPath: parse_bm_filename(rasterPath)[1])
+        
+        #Take the grid from the first raster
+        dataset = gdal.Open(rasterFiles[0], gdal.GA_ReadOnly)
+        os.makedirs(path, exist_ok=True)
+        meta = {'xsize': dataset.RasterXSize,
+                'ysize': dataset.RasterYSize,
+                'bands': dataset.RasterCount,
+                'dtype': gdal.GetDataTypeName(dataset.GetRasterBand(1).DataType).lower(),
+                'geoTransform': list(dataset.GetGeoTransform()),
+                'projection': dataset.GetProjection(),
+                'chunkSize': chunkSize,
+                'dates': []}
+        dataset = None
+        cls._save_meta(path, meta)
+        
+        cube = cls(path)
+        for rasterPath in rasterFiles:
+            cube.append(rasterPath)
+        return cube
+    
+    @staticmethod
+    def _save_meta(path, meta):
+        tempPath = os.path.join(path, 'cube.json.tmp')
+        with open(tempPath, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tempPath, os.path.join(path, 'cube.json'))
+    
+    @property
+    def dates(self):
+        """DatetimeIndex of the cube's time steps, in storage order"""
+        
+        return pd.DatetimeIndex(pd.to_datetime(self.meta['dates']))
+    
+    @property
+    def dtype(self):
+        return np.dtype(self.meta['dtype'].replace('byte', 'uint8'))
+    
+    def _chunk_grid(self):
+        chunkSize = self.meta['chunkSize']
+        return (-(-self.meta['ysize'] // chunkSize), -(-self.meta['xsize'] // chunkSize))
+    
+    def _chunk_path(self, i, j):
+        return os.path.join(self.path, 'chunk_' + str(i) + '_' + str(j) + '.bin')
+    
+    def _slab_bytes(self):
+        chunkSize = self.meta['chunkSize']
+        return self.meta['bands'] * chunkSize * chunkSize * self.dtype.itemsize
+    
+    def append(self, rasterPath):
+        """APPEND ONE DAILY GEOTIFF TO THE CUBE, READING IT ONE CHUNK WINDOW AT A TIME
+        
+        Args:
+            rasterPath: Str, path of a geotiff on the cube's grid (same size, band count,
+                geotransform and projection). Raises ValueError otherwise
+        
+        Returns:
+            appended: Boolean, False if the date was already in the cube
+        """
+        
+        date = parse_bm_filename(rasterPath)[1].isoformat()
+        if date in self.meta['dates']:
+            print('SKIPPING ' + rasterPath + ', ' + date + ' ALREADY IN CUBE')
+            return False
+        
+        dataset = gdal.Open(rasterPath, gdal.GA_ReadOnly)
+        if (dataset.RasterXSize, dataset.RasterYSize, dataset.RasterCount) != (self.meta['xsize'], self.meta['ysize'], self.meta['bands']):
+            raise ValueError(rasterPath + ' does not match the grid of the cube')
+        
+        #Every VNP46A2 tile has the same size, so the location tells tiles apart
+        if not np.allclose(dataset.GetGeoTransform(), self.meta['geoTransform'], rtol=0, atol=1e-9):
+            raise ValueError(rasterPath + ' does not match the geotransform of the cube: '
+                             + str(list(dataset.GetGeoTransform())) + ' != ' + str(self.meta['geoTransform']))
+        if 'projection' in self.meta and dataset.GetProjection() != self.meta['projection']:
+            raise ValueError(rasterPath + ' does not match the projection of the cube')
+        
+        chunkSize = self.meta['chunkSize']
+        nChunkRows, nChunkCols = self._chunk_grid()
+        validBytes = len(self.meta['dates']) * self._slab_bytes()
+        for i in range(nChunkRows):
+            for j in range(nChunkCols):
+                yoff = i * chunkSize
+                xoff = j * chunkSize
+                height = min(chunkSize, self.meta['ysize'] - yoff)
+                width = min(chunkSize, self.meta['xsize'] - xoff)
+                
+                #Pad edge chunks to the full chunk size
+                slab = np.zeros((self.meta['bands'], chunkSize, chunkSize), dtype=self.dtype)
+                slab[:, :height, :width] = dataset.ReadAsArray(xoff, yoff, width, height).reshape(self.meta['bands'], height, width)
+                
+                #Drop slabs left over by an interrupted append before writing
+                with open(self._chunk_path(i, j), 'ab') as f:
+                    f.truncate(validBytes)
+                    f.write(slab.tobytes())
+        
+        self.meta['dates'].append(date)
+        self._save_meta(self.path, self.meta)
+        return True
+    
+    def _chunk(self, i, j):
+        chunkSize = self.meta['chunkSize']
+        return np.memmap(self._chunk_path(i, j), dtype=self.dtype, mode='r',
+                         shape=(len(self.meta['dates']), self.meta['bands'], chunkSize, chunkSize))
+    
+    def read_window(self, row0, row1, col0, col1, bands=None):
+        """READ A PIXEL WINDOW FOR EVERY DATE, TOUCHING ONLY THE CHUNKS IT OVERLAPS
+        
+        Args:
+            row0, row1: int, first and last (exclusive) pixel rows of the window
+            col0, col1: int, first and last (exclusive) pixel columns of the window
+            bands: List of int, 0-based bands to read. If None, all bands are read
+        
+        Returns:
+            dates: DatetimeIndex, sorted dates of the cube
+            values: numpy array of shape (time, band, row1 - row0, col1 - col0), in date order
+        """
+        
+        row0, col0 = max(row0, 0), max(col0, 0)
+        row1, col1 = min(row1, self.meta['ysize']), min(col1, self.meta['xsize'])
+        bands = list(range(self.meta['bands'])) if bands is None else list(bands)
+        chunkSize = self.meta['chunkSize']
+        values = np.empty((len(self.meta['dates']), len(bands), max(row1 - row0, 0), max(col1 - col0, 0)), dtype=self.dtype)
+        
+        for i in range(row0 // chunkSize, -(-row1 // chunkSize)):
+            for j in range(col0 // chunkSize, -(-col1 // chunkSize)):
+                
+                #Overlap of the window with this chunk, in cube pixel coordinates
+                r0, r1 = max(row0, i * chunkSize), min(row1, (i + 1) * chunkSize)
+                c0, c1 = max(col0, j * chunkSize), min(col1, (j + 1) * chunkSize)
+                chunk = self._chunk(i, j)
+                values[:, :, r0 - row0:r1 - row0, c0 - col0:c1 - col0] = \
+                    chunk[:, bands, r0 - i * chunkSize:r1 - i * chunkSize, c0 - j * chunkSize:c1 - j * chunkSize]
+                del chunk
+        
+        order = np.argsort(np.array(self.meta['dates'], dtype='datetime64[s]'), kind='stable')
+        return self.dates[order], values[order]
+    
+    def read_bbox(self, west, south, east, north, bands=None):
+        """READ THE PIXELS INSIDE A BOUNDING BOX FOR EVERY DATE
+        
+        Args:
+            west, south, east, north: float, bounding box in the coordinate system of the cube (EPSG:4326)
+            bands: List of int, 0-based bands to read. If None, all bands are read
+        
+        Returns:
+            dates, values: see read_window
+        """
+        
+        gt0, gt1, _, gt3, _, gt5 = self.meta['geoTransform']
+        col0 = int(np.floor((west - gt0) / gt1))
+        col1 = int(np.ceil((east - gt0) / gt1))
+        row0 = int(np.floor((north - gt3) / gt5))
+        row1 = int(np.ceil((south - gt3) / gt5))
+        return self.read_window(row0, row1, col0, col1, bands=bands)
+    
+    def pixel_series(self, row, col, band=0):
+        """GET THE TIME SERIES OF ONE PIXEL AND BAND AS A SERIES INDEXED BY DATE"""
+        
+        dates, values = self.read_window(row, row + 1, col, col + 1, bands=[band])
+        return pd.Series(values[:, 0, 0, 0], index=dates)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Folium display utilities for Earth Engine images.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+import folium
+
+
+# =============================================================================
+# %% 1 - DISPLAYING / FOLIUM UTILITIES             
+# =============================================================================
+
+#Time-bound cache of tile fetcher urls, keyed by image expression and vis params
+MAP_ID_TTL = 3600
+_map_id_cache = {}
+_map_id_lock = threading.Lock()
+
+
+def clear_map_id_cache():
+    """REMOVE EVERY ENTRY FROM THE MAP ID CACHE USED BY add_ee_layer"""
+    
+    with _map_id_lock:
+        _map_id_cache.clear()
+
+
+def get_tile_url(ee_image_object, vis_params, ttl=None):
+    """GET THE TILE FETCHER URL OF AN EARTH ENGINE IMAGE, REUSING RECENT MAP IDS
+    
+    Args:
+        ee_image_object: ee.Image to be mapped
+        vis_params: Dictionary of GEE visualization parameters
+        ttl: float, seconds a map id stays cached. If None, MAP_ID_TTL is used. 0 disables the cache
+    
+    Returns:
+        url_format: Str, tile url template of the image
+    """
+    
+    if ttl is None:
+        ttl = MAP_ID_TTL
+    image = ee.Image(ee_image_object)
+    key = hashlib.sha256((image.serialize() + json.dumps(vis_params, sort_keys=True, default=str)).encode()).hexdigest()
+    now = time.monotonic()
+    
+    #Evict stale entries and look for a fresh one
+    with _map_id_lock:
+        for staleKey in [k for k, (expires, url) in _map_id_cache.items() if expires <= now]:
+            del _map_id_cache[staleKey]
+        if ttl > 0 and key in _map_id_cache:
+            return _map_id_cache[key][1]
+    
+    url_format = image.getMapId(vis_params)['tile_fetcher'].url_format
+    if ttl > 0:
+        with _map_id_lock:
+            _map_id_cache[key] = (now + ttl, url_format)
+    return url_format
+
+
+def add_ee_layer(self, ee_image_object, vis_params, name, show=True, opacity=1, min_zoom=0, tiles=None):
+    """ From s2cloudless"""
+    """DEFINE A METHOD FOR DISPLAYING EARTH ENGINE IMAGE TILES TO A FOLIUM MAP
+    
+    Args:
+        ee_image_object: ee.Image to be mapped
+        vis_params: Dictionary of GEE visualization parameters
+        name: String, layer label to be shown in the legend
+        show: Boolean, defines whether to show layer by default on map
+        opacity: float, 0-1, defines opacity of layer, 1 is opaque, 0 is transparent
+        min_zoom: ???
+        tiles: Str, tile url template already requested for the image. If None, it is 
+            taken from get_tile_url, which reuses map ids cached within MAP_ID_TTL seconds
+    
+    Returns:
+        N/A
+    """
+    
+    if tiles is None:
+        tiles = get_tile_url(ee_image_object, vis_params)
+    folium.raster_layers.TileLayer(
+        tiles=tiles,
+        attr='Map Data &copy; <a href="https://earthengine.google.com/">Google Earth Engine</a>',
+        name=name,
+        show=show,
+        opacity=opacity,
+        min_zoom=min_zoom,
+        overlay=True,
+        control=True
+        ).add_to(self)
+
+
+def add_ee_layers(self, layers, workers=8):
+    """DEFINE A METHOD FOR DISPLAYING MANY EARTH ENGINE IMAGES TO A FOLIUM MAP AT ONCE
+    
+    Map ids of all layers are requested concurrently, then the layers are added 
+    to the map in the given order.
+    
+    Args:
+        layers: List of dictionaries with the arguments of add_ee_layer 
+            (ee_image_object, vis_params, name and optionally show, opacity, min_zoom)
+        workers: int, number of map id requests in flight at the same time
+    
+    Returns:
+        N/A
+    """
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        urls = list(executor.map(lambda layer: get_tile_url(layer['ee_image_object'], layer['vis_params']), layers))
+    
+    for layer, url in zip(layers, urls):
+        add_ee_layer(self, tiles=url, **layer)
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio variants of the getInfo-bound Earth Engine helpers.
+
+The blocking getInfo and ee.data calls run on a bounded thread pool, and a
+semaphore per Earth Engine project caps how many of them are in flight, so one
+event loop can fan out hundreds of reductions without exceeding the request
+limits of a project:
+
+    import asyncio
+    import gee_custom_utilities as gcu
+    dfs = asyncio.run(gcu.regions_reducer_many_async([(imgcol, tracts), (imgcol2, tracts)],
+                                                     ['DNB_BRDF_Corrected_NTL'], project='my-project'))
+
+ee is only imported by the wrapped helpers, so the runner itself is stdlib only.
+"""
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrumentation import _count, _get_info, _progress, _timed
+
+
+# =============================================================================
+# %% 9 - ASYNCIO EARTH ENGINE API
+# =============================================================================
+
+#Requests in flight per project when a runner is not given a limit for it
+DEFAULT_PROJECT_LIMIT = 8
+
+
+class AsyncEERunner():
+    """RUN BLOCKING EARTH ENGINE CALLS FROM ASYNCIO UNDER PER-PROJECT CONCURRENCY LIMITS
+
+    Calls run on a shared thread pool of maxWorkers threads. Each project has
+    its own semaphore, held until the blocking call has actually returned, so
+    a cancelled or timed out call still counts against its project until the
+    request it started is over. Calls still queued when they are cancelled are
+    dropped without running. Timeouts count from the moment a call starts
+    running on a thread, so calls queued behind maxWorkers (e.g. many projects
+    at their full limit) do not time out before they are sent.
+
+    Args:
+        maxWorkers: int, number of threads running blocking calls
+        projectLimit: int, number of calls in flight per project
+        projectLimits: Dictionary of project name to int, limits overriding projectLimit
+        timeout: float, default seconds a call may run on its thread before asyncio.TimeoutError is raised
+    """
+
+    def __init__(self, maxWorkers=32, projectLimit=DEFAULT_PROJECT_LIMIT, projectLimits=None, timeout=None):
+        self.maxWorkers = maxWorkers
+        self.projectLimit = projectLimit
+        self.projectLimits = dict(projectLimits or {})
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix='ee_async')
+
+        #Semaphores are bound to an event loop, so they are kept per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def semaphore(self, project=None):
+        """GET THE SEMAPHORE OF A PROJECT FOR THE RUNNING EVENT LOOP"""
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            if project not in semaphores:
+                semaphores[project] = asyncio.Semaphore(self.projectLimits.get(project, self.projectLimit))
+            return semaphores[project]
+
+    async def run(self, function, *args, project=None, timeout=None, **kwargs):
+        """AWAIT function(*args, **kwargs) RUN ON THE THREAD POOL
+
+        Args:
+            function: callable, blocking call to run
+            *args: positional arguments of function
+            project: Str, Earth Engine project the call counts against
+            timeout: float, seconds to wait for the call once it starts running. Defaults to the runner timeout
+            **kwargs: keyword arguments of function
+
+        Returns:
+            result: the return value of function
+        """
+
+        if timeout is None:
+            timeout = self.timeout
+        loop = asyncio.get_running_loop()
+        semaphore = self.semaphore(project)
+        await semaphore.acquire()
+
+        started = asyncio.Event()
+
+        def notify(callback):
+            try:
+                loop.call_soon_threadsafe(callback)
+            except RuntimeError:
+                pass #Event loop already closed
+
+        def call():
+            notify(started.set)
+            return function(*args, **kwargs)
+
+        #A call dropped before it starts also sets started, so nothing waits for it forever
+        def release(future):
+            notify(started.set)
+            notify(semaphore.release)
+
+        try:
+            future = self.executor.submit(call)
+        except BaseException:
+            semaphore.release()
+            raise
+        future.add_done_callback(release)
+
+        try:
+            if timeout is not None:
+                await started.wait()
+            return await asyncio.wait_for(asyncio.wrap_future(future, loop=loop), timeout)
+        except asyncio.TimeoutError:
+            _count('timeouts', function=getattr(function, '__name__', repr(function)), project=project)
+            raise
+        finally:
+            #Drops the call if it has not started, a running call keeps its semaphore until it returns
+            future.cancel()
+
+    def close(self, wait=False):
+        """SHUT DOWN THE THREAD POOL, DROPPING QUEUED CALLS"""
+
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+_default_runner = None
+_default_runner_lock = threading.Lock()
+
+
+def get_async_runner():
+    """GET THE SHARED AsyncEERunner USED WHEN NO runner IS PASSED"""
+
+    global _default_runner
+    with _default_runner_lock:
+        if _default_runner is None:
+            _default_runner = AsyncEERunner()
+        return _default_runner
+
+
+def set_async_runner(runner):
+    """REPLACE THE SHARED AsyncEERunner, e.g. TO CHANGE ITS LIMITS
+
+    Args:
+        runner: AsyncEERunner, or None to create a default runner on next use
+
+    Returns:
+        previous: AsyncEERunner, the runner replaced, or None
+    """
+
+    global _default_runner
+    with _default_runner_lock:
+        previous, _default_runner = _default_runner, runner
+        return previous
+
+
+async def time_series_regions_reducer_async(imgcol, bands, geometry, project=None, timeout=None, runner=None, **kwargs):
+    """ASYNC time_series_regions_reducer
+
+    Args:
+        imgcol: ee.ImageCollection to be reduced
+        bands: List of strings, bands of interest to be reduced
+        geometry: ee.FeatureCollection, regions to reduce over
+        project: Str, Earth Engine project the request counts against
+        timeout: float, seconds to wait for the reduction
+        runner: AsyncEERunner. Defaults to get_async_runner()
+        **kwargs: further arguments passed to time_series_regions_reducer
+
+    Returns:
+        df: Dataframe, see time_series_regions_reducer
+    """
+
+    from .ee_processing import time_series_regions_reducer
+
+    runner = runner or get_async_runner()
+    return await runner.run(time_series_regions_reducer, imgcol, bands, geometry,
+                            project=project, timeout=timeout, **kwargs)
+
+
+async def regions_reducer_many_async(pairs,
+                                     bands,
+                                     project=None,
+                                     timeout=None,
+                                     returnExceptions=True,
+                                     runner=None,
+                                     reduceFunction=None,
+                                     **kwargs):
+    """REDUCE MANY (COLLECTION, GEOMETRY) PAIRS CONCURRENTLY FROM ONE EVENT LOOP
+
+    Every pair is reduced in its own task; the project semaphore of the runner
+    decides how many run at once. Cancelling the call cancels every reduction
+    that has not finished.
+
+    Args:
+        pairs: List of (ee.ImageCollection, ee.FeatureCollection) tuples
+        bands: List of strings, bands of interest to be reduced
+        project: Str, Earth Engine project the requests count against
+        timeout: float, seconds to wait for each reduction
+        returnExceptions: Boolean, return the exception of a failed pair in its place instead of raising it
+        runner: AsyncEERunner. Defaults to get_async_runner()
+        reduceFunction: callable with the signature of time_series_regions_reducer. Defaults to
+            time_series_regions_reducer
+        **kwargs: further arguments passed to reduceFunction
+
+    Returns:
+        results: List of Dataframes (or exceptions), in the order of pairs
+    """
+
+    if reduceFunction is None:
+        from .ee_processing import time_series_regions_reducer as reduceFunction
+    runner = runner or get_async_runner()
+    pairs = list(pairs)
+
+    progress = {'done': 0}
+
+    async def reduce(imgcol, geometry):
+        try:
+            return await runner.run(reduceFunction, imgcol, bands, geometry, project=project, timeout=timeout, **kwargs)
+        finally:
+            progress['done'] += 1
+            _progress('regions_reducer_many_async', progress['done'], len(pairs))
+
+    return await asyncio.gather(*(reduce(imgcol, geometry) for imgcol, geometry in pairs),
+                                return_exceptions=returnExceptions)
+
+
+async def fc_to_dict_async(fc,
+                           pageSize=None,
+                           project=None,
+                           timeout=None,
+                           runner=None,
+                           schemaFunction=None,
+                           pageFunction=None):
+    """ASYNC fc_to_dict, RETURNING THE PROPERTIES ON THE CLIENT
+
+    Args:
+        fc: ee.FeatureCollection
+        pageSize: int, if provided, the size and first-page schema are requested first and the
+            collection is then requested in pages of pageSize features concurrently (see fc_to_batches).
+            If None, the ee.Dictionary of fc_to_dict is requested in one getInfo call
+        project: Str, Earth Engine project the requests count against
+        timeout: float, seconds to wait for each request
+        runner: AsyncEERunner. Defaults to get_async_runner()
+        schemaFunction: callable taking (fc, pageSize) and returning (count, property names).
+            Defaults to _fc_schema
+        pageFunction: callable taking (fc, offset, pageSize) and returning a list of property
+            dictionaries. Defaults to _fc_page
+
+    Returns:
+        properties: Dictionary of property name to list of values, one per feature. Paged requests
+            fill properties missing from a feature with None, and add the properties missing from
+            the first page after its own
+    """
+
+    from .ee_processing import fc_to_dict, _fc_schema, _fc_page
+
+    runner = runner or get_async_runner()
+
+    if pageSize is None:
+        return await runner.run(_get_info, fc_to_dict(fc), 'fc_to_dict_async', project=project, timeout=timeout)
+
+    if schemaFunction is None:
+        schemaFunction = _fc_schema
+    if pageFunction is None:
+        pageFunction = _fc_page
+
+    count, prop_names = await runner.run(schemaFunction, fc, pageSize, project=project, timeout=timeout)
+    pages = await asyncio.gather(*(runner.run(pageFunction, fc, offset, pageSize, project=project, timeout=timeout)
+                                   for offset in range(0, count, pageSize)))
+    
+    #Add the properties missing from the first page
+    prop_names = list(prop_names) + sorted(set(name for records in pages for record in records for name in record)
+                                           - set(prop_names))
+
+    return {name: [record.get(name) for records in pages for record in records] for name in prop_names}
+
+
+async def delete_collection_contents_async(collection_title,
+                                           project=None,
+                                           timeout=None,
+                                           retries=5,
+                                           backoff=1.0,
+                                           dryRun=False,
+                                           pageSize=1000,
+                                           runner=None,
+                                           listAssets=None,
+                                           deleteAsset=None):
+    """ASYNC delete_collection_contents_batched
+
+    Assets are listed page by page and deleted in one task each, with the
+    project semaphore of the runner limiting the deletions in flight.
+    Deletions that fail with a quota or rate-limit error are retried with
+    backoff, without holding the semaphore while waiting.
+
+    Args:
+        collection_title: Str, full path of image collection
+        project: Str, Earth Engine project the requests count against
+        timeout: float, seconds to wait for each request
+        retries: int, number of times a deletion failing on quota is retried
+        backoff: float, seconds to wait before the first retry, doubled for each further retry
+        dryRun: Boolean, only list the assets that would be deleted
+        pageSize: int, number of assets requested per listing page
+        runner: AsyncEERunner. Defaults to get_async_runner()
+        listAssets: callable with the signature of ee.data.listAssets. Defaults to ee.data.listAssets
+        deleteAsset: callable with the signature of ee.data.deleteAsset. Defaults to ee.data.deleteAsset
+
+    Returns:
+        summary: Dictionary with lists of 'assets' listed, 'deleted' assets and 'failed' (asset, error) tuples
+    """
+
+    from .assets import list_collection_assets, _is_quota_error
+
+    runner = runner or get_async_runner()
+    if deleteAsset is None:
+        import ee
+        deleteAsset = ee.data.deleteAsset
+
+    names = await runner.run(list_collection_assets, collection_title, pageSize=pageSize, listAssets=listAssets,
+                             project=project, timeout=timeout)
+    print('NUMBER OF IMAGES TO BE DELETED: ', len(names))
+    summary = {'assets': names, 'deleted': [], 'failed': []}
+    if dryRun:
+        return summary
+
+    def delete_one(name):
+        with _timed('delete_asset', asset=name):
+            deleteAsset(name)
+
+    progress = {'done': 0}
+
+    #Delete one asset, retrying quota errors with backoff
+    async def delete(name):
+        try:
+            for attempt in range(retries + 1):
+                _count('remote_calls', stage='delete')
+                try:
+                    await runner.run(delete_one, name, project=project, timeout=timeout)
+                    summary['deleted'].append(name)
+                    return
+                except Exception as e:
+                    if attempt == retries or not _is_quota_error(e):
+                        summary['failed'].append((name, repr(e)))
+                        return
+                _count('retries', stage='delete')
+                await asyncio.sleep(backoff * 2 ** attempt)
+        finally:
+            progress['done'] += 1
+            _progress('delete_collection_contents', progress['done'], len(names))
+            if progress['done'] % 100 == 0 or progress['done'] == len(names):
+                percentageComplete = progress['done']/len(names)*100
+                print(str(percentageComplete) + "% Complete")
+
+    await asyncio.gather(*(delete(name) for name in names))
+
+    summary['deleted'].sort()
+    summary['failed'].sort()
+    return summary
@@ -0,0 +1,972 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Earth Engine data processing: FeatureCollection export and time series regions reducers.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+import numpy as np
+import pandas as pd
+
+from .analysis import _convert_timeunit, _time_column
+from .instrumentation import _count, _get_info, _timed
+
+
+# =============================================================================
+# %% 2 - GEE DATA PROCESSING UTILITIES             
+# =============================================================================
+
+# Define a function to transfer feature properties to a dictionary.
+def fc_to_dict(fc):
+    """DEFINE A FUNCTION TO TRANSFER FEATURE PROPERITIES TO A DICTIONARY
+    
+    Args:
+        fc: ee.FeatureCollection
+    
+    Returns:
+        ee.Dictionary with properties of each feature
+    """
+    
+    prop_names = fc.first().propertyNames()
+    prop_lists = fc.reduceColumns(
+        reducer=ee.Reducer.toList().repeat(prop_names.size()),
+        selectors=prop_names).get('list')
+  
+    return ee.Dictionary.fromLists(prop_names, prop_lists)
+
+
+def _fc_schema(fc, pageSize=5000):
+    """GET THE SIZE AND THE PROPERTY NAMES OF THE FIRST PAGE OF A FEATURECOLLECTION IN ONE REQUEST
+    
+    Only the first pageSize features are aggregated, so the request does not grow
+    with the size of the collection.
+    
+    Args:
+        fc: ee.FeatureCollection
+        pageSize: int, number of features in the first page
+    
+    Returns:
+        count: int, number of features
+        prop_names: List of str, sorted union of the property names of the features of the first page
+    """
+    
+    prop_names = ee.List(fc.limit(pageSize).map(lambda feat: ee.Feature(None, {'names': feat.propertyNames()}))
+                         .aggregate_array('names')).flatten().distinct().sort()
+    info = _get_info(ee.Dictionary({'count': fc.size(), 'names': prop_names}), 'fc_to_batches')
+    return info['count'], info['names']
+
+
+def _fc_page(fc, offset, pageSize):
+    """GET THE PROPERTIES OF ONE PAGE OF FEATURES OF A FEATURECOLLECTION
+    
+    Args:
+        fc: ee.FeatureCollection
+        offset: int, index of the first feature of the page
+        pageSize: int, number of features in the page
+    
+    Returns:
+        records: List of dictionaries, properties of each feature including system:index, without geometry
+    """
+    
+    #toDictionary drops system properties, but propertyNames (the schema) keeps system:index
+    def feature_properties(feat):
+        feat = ee.Feature(feat)
+        return feat.toDictionary().set('system:index', feat.get('system:index'))
+    
+    return _get_info(fc.toList(pageSize, offset).map(feature_properties), 'fc_to_batches', offset=offset)
+
+
+def fc_to_batches(fc, pageSize=5000, asArrow=False, arrowSchema=None, schemaFunction=None, pageFunction=None):
+    """STREAM THE FEATURE PROPERTIES OF A FEATURECOLLECTION PAGE BY PAGE
+    
+    Unlike fc_to_dict, which reads property names from the first feature and pulls
+    every column in one request, the property names are the union over the
+    features of each page and the collection is requested in pages of pageSize
+    features, so neither the requests nor local memory grow with the size of the
+    collection. The columns are the property names of the first page; properties
+    first seen on a later page are appended as new columns from that page on.
+    
+    Args:
+        fc: ee.FeatureCollection
+        pageSize: int, number of features requested per page
+        asArrow: Boolean, yield pyarrow.RecordBatch instead of pandas DataFrames
+        arrowSchema: pyarrow.Schema every batch is cast to when asArrow is True. If None, each column
+            takes the type inferred from the first batch that has it, with integer and all-null
+            columns widened to float64 since Earth Engine returns untyped JSON numbers
+        schemaFunction: callable taking (fc, pageSize) and returning (count, property names).
+            Defaults to _fc_schema
+        pageFunction: callable taking (fc, offset, pageSize) and returning a list of property
+            dictionaries. Defaults to _fc_page
+    
+    Yields:
+        batch: DataFrame (or pyarrow.RecordBatch) of up to pageSize features, with one column per
+            property name in the same order for every batch (and the same type for every
+            RecordBatch). An empty collection yields a single empty batch
+    """
+    
+    if schemaFunction is None:
+        schemaFunction = _fc_schema
+    if pageFunction is None:
+        pageFunction = _fc_page
+    
+    count, prop_names = schemaFunction(fc, pageSize)
+    columns = list(prop_names)
+    schema = arrowSchema
+    
+    for offset in range(0, max(count, 1), pageSize):
+        records = pageFunction(fc, offset, pageSize) if count else []
+        
+        #Append properties missing from the first page
+        known = set(columns)
+        columns += sorted(set(name for record in records for name in record) - known)
+        batch = pd.DataFrame.from_records(records, columns=columns)
+        
+        if asArrow:
+            import pyarrow
+            
+            #Fix the type of each column the first time it is seen
+            missing = [name for name in columns if schema is None or name not in schema.names]
+            if missing or schema is None:
+                fields = [pyarrow.field(field.name, pyarrow.float64())
+                          if pyarrow.types.is_null(field.type) or pyarrow.types.is_integer(field.type) else field
+                          for field in pyarrow.Schema.from_pandas(batch[missing], preserve_index=False)]
+                schema = pyarrow.schema(list(schema or []) + fields)
+            batch = pyarrow.RecordBatch.from_pandas(batch.reindex(columns=schema.names), preserve_index=False)
+            batch = batch.cast(schema)
+        yield batch
+
+
+def fc_to_dataframe(fc, pageSize=5000, **kwargs):
+    """COLLECT THE FEATURE PROPERTIES OF A FEATURECOLLECTION INTO ONE DATAFRAME, PAGE BY PAGE
+    
+    Args:
+        fc: ee.FeatureCollection
+        pageSize: int, number of features requested per page
+        **kwargs: further arguments passed to fc_to_batches
+    
+    Returns:
+        df: DataFrame with one row per feature and one column per property name
+    """
+    
+    kwargs['asArrow'] = False
+    return pd.concat(fc_to_batches(fc, pageSize=pageSize, **kwargs), ignore_index=True)
+
+
+
+def time_series_regions_reducer(imgcol, 
+                                bands, 
+                                geometry, 
+                                FeatureID='BAIRRO', 
+                                timescale = 'system:time_start', 
+                                timeunit = 'integer',
+                                stats='median', 
+                                scale=470,
+                                dateChunks=None,
+                                workers=4,
+                                cache=None,
+                                collectionId=None,
+                                engine='lists',
+                                allowPartial=False):
+    
+    """DEVELOP A DATAFRAME FROM A REGIONS REDUCER OF AN IMAGE COLLECTION
+    
+    Args:
+        imgcol: ee.ImageCollection to be reduced
+        bands: List of strings, bands of interest to be reduced
+        geometry: ee.FeatureCollection, regions to reduce over
+        FeatureID: str, property of each feature geometry to use as column labels in output
+        timescale: str, property of each image in imgcol to use as the designation of time
+        timeunit: str, format of timescale. If 'date', function will try to convert to datetime
+        stats: str, type of reducer to be performed, or list of str to compute several statistics
+            in a single pass ('mean', 'median', 'max', 'min', 'count' or percentiles as 'p10', 'p90'...),
+            see _multi_stat_regions_reducer
+        scale: int, spatial scale to reduce at
+        dateChunks: int (days) or pandas frequency string (e.g. 'QS', 'YS'). If provided, imgcol is
+            split into date ranges that are reduced concurrently, see time_series_regions_reducer_chunked
+        workers: int, number of date ranges requested at the same time when dateChunks is provided
+        cache: RegionsReducerCache or str path of a cache database. If provided, only images whose
+            system:time_start is not already cached are reduced, see RegionsReducerCache
+        collectionId: str, identifier of imgcol used in the cache key. If None, the asset id of
+            imgcol is used, see _collection_id
+        engine: str, 'lists' packs each image's statistics into image properties (the original
+            approach). 'flat' maps reduceRegions over imgcol into a single FeatureCollection of
+            (image, feature, statistic, value) rows that is pivoted on the client, see _flat_regions_reducer.
+            'flat' requires an ee.FeatureCollection geometry
+        allowPartial: Boolean, when dateChunks is provided, return the date ranges that succeeded
+            instead of raising PartialResultError if some ranges fail every retry, see
+            time_series_regions_reducer_chunked
+    
+    Returns:
+        df: Dataframe based on reduced statistics with (FeatureIDs + timescale) as columns and rows for each image
+    """
+    
+    #Only reduce images missing from the cache if requested
+    if cache is not None:
+        return _cached_time_series_regions_reducer(imgcol, bands, geometry, cache,
+                                                   collectionId=collectionId,
+                                                   FeatureID=FeatureID,
+                                                   timescale=timescale,
+                                                   timeunit=timeunit,
+                                                   stats=stats,
+                                                   scale=scale,
+                                                   dateChunks=dateChunks,
+                                                   workers=workers,
+                                                   engine=engine,
+                                                   allowPartial=allowPartial)
+    
+    #Split into concurrent date range requests if requested
+    if dateChunks is not None:
+        return time_series_regions_reducer_chunked(imgcol, bands, geometry,
+                                                   dateChunks=dateChunks,
+                                                   workers=workers,
+                                                   FeatureID=FeatureID,
+                                                   timescale=timescale,
+                                                   timeunit=timeunit,
+                                                   stats=stats,
+                                                   scale=scale,
+                                                   engine=engine,
+                                                   allowPartial=allowPartial)
+    
+    #Reduce into a flat table of rows if requested
+    if engine == 'flat':
+        return _flat_regions_reducer(imgcol, bands, geometry,
+                                     FeatureID=FeatureID,
+                                     timeunit=timeunit,
+                                     stats=stats,
+                                     scale=scale)
+    
+    #Combine a list of statistics into a single reduction pass
+    if not isinstance(stats, str):
+        return _multi_stat_regions_reducer(imgcol, bands, geometry,
+                                           FeatureID=FeatureID,
+                                           timeunit=timeunit,
+                                           stats=stats,
+                                           scale=scale)
+    
+    #Check for reducer type
+    if stats == 'mean':
+        fun = ee.Reducer.mean()
+    elif stats == 'median':
+        fun = ee.Reducer.median()
+    elif stats == 'max':
+        fun = ee.Reducer.max()
+    elif stats == 'min':
+        fun = ee.Reducer.min()
+    
+    #Function for flattening ee.Lists generated  by Reducer.toList in particular way
+    def list_simplify(entry):
+        val = ee.List(entry).get(0)
+        return val
+
+    #Mapping function to conduct reduction on each image
+    def run_reduce(img):
+        
+        if type(geometry) is ee.featurecollection.FeatureCollection:
+            feat_reduce = (img.select(bands).reduceRegions(
+                        collection = geometry,
+                        reducer = fun,
+                        scale = scale))
+            
+            #Convert reduction to lists
+            data_list_bairro = ee.List(feat_reduce.reduceColumns(ee.Reducer.toList(1), [FeatureID]).get('list'))
+            data_list_median = ee.List(feat_reduce.reduceColumns(ee.Reducer.toList(1), [stats]).get('list'))
+            data_list_bairro_simple = ee.List(data_list_bairro.map(list_simplify))
+            data_list_median_simple = ee.List(data_list_median.map(list_simplify))
+            
+            #Replace null values with -999999
+            data_list_median_simple = ee.Algorithms.If(data_list_median_simple.length().lt(ee.List(data_list_bairro_simple).length())
+                                                       ,ee.List.repeat(-999999,data_list_bairro_simple.length()),
+                                                       data_list_median_simple)
+        
+            #Convert from lists to dictionary
+            data_dict = ee.Dictionary.fromLists(data_list_bairro_simple, data_list_median_simple)
+        
+        else:
+            feat_reduce = (img.select(bands).reduceRegion(
+                        geometry = geometry,
+                        reducer = fun,
+                        scale = scale))
+            data_dict = ee.Dictionary(feat_reduce)
+        #Return original image with reduced statistics added as properties
+        return img.set(data_dict)
+    
+    #Run reduction on imgcol
+    reduced_collection = imgcol.map(run_reduce)
+    
+    if type(geometry) is ee.featurecollection.FeatureCollection:
+        #Generate lists of dataframe column names
+        bairros_list_temp = ee.List(geometry.reduceColumns(ee.Reducer.toList(1), [FeatureID]).get('list'))
+        bairros_list = bairros_list_temp.map(list_simplify)
+        bairros_list_complete = bairros_list.add('system:time_start')
+        
+        #Extract reduced statistics from image collection into list
+        nested_list = reduced_collection.reduceColumns(ee.Reducer.toList(bairros_list_complete.length()), bairros_list_complete).values().get(0)
+    
+        #Convert reduced statistics into dataframe and convert null values to NaN
+        df = (pd.DataFrame(_get_info(nested_list, 'time_series_regions_reducer'),
+                           columns=list(_get_info(bairros_list_complete, 'time_series_regions_reducer'))).replace(-999999,np.nan))
+    else:
+        bairros_list_temp = ee.List(bands)
+        bairros_list_complete = bairros_list_temp.add('system:time_start')
+        
+        #Extract reduced statistics from image collection into list
+        nested_list = reduced_collection.reduceColumns(ee.Reducer.toList(bairros_list_complete.length()), bairros_list_complete).values().get(0)
+    
+        #Convert reduced statistics into dataframe and convert null values to NaN
+        df = (pd.DataFrame(_get_info(nested_list, 'time_series_regions_reducer'),
+                           columns=list(_get_info(bairros_list_complete, 'time_series_regions_reducer'))).replace(-999999,np.nan))
+   
+    #Convert timeunit if appropriate
+    return _convert_timeunit(df, timeunit)
+
+
+def _stats_reducer(stats):
+    """COMBINE A LIST OF STATISTICS INTO ONE REDUCER WITH SHARED INPUTS
+    
+    Args:
+        stats: List of str, 'mean', 'median', 'max', 'min', 'count' or percentiles as 'p10', 'p90'...
+    
+    Returns:
+        fun: ee.Reducer computing every statistic in one pass, with outputs named as in stats
+    """
+    
+    def single_reducer(stat):
+        if stat == 'mean':
+            return ee.Reducer.mean()
+        elif stat == 'median':
+            return ee.Reducer.median()
+        elif stat == 'max':
+            return ee.Reducer.max()
+        elif stat == 'min':
+            return ee.Reducer.min()
+        elif stat == 'count':
+            return ee.Reducer.count()
+        elif stat[0] == 'p' and stat[1:].isdigit():
+            return ee.Reducer.percentile([int(stat[1:])])
+        raise ValueError('Unsupported statistic: ' + str(stat))
+    
+    fun = single_reducer(stats[0])
+    for stat in stats[1:]:
+        fun = fun.combine(single_reducer(stat), sharedInputs=True)
+    return fun
+
+
+def _stat_output_names(bands, stats, isCollection):
+    """NAME THE OUTPUTS OF A REGIONS REDUCTION THE WAY EARTH ENGINE DOES
+    
+    Args:
+        bands: List of strings, bands being reduced
+        stats: List of str, statistics being computed, see _stats_reducer
+        isCollection: Boolean, True for reduceRegions over an ee.FeatureCollection, False for reduceRegion
+    
+    Returns:
+        outputNames: List of str, property names produced by the reduction
+        statLabels: List of str, statistic label of each output, '<band>_<statistic>' when several bands are reduced
+    """
+    
+    if isCollection and len(bands) == 1:
+        return list(stats), list(stats)
+    statLabels = [band + '_' + stat for band in bands for stat in stats]
+    outputNames = list(bands) if len(stats) == 1 else statLabels
+    return outputNames, statLabels
+
+
+def _flat_regions_reducer(imgcol, bands, geometry, FeatureID='BAIRRO',
+                          timeunit='integer', stats='median', scale=470):
+    """DEVELOP A DATAFRAME FROM A FLATTENED REGIONS REDUCTION OF AN IMAGE COLLECTION
+    
+    reduceRegions is mapped over imgcol and every non-null statistic becomes one
+    (image, feature, statistic, value) row of a single flattened FeatureCollection.
+    The rows, the feature IDs and the image times come back in one getInfo and are
+    pivoted on the client, so a null statistic only leaves its own cell as NaN
+    instead of blanking the whole image row.
+    
+    Args:
+        imgcol, bands, FeatureID, timeunit, scale: see time_series_regions_reducer
+        geometry: ee.FeatureCollection, regions to reduce over
+        stats: str or list of str, statistics to compute, see _stats_reducer
+    
+    Returns:
+        df: Dataframe with the same columns time_series_regions_reducer returns for stats: FeatureIDs +
+            system:time_start for a single statistic of a single band, (FeatureID, statistic) MultiIndex
+            columns otherwise. Rows for each image, in system:time_start order
+    """
+    
+    if type(geometry) is not ee.featurecollection.FeatureCollection:
+        raise ValueError("engine='flat' requires an ee.FeatureCollection geometry")
+    
+    multiStats = not isinstance(stats, str)
+    statList = list(stats) if multiStats else [stats]
+    fun = _stats_reducer(statList)
+    outputNames, statLabels = _stat_output_names(bands, statList, True)
+    
+    #Mapping function turning each image reduction into rows
+    def flatten_image(img):
+        feat_reduce = (img.select(bands).reduceRegions(
+                    collection = geometry,
+                    reducer = fun,
+                    scale = scale))
+        imageIndex = img.get('system:index')
+        
+        def stat_rows(name):
+            return (feat_reduce.filter(ee.Filter.notNull([name]))
+                    .map(lambda feat: ee.Feature(None, {'image': imageIndex,
+                                                        'feature': feat.get(FeatureID),
+                                                        'stat': name,
+                                                        'value': feat.get(name)})))
+        
+        rows = stat_rows(outputNames[0])
+        for name in outputNames[1:]:
+            rows = rows.merge(stat_rows(name))
+        return rows
+    
+    flat_rows = ee.FeatureCollection(imgcol.map(flatten_image)).flatten()
+    
+    #Request rows, feature IDs and image times in a single round trip
+    info = _get_info(ee.Dictionary({
+        'rows': flat_rows.reduceColumns(ee.Reducer.toList(4), ['image', 'feature', 'stat', 'value']).get('list'),
+        'features': geometry.aggregate_array(FeatureID),
+        'images': imgcol.reduceColumns(ee.Reducer.toList(2), ['system:index', 'system:time_start']).get('list'),
+        }), '_flat_regions_reducer')
+    
+    df = _pivot_flat_rows(info, outputNames, statLabels, singleLevel=not multiStats and len(statLabels) == 1)
+    
+    return _convert_timeunit(df, timeunit)
+
+
+def _pivot_flat_rows(info, outputNames, statLabels, singleLevel=False):
+    """PIVOT FLATTENED (image, feature, statistic, value) ROWS INTO A REDUCER DATAFRAME
+    
+    Args:
+        info: Dictionary with 'rows' list of [image, feature, statistic, value], 'features' list of
+            FeatureIDs and 'images' list of [system:index, system:time_start], as requested by _flat_regions_reducer
+        outputNames: List of str, statistic property names found in the rows
+        statLabels: List of str, column label of each output name
+        singleLevel: Boolean, label columns by FeatureID only (for a single statistic)
+    
+    Returns:
+        df: Dataframe with one column per (feature, statistic) and system:time_start, rows for each image in time order
+    """
+    
+    #Pivot rows into one column per (feature, statistic)
+    rows = pd.DataFrame(info['rows'], columns=['image', 'feature', 'stat', 'value'])
+    rows['stat'] = rows['stat'].map(dict(zip(outputNames, statLabels)))
+    rows = rows.drop_duplicates(['image', 'feature', 'stat'], keep='last')
+    wide = rows.set_index(['image', 'feature', 'stat'])['value'].unstack(['feature', 'stat'])
+    
+    images = (pd.DataFrame(info['images'], columns=['image', 'system:time_start'])
+              .sort_values('system:time_start', kind='stable'))
+    features = list(dict.fromkeys(info['features']))
+    columnTuples = [(feature, label) for feature in features for label in statLabels]
+    wide = wide.reindex(index=images['image'], columns=pd.MultiIndex.from_tuples(columnTuples))
+    
+    df = wide.reset_index(drop=True).astype(float)
+    df[('system:time_start', '')] = images['system:time_start'].to_numpy()
+    
+    #Keep the original single-level columns for a single statistic
+    if singleLevel:
+        df.columns = features + ['system:time_start']
+    
+    return df
+
+
+def _multi_stat_regions_reducer(imgcol, bands, geometry, FeatureID='BAIRRO', 
+                                timeunit='integer', stats=('mean', 'median'), scale=470):
+    """DEVELOP A MULTI-STATISTIC DATAFRAME FROM A SINGLE REGIONS REDUCER PASS
+    
+    Args:
+        imgcol, bands, geometry, FeatureID, timeunit, scale: see time_series_regions_reducer
+        stats: List of str, statistics to compute, see _stats_reducer
+    
+    Returns:
+        df: Dataframe with (FeatureID, statistic) MultiIndex columns for an ee.FeatureCollection geometry,
+            or (band, statistic) columns otherwise, plus ('system:time_start', '') and rows for each image.
+            With several bands and a FeatureCollection, statistics are labelled '<band>_<statistic>'
+    """
+    
+    stats = list(stats)
+    fun = _stats_reducer(stats)
+    isCollection = type(geometry) is ee.featurecollection.FeatureCollection
+    outputNames, statLabels = _stat_output_names(bands, stats, isCollection)
+    if not isCollection:
+        columnTuples = [(band, stat) for band in bands for stat in stats]
+    
+    #Function for flattening ee.Lists generated  by Reducer.toList in particular way
+    def list_simplify(entry):
+        val = ee.List(entry).get(0)
+        return val
+    
+    #Mapping function to conduct reduction on each image
+    def run_reduce(img):
+        
+        if isCollection:
+            feat_reduce = (img.select(bands).reduceRegions(
+                        collection = geometry,
+                        reducer = fun,
+                        scale = scale))
+            data_list_bairro = ee.List(feat_reduce.reduceColumns(ee.Reducer.toList(1), [FeatureID]).get('list'))
+            data_list_bairro_simple = ee.List(data_list_bairro.map(list_simplify))
+            
+            #Convert each statistic to a list keyed by '<feature>|<statistic>'
+            keys = ee.List([])
+            values = ee.List([])
+            for name in outputNames:
+                data_list_stat = ee.List(feat_reduce.reduceColumns(ee.Reducer.toList(1), [name]).get('list'))
+                data_list_stat_simple = ee.List(data_list_stat.map(list_simplify))
+                
+                #Replace null values with -999999
+                data_list_stat_simple = ee.Algorithms.If(data_list_stat_simple.length().lt(data_list_bairro_simple.length()),
+                                                         ee.List.repeat(-999999,data_list_bairro_simple.length()),
+                                                         data_list_stat_simple)
+                keys = keys.cat(data_list_bairro_simple.map(lambda feature, name=name: ee.String(feature).cat('|' + name)))
+                values = values.cat(ee.List(data_list_stat_simple))
+            data_dict = ee.Dictionary.fromLists(keys, values)
+        
+        else:
+            data_dict = ee.Dictionary(img.select(bands).reduceRegion(
+                        geometry = geometry,
+                        reducer = fun,
+                        scale = scale))
+        #Return original image with reduced statistics added as properties
+        return img.set(data_dict)
+    
+    #Run reduction on imgcol
+    reduced_collection = imgcol.map(run_reduce)
+    
+    #Generate lists of dataframe column names
+    if isCollection:
+        bairros_list_temp = ee.List(geometry.reduceColumns(ee.Reducer.toList(1), [FeatureID]).get('list'))
+        bairros_list = _get_info(bairros_list_temp.map(list_simplify), '_multi_stat_regions_reducer')
+        selectors = [str(bairro) + '|' + name for bairro in bairros_list for name in outputNames]
+        columnTuples = [(bairro, label) for bairro in bairros_list for label in statLabels]
+    else:
+        selectors = list(outputNames)
+    selectors.append('system:time_start')
+    columnTuples.append(('system:time_start', ''))
+    
+    #Extract reduced statistics from image collection into list
+    nested_list = reduced_collection.reduceColumns(ee.Reducer.toList(len(selectors)), selectors).values().get(0)
+    
+    #Convert reduced statistics into dataframe and convert null values to NaN
+    df = (pd.DataFrame(_get_info(nested_list, '_multi_stat_regions_reducer'),
+                       columns=pd.MultiIndex.from_tuples(columnTuples)).replace(-999999,np.nan))
+    
+    return _convert_timeunit(df, timeunit)
+
+
+class RegionsReducerCache():
+    """PERSISTENT SQLITE CACHE OF time_series_regions_reducer RESULTS
+    
+    Rows are stored per image under a key built from the collection ID, bands,
+    FeatureID, statistic, scale, engine and a fingerprint of the reduction geometry,
+    so a rerun only has to reduce the images whose system:time_start is not cached yet.
+    
+    Args:
+        path: Str, path of the sqlite database file, created if missing
+        maxBytes: int, maximum total size of cached rows. After each store, the least
+            recently used keys other than the stored one are evicted until the cache fits.
+            Rows that would make a single key larger than maxBytes are not stored. If None,
+            nothing is evicted
+    """
+    
+    def __init__(self, path, maxBytes=None):
+        self.path = path
+        self.maxBytes = maxBytes
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                         '(key TEXT PRIMARY KEY, params TEXT, columns TEXT, nbytes INTEGER, last_access REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS rows '
+                         '(key TEXT, time_start INTEGER, data TEXT)')
+            conn.execute('CREATE INDEX IF NOT EXISTS rows_key ON rows (key, time_start)')
+    
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+    
+    @staticmethod
+    def make_key(collectionId, bands, FeatureID, stats, scale, geometryFingerprint, engine='lists'):
+        """BUILD THE CACHE KEY OF A REDUCTION
+        
+        Returns:
+            key: Str, sha256 of the reduction parameters
+            params: Str, JSON of the reduction parameters
+        """
+        
+        params = json.dumps({'collection': collectionId,
+                             'bands': list(bands),
+                             'FeatureID': FeatureID,
+                             'stats': stats,
+                             'scale': scale,
+                             'geometry': geometryFingerprint,
+                             'engine': engine}, sort_keys=True)
+        return hashlib.sha256(params.encode()).hexdigest(), params
+    
+    def cached_times(self, key):
+        """GET THE SET OF system:time_start VALUES CACHED UNDER A KEY"""
+        
+        with closing(self._connect()) as conn:
+            return set(row[0] for row in conn.execute('SELECT DISTINCT time_start FROM rows WHERE key = ?', (key,)))
+    
+    def load(self, key):
+        """LOAD THE CACHED ROWS OF A KEY AS A DATAFRAME, OR None IF THE KEY IS NOT CACHED"""
+        
+        with closing(self._connect()) as conn, conn:
+            entry = conn.execute('SELECT columns FROM entries WHERE key = ?', (key,)).fetchone()
+            if entry is None:
+                return None
+            conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            rows = [json.loads(row[0]) for row in
+                    conn.execute('SELECT data FROM rows WHERE key = ? ORDER BY time_start, rowid', (key,))]
+        columns = json.loads(entry[0])
+        if columns and isinstance(columns[0], list):
+            columns = pd.MultiIndex.from_tuples([tuple(column) for column in columns])
+        return pd.DataFrame(rows, columns=columns)
+    
+    def store(self, key, params, df):
+        """APPEND THE ROWS OF A REDUCER DATAFRAME (INTEGER system:time_start) TO A KEY
+        
+        Returns:
+            stored: Boolean, False if the rows were not stored because the key would
+                not fit in maxBytes on its own
+        """
+        
+        columns = list(df.columns)
+        timeIndex = columns.index(_time_column(df))
+        records = [(key, int(record[timeIndex]), json.dumps(list(record)))
+                   for record in df.itertuples(index=False, name=None)]
+        nbytes = sum(len(record[2]) for record in records)
+        
+        #A key larger than the whole cache would evict everything, itself included, on every store
+        if self.maxBytes is not None:
+            with closing(self._connect()) as conn:
+                entry = conn.execute('SELECT nbytes FROM entries WHERE key = ?', (key,)).fetchone()
+            if (entry[0] if entry else 0) + nbytes > self.maxBytes:
+                print('NOT CACHED: ', nbytes, ' BYTES OF ROWS WOULD EXCEED maxBytes = ', self.maxBytes, ' FOR ONE KEY')
+                return False
+        
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT OR IGNORE INTO entries VALUES (?, ?, ?, 0, ?)',
+                         (key, params, json.dumps(columns), time.time()))
+            conn.executemany('INSERT INTO rows VALUES (?, ?, ?)', records)
+            conn.execute('UPDATE entries SET nbytes = nbytes + ?, last_access = ? WHERE key = ?',
+                         (nbytes, time.time(), key))
+        if self.maxBytes is not None:
+            self.evict(self.maxBytes, keep=key)
+        return True
+    
+    def invalidate(self, key=None):
+        """DELETE THE CACHED ROWS OF A KEY, OR OF EVERY KEY IF key IS None"""
+        
+        with closing(self._connect()) as conn, conn:
+            if key is None:
+                conn.execute('DELETE FROM rows')
+                conn.execute('DELETE FROM entries')
+            else:
+                conn.execute('DELETE FROM rows WHERE key = ?', (key,))
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+    
+    def size(self):
+        """GET THE TOTAL SIZE IN BYTES OF THE CACHED ROWS"""
+        
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM entries').fetchone()[0]
+    
+    def evict(self, maxBytes, keep=None):
+        """EVICT LEAST RECENTLY USED KEYS UNTIL THE CACHE FITS IN maxBytes
+        
+        Args:
+            maxBytes: int, maximum total size of cached rows
+            keep: Str, key that is never evicted, e.g. the key just stored
+        
+        Returns:
+            evicted: List of str, evicted keys
+        """
+        
+        with closing(self._connect()) as conn:
+            entries = conn.execute('SELECT key, nbytes FROM entries ORDER BY last_access').fetchall()
+        total = sum(entry[1] for entry in entries)
+        evicted = []
+        for key, nbytes in entries:
+            if total <= maxBytes:
+                break
+            if key == keep:
+                continue
+            self.invalidate(key)
+            total -= nbytes
+            evicted.append(key)
+        return evicted
+
+
+def _collection_id(imgcol):
+    """IDENTIFY AN IMAGE COLLECTION EXPRESSION REGARDLESS OF ITS FILTERS
+    
+    Filters (filterDate, filterBounds, filterMetadata...) only select images, and
+    cached rows are matched to the images of imgcol by system:time_start, so they
+    are left out of the identifier and moving the date range of a rerun does not
+    change it.
+    
+    Args:
+        imgcol: ee.ImageCollection
+    
+    Returns:
+        collectionId: Str, asset id of imgcol if it is a filtered ee.ImageCollection(assetId),
+            otherwise a sha256 of the serialized expression without its filters
+    """
+    
+    def strip_filters(collection):
+        if not isinstance(collection, ee.ComputedObject) or collection.func is None:
+            return collection
+        if collection.func.getSignature().get('name') == 'Collection.filter':
+            return strip_filters(collection.args['collection'])
+        if 'collection' in collection.args:
+            args = dict(collection.args, collection=strip_filters(collection.args['collection']))
+            return ee.ComputedObject(collection.func, args)
+        return collection
+    
+    collection = strip_filters(imgcol)
+    if (isinstance(collection, ee.ComputedObject) and collection.func is not None
+            and collection.func.getSignature().get('name') == 'ImageCollection.load'
+            and set(collection.args) == {'id'} and isinstance(collection.args['id'], str)):
+        return collection.args['id']
+    return hashlib.sha256(collection.serialize().encode()).hexdigest()
+
+
+def _cached_time_series_regions_reducer(imgcol, bands, geometry, cache, collectionId=None,
+                                        timeunit='integer', stats='median', scale=470, 
+                                        FeatureID='BAIRRO', engine='lists', **kwargs):
+    """RUN time_series_regions_reducer ONLY ON IMAGES MISSING FROM A RegionsReducerCache
+    
+    Args:
+        imgcol, bands, geometry, FeatureID, timeunit, stats, scale, engine: see time_series_regions_reducer
+        cache: RegionsReducerCache or str path of a cache database
+        collectionId: str, identifier of imgcol used in the cache key. If None, the asset id of
+            imgcol is used, see _collection_id
+        **kwargs: further arguments passed to time_series_regions_reducer
+    
+    Returns:
+        df: Dataframe of cached and newly reduced rows, sorted by system:time_start
+    """
+    
+    if not isinstance(cache, RegionsReducerCache):
+        cache = RegionsReducerCache(cache)
+    if collectionId is None:
+        collectionId = _collection_id(imgcol)
+    geometryFingerprint = hashlib.sha256(geometry.serialize().encode()).hexdigest()
+    key, params = RegionsReducerCache.make_key(collectionId, bands, FeatureID, stats, scale, geometryFingerprint,
+                                               engine=engine)
+    
+    #Find images that are not cached yet
+    allTimes = _get_info(imgcol.aggregate_array('system:time_start'), '_cached_time_series_regions_reducer')
+    cachedTimes = cache.cached_times(key)
+    newTimes = sorted(set(allTimes) - cachedTimes)
+    
+    #Reduce and store only the new images; an empty result has no rows to store
+    newDf = None
+    stored = True
+    if newTimes:
+        newImages = imgcol.filter(ee.Filter.inList('system:time_start', newTimes))
+        try:
+            newDf = time_series_regions_reducer(newImages, bands, geometry,
+                                                FeatureID=FeatureID,
+                                                timeunit='integer',
+                                                stats=stats,
+                                                scale=scale,
+                                                engine=engine,
+                                                **kwargs)
+        except PartialResultError as e:
+            #Keep the date ranges that succeeded, so a rerun only reduces the failed ones
+            if not e.df.empty:
+                cache.store(key, params, e.df)
+            raise
+        if not newDf.empty:
+            stored = cache.store(key, params, newDf)
+    
+    #Merge new rows with the stored ones, keeping new rows too large to store
+    df = cache.load(key)
+    if not stored:
+        df = newDf if df is None else pd.concat([df, newDf], ignore_index=True)
+        df = df.sort_values(_time_column(df), kind='stable')
+    if df is None and newDf is not None:
+        return newDf
+    if df is None:
+        return time_series_regions_reducer(imgcol, bands, geometry,
+                                           FeatureID=FeatureID,
+                                           timeunit=timeunit,
+                                           stats=stats,
+                                           scale=scale,
+                                           engine=engine,
+                                           **kwargs)
+    df = df[df[_time_column(df)].isin(set(allTimes))].reset_index(drop=True)
+    
+    #Report the date ranges of the new images that failed when partial results are allowed
+    if newDf is not None and 'failedRanges' in newDf.attrs:
+        df.attrs['failedRanges'] = newDf.attrs['failedRanges']
+    elif kwargs.get('dateChunks') is not None:
+        df.attrs['failedRanges'] = []
+    
+    return _convert_timeunit(df, timeunit)
+
+
+class PartialResultError(RuntimeError):
+    """DATE RANGES OF A CHUNKED REDUCTION FAILED EVERY RETRY
+    
+    Args:
+        message: Str, description of the failure
+        df: Dataframe of the date ranges that succeeded, with df.attrs['failedRanges']
+            a list of ((start, end), error) tuples of the ranges that failed
+    """
+    
+    def __init__(self, message, df):
+        super().__init__(message)
+        self.df = df
+        self.failedRanges = df.attrs['failedRanges']
+
+
+def _collection_date_range(imgcol):
+    """GET THE FIRST AND LAST system:time_start OF AN IMAGE COLLECTION
+    
+    Args:
+        imgcol: ee.ImageCollection
+    
+    Returns:
+        dateRange: Tuple of ints, (first, last) system:time_start in milliseconds, or None
+            if the collection is empty
+    """
+    
+    minmax = _get_info(imgcol.reduceColumns(ee.Reducer.minMax(), ['system:time_start']), '_collection_date_range')
+    if minmax.get('min') is None or minmax.get('max') is None:
+        return None
+    return (minmax['min'], minmax['max'])
+
+
+def _date_chunks(dateRange, dateChunks):
+    """SPLIT A DATE RANGE INTO CONSECUTIVE [start, end) RANGES
+    
+    Args:
+        dateRange: Tuple of (start, end) as milliseconds since epoch or datetimes, end is inclusive
+        dateChunks: int (days) or pandas frequency string, size of each range
+    
+    Returns:
+        chunks: List of (start, end) tuples of ints in milliseconds, end is exclusive
+    """
+    
+    def to_timestamp(value):
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            return pd.Timestamp(value, unit='ms')
+        return pd.Timestamp(value)
+    
+    def to_millis(stamp):
+        return int((stamp - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1))
+    
+    start = to_timestamp(dateRange[0])
+    end = to_timestamp(dateRange[1])
+    freq = pd.Timedelta(days=dateChunks) if isinstance(dateChunks, (int, np.integer)) else dateChunks
+    
+    #Boundaries anchored on the start date, closed off just after the last image
+    bounds = [start] + [b for b in pd.date_range(start.normalize(), end, freq=freq) if b > start]
+    bounds.append(end + pd.Timedelta(milliseconds=1))
+    
+    return [(to_millis(a), to_millis(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def time_series_regions_reducer_chunked(imgcol,
+                                        bands,
+                                        geometry,
+                                        dateChunks='YS',
+                                        workers=4,
+                                        retries=3,
+                                        backoff=1.0,
+                                        dateRange=None,
+                                        reduceFunction=None,
+                                        dateRangeFunction=None,
+                                        allowPartial=False,
+                                        **kwargs):
+    """DEVELOP A DATAFRAME FROM A REGIONS REDUCER, ONE DATE RANGE AT A TIME
+    
+    The collection is split into date ranges with filterDate and every range is
+    reduced by its own request on a bounded thread pool, so no single request has
+    to hold the full time series. Failed ranges are retried with exponential backoff
+    and the range results are concatenated in date order. If ranges still fail
+    after every retry, PartialResultError is raised carrying the frame of the
+    ranges that succeeded, so they are not lost; rerun only the failed ranges
+    with dateRange. With allowPartial, that frame is returned instead.
+    
+    Args:
+        imgcol: ee.ImageCollection to be reduced (anything with a filterDate method)
+        bands: List of strings, bands of interest to be reduced
+        geometry: ee.FeatureCollection or ee.Geometry, regions to reduce over
+        dateChunks: int (days) or pandas frequency string (e.g. 'QS', 'YS'), size of each date range
+        workers: int, maximum number of date ranges requested at the same time
+        retries: int, number of times a failed date range is retried
+        backoff: float, seconds to wait before the first retry, doubled for each further retry
+        dateRange: Tuple of (start, end), as milliseconds or datetimes, covering imgcol.
+            If None, it is requested from imgcol with dateRangeFunction
+        reduceFunction: callable with the signature of time_series_regions_reducer used to
+            reduce each range. Defaults to time_series_regions_reducer
+        dateRangeFunction: callable taking imgcol and returning its (first, last)
+            system:time_start in milliseconds, or None if it is empty. Defaults to a minMax
+            reduction of imgcol
+        allowPartial: Boolean, return the ranges that succeeded when some ranges fail every
+            retry, instead of raising PartialResultError
+        **kwargs: further arguments passed to reduceFunction (FeatureID, timeunit, stats, scale...)
+    
+    Returns:
+        df: Dataframe of the concatenated range results, as returned by time_series_regions_reducer,
+            with df.attrs['failedRanges'] a list of ((start, end), error) tuples of the date ranges
+            (milliseconds, end exclusive) that failed every retry, only non-empty with allowPartial.
+            Empty if imgcol has no images
+    """
+    
+    if reduceFunction is None:
+        reduceFunction = time_series_regions_reducer
+    if dateRangeFunction is None:
+        dateRangeFunction = _collection_date_range
+    if dateRange is None:
+        dateRange = dateRangeFunction(imgcol)
+    
+    #Nothing to reduce in an empty collection
+    if dateRange is None or any(pd.isna(value) for value in dateRange):
+        df = pd.DataFrame()
+        df.attrs['failedRanges'] = []
+        return df
+    
+    chunks = _date_chunks(dateRange, dateChunks)
+    
+    #Reduce one date range, retrying with backoff
+    def run_chunk(chunk):
+        for attempt in range(retries + 1):
+            try:
+                with _timed('reduce_chunk', start=chunk[0], end=chunk[1]):
+                    return reduceFunction(imgcol.filterDate(chunk[0], chunk[1]), bands, geometry, **kwargs)
+            except Exception:
+                if attempt == retries:
+                    raise
+                _count('retries', stage='reduce_chunk')
+                time.sleep(backoff * 2 ** attempt)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_chunk, chunk) for chunk in chunks]
+    
+    #Collect results in date order and report ranges that failed every retry
+    results = []
+    failed = []
+    for chunk, future in zip(chunks, futures):
+        if future.exception() is not None:
+            failed.append((chunk, repr(future.exception())))
+        else:
+            results.append(future.result())
+    if failed:
+        print('DATE RANGES FAILED AFTER ', retries, ' RETRIES: ', len(failed), ' OF ', len(chunks))
+    
+    df = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    df.attrs['failedRanges'] = failed
+    if failed and not allowPartial:
+        raise PartialResultError(str(len(failed)) + ' of ' + str(len(chunks)) + ' date ranges failed every retry, '
+                                 'first error: ' + failed[0][1], df)
+    return df
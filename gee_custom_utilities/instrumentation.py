@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instrumentation events (timers, counters, progress) and the sinks receiving them.
+
+Only uses the standard library, so it is cheap to import from every subsystem.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+
+# =============================================================================
+# %% 0 - INSTRUMENTATION
+# =============================================================================
+
+#Event sinks receiving timer, counter and progress events. Empty by default, in
+#which case instrumentation calls return immediately
+_instrumentation_sinks = []
+_NULL_TIMER = nullcontext()
+
+
+def add_instrumentation_sink(sink):
+    """REGISTER A CALLABLE TO RECEIVE INSTRUMENTATION EVENTS
+    
+    Every event is a dictionary with 'ts', 'pid', 'type' and 'name' keys:
+        type 'timer': 'seconds' spent in the stage called name (e.g. 'getInfo', 'gdal_translate', 'gsutil_cp')
+        type 'counter': 'value' to add to the counter called name (e.g. 'files', 'bytes', 'remote_calls', 'retries')
+        type 'progress': 'done' and 'total' items of the function called name
+    plus any extra fields of the call site (file, stage details...).
+    
+    Args:
+        sink: callable taking one event dictionary, e.g. JsonLinesSink, StageTotals or a progress callback
+    
+    Returns:
+        sink: the registered sink, so it can be removed with remove_instrumentation_sink
+    """
+    
+    _instrumentation_sinks.append(sink)
+    return sink
+
+
+def remove_instrumentation_sink(sink):
+    """UNREGISTER A SINK ADDED WITH add_instrumentation_sink"""
+    
+    if sink in _instrumentation_sinks:
+        _instrumentation_sinks.remove(sink)
+
+
+def _emit(eventType, name, **fields):
+    """SEND AN EVENT TO EVERY REGISTERED SINK"""
+    
+    if not _instrumentation_sinks:
+        return
+    event = {'ts': time.time(), 'pid': os.getpid(), 'type': eventType, 'name': name}
+    event.update(fields)
+    for sink in list(_instrumentation_sinks):
+        sink(event)
+
+
+def _count(name, value=1, **fields):
+    """ADD TO AN INSTRUMENTATION COUNTER"""
+    
+    if _instrumentation_sinks:
+        _emit('counter', name, value=value, **fields)
+
+
+def _progress(name, done, total, **fields):
+    """REPORT PROGRESS OF A FUNCTION OVER ITS ITEMS"""
+    
+    if _instrumentation_sinks:
+        _emit('progress', name, done=done, total=total, **fields)
+
+
+class _StageTimer():
+    """CONTEXT MANAGER EMITTING A TIMER EVENT FOR THE TIME SPENT INSIDE IT"""
+    
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, excType, excValue, traceback):
+        _emit('timer', self.name, seconds=time.perf_counter() - self.start, 
+              failed=excType is not None, **self.fields)
+        return False
+
+
+def _timed(name, **fields):
+    """TIME A STAGE: with _timed('getInfo'): ... (a shared no-op context when no sink is registered)"""
+    
+    if not _instrumentation_sinks:
+        return _NULL_TIMER
+    return _StageTimer(name, fields)
+
+
+def _get_info(eeObject, function, **fields):
+    """REQUEST AN EE OBJECT WITH getInfo, TIMED AS 'getInfo' AND COUNTED AS A REMOTE CALL"""
+    
+    _count('remote_calls', stage='getInfo', function=function)
+    with _timed('getInfo', function=function, **fields):
+        return eeObject.getInfo()
+
+
+class JsonLinesSink():
+    """INSTRUMENTATION SINK WRITING ONE JSON OBJECT PER EVENT TO A FILE
+    
+    Safe to share between threads. Worker processes started by fork (the
+    default on Linux) inherit the registered sinks and reopen the file, each
+    appending whole lines to it; workers started by spawn or forkserver do not
+    inherit sinks, so their events are not recorded.
+    
+    Args:
+        path: Str, path of the JSON-lines file, appended to
+        types: List of str, event types to write ('timer', 'counter', 'progress'). If None, all are written
+    """
+    
+    def __init__(self, path, types=None):
+        self.path = path
+        self.types = types
+        self.lock = threading.Lock()
+        self.file = None
+        self.pid = None
+    
+    def __call__(self, event):
+        if self.types is not None and event['type'] not in self.types:
+            return
+        line = json.dumps(event, default=str) + '\n'
+        with self.lock:
+            if self.pid != os.getpid():
+                self.file = open(self.path, 'a')
+                self.pid = os.getpid()
+            self.file.write(line)
+            self.file.flush()
+    
+    def close(self):
+        with self.lock:
+            if self.file is not None and self.pid == os.getpid():
+                self.file.close()
+            self.file = None
+
+
+class StageTotals():
+    """INSTRUMENTATION SINK ACCUMULATING TIME PER STAGE AND COUNTER TOTALS IN MEMORY
+    
+    Args:
+        N/A
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers = {}
+        self.counters = {}
+    
+    def __call__(self, event):
+        with self.lock:
+            if event['type'] == 'timer':
+                calls, seconds = self.timers.get(event['name'], (0, 0.0))
+                self.timers[event['name']] = (calls + 1, seconds + event['seconds'])
+            elif event['type'] == 'counter':
+                self.counters[event['name']] = self.counters.get(event['name'], 0) + event['value']
+    
+    def summary(self):
+        """TABULATE STAGE TIMES, SLOWEST FIRST
+        
+        Returns:
+            df: Dataframe indexed by stage with 'calls', 'seconds' and 'mean_seconds' columns
+        """
+        
+        import pandas as pd
+        
+        with self.lock:
+            df = pd.DataFrame([(name, calls, seconds) for name, (calls, seconds) in self.timers.items()],
+                              columns=['stage', 'calls', 'seconds']).set_index('stage')
+        df['mean_seconds'] = df['seconds'] / df['calls']
+        return df.sort_values('seconds', ascending=False)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming Black Marble pipeline: conversion, upload and ingestion with overlapping stages.
+
+gsutil and ee are only used by the default backends, so the pipeline runs
+end-to-end against local stand-ins passed as convertFunction, uploadFunction,
+startIngestion and newTaskId. GDAL is only imported by the default converter.
+"""
+
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .assets import _load_manifest, _save_manifest, list_task_states
+from .bm_names import parse_bm_filename, _unique_asset_names
+from .instrumentation import _count, _progress, _timed
+
+
+# =============================================================================
+# %% 8 - STREAMING CONVERT, UPLOAD AND INGEST PIPELINE
+# =============================================================================
+
+#Stages reached by a file, in order, as recorded in the checkpoint
+PIPELINE_STAGES = ['converted', 'uploaded', 'submitted', 'ingested']
+
+#Task states of a submitted file that are not resubmitted on resume
+PIPELINE_LIVE_TASK_STATES = ['READY', 'RUNNING', 'CANCEL_REQUESTED']
+
+
+def _default_convert_function(geotiffFolder, executor, convertOptions):
+    """BUILD A CONVERTER RUNNING THE IN-MEMORY HD5 CONVERSION ON A PROCESS POOL"""
+
+    from .blackmarble import _bm_hd5_convert_task
+
+    def convert(hd5Path):
+        _, outputPath, error = executor.submit(_bm_hd5_convert_task, hd5Path, geotiffFolder, None,
+                                               True, **convertOptions).result()
+        if error is not None:
+            raise RuntimeError(error)
+        return outputPath
+    return convert
+
+
+def _replay_journal(checkpoint, journalPath):
+    """APPLY THE TRANSITIONS OF A CHECKPOINT JOURNAL, STOPPING AT A LINE LEFT HALF WRITTEN BY A CRASH"""
+
+    if not os.path.exists(journalPath):
+        return checkpoint
+    with open(journalPath) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            checkpoint.setdefault(entry.pop('file'), {}).update(entry)
+    return checkpoint
+
+
+def _default_upload_function(bucket, transferCommand):
+    """BUILD AN UPLOADER COPYING ONE FILE TO A BUCKET WITH transferCommand"""
+
+    destination = 'gs://' + bucket + '/'
+
+    def upload(path):
+        completed = subprocess.run(list(transferCommand) + [path, destination],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.decode(errors='replace').strip()
+                               or 'exit code ' + str(completed.returncode))
+        return destination + os.path.basename(path)
+    return upload
+
+
+def _with_retries(function, stage, retries, backoff):
+    """CALL function, RETRYING FAILURES WITH EXPONENTIAL BACKOFF"""
+
+    def call(*args):
+        for attempt in range(retries + 1):
+            try:
+                with _timed('pipeline_' + stage):
+                    return function(*args)
+            except Exception:
+                if attempt == retries:
+                    raise
+                _count('retries', stage=stage)
+                time.sleep(backoff * 2 ** attempt)
+    return call
+
+
+def bm_pipeline(hd5Folder,
+                geotiffFolder,
+                bucket,
+                destination,
+                convertWorkers=2,
+                uploadWorkers=4,
+                ingestWorkers=4,
+                queueSize=8,
+                retries=3,
+                backoff=1.0,
+                unknownPolls=3,
+                pollInterval=10,
+                checkpointPath=None,
+                convertOptions=None,
+                transferCommand=('gsutil', 'cp'),
+                convertFunction=None,
+                uploadFunction=None,
+                startIngestion=None,
+                newTaskId=None,
+                listOperations=None):
+    """CONVERT, UPLOAD AND INGEST BLACK MARBLE HD5 FILES AS A STREAMING PIPELINE
+
+    Each stage runs its own pool of worker threads, and stages are connected
+    by queues of queueSize files, so a file is uploaded as soon as it is
+    converted and ingested as soon as it is uploaded. A full queue blocks the
+    stage feeding it, which bounds the number of converted files waiting on
+    disk. Every stage transition is appended to a JSON lines journal next to
+    the JSON checkpoint, which is compacted into the checkpoint when the run
+    ends, and a rerun replays both to resume each file from the last stage it
+    reached. Ingestion tasks are
+    submitted but not waited for; poll them with list_task_states. The request
+    id of a file is drawn once and kept in the checkpoint, so retried or resumed
+    submissions of the file reuse it and Earth Engine does not ingest it twice.
+    On resume, files whose task was submitted are checked with list_task_states:
+    completed tasks are skipped, running tasks are reported again, and failed
+    or cancelled tasks are resubmitted under a new request id. Tasks missing
+    from the listing are polled again up to unknownPolls times, then
+    resubmitted under their own request id, which Earth Engine does not ingest
+    twice if the task did exist.
+
+    Args:
+        hd5Folder: Str, path of directory containing hd5 images to be converted
+        geotiffFolder: Str, path of target directory to place geotiffs
+        bucket: Str, name of Google Cloud bucket to place images in
+        destination: Str, name of Google Earth Engine Image Collection to place images in (under users/)
+        convertWorkers: int, number of files converted at the same time (processes of the default converter)
+        uploadWorkers: int, number of files uploaded at the same time
+        ingestWorkers: int, number of ingestion submissions in flight at the same time
+        queueSize: int, number of files waiting between two stages before the earlier stage blocks
+        retries: int, number of times a failed stage is retried for a file
+        backoff: float, seconds to wait before the first retry, doubled for each further retry
+        unknownPolls: int, number of times tasks of an earlier run missing from the listing are polled again on resume
+        pollInterval: float, seconds between two polls of the tasks missing from the listing
+        checkpointPath: Str, path of the JSON checkpoint. Defaults to .bm_pipeline_checkpoint.json in geotiffFolder.
+            The journal of the run is written to checkpointPath + '.jsonl'
+        convertOptions: Dictionary, options of the in-memory conversion, e.g. {'compress': 'DEFLATE'} or
+            {'maskRules': BM_MASK_RULES} (see _bm_hd5_file_to_geotiff_vrt and _bm_hd5_file_to_masked_geotiff)
+        transferCommand: Sequence of str, command prefix of the default uploader, run as transferCommand + [file, gs://bucket/]
+        convertFunction: callable taking an hd5 path and returning the geotiff path. Defaults to the
+            in-memory conversion of bm_hd5_to_geotiff on a pool of convertWorkers processes
+        uploadFunction: callable taking a geotiff path and returning its uri. Defaults to transferCommand
+        startIngestion: callable with the signature of ee.data.startIngestion. Defaults to ee.data.startIngestion
+        newTaskId: callable with the signature of ee.data.newTaskId. Defaults to ee.data.newTaskId
+        listOperations: callable with the signature of ee.data.listOperations, used on resume to check
+            tasks submitted by an earlier run. Defaults to ee.data.listOperations
+
+    Returns:
+        summary: Dictionary with 'tasks' {hd5 file name: ingestion task id} of tasks submitted by this
+            run or still running from an earlier run, 'skipped' list of files whose ingestion completed
+            in an earlier run, 'failed' list of (file name, stage, error) tuples and 'seconds'
+    """
+
+    hd5Folder = os.path.abspath(hd5Folder)
+    geotiffFolder = os.path.abspath(geotiffFolder)
+    os.makedirs(geotiffFolder, exist_ok=True)
+    if checkpointPath is None:
+        checkpointPath = os.path.join(geotiffFolder, '.bm_pipeline_checkpoint.json')
+    journalPath = checkpointPath + '.jsonl'
+    checkpoint = _replay_journal(_load_manifest(checkpointPath), journalPath)
+    checkpointLock = threading.Lock()
+
+    #Asset names follow bmA2_gee_import, made unique over the whole folder in name order
+    hd5Files = sorted(file for file in os.listdir(hd5Folder) if file.endswith('.h5'))
+    parsed = [parse_bm_filename(file[:-3] + '.tif') for file in hd5Files]
+    assetnames = dict(zip(hd5Files, _unique_asset_names([assetname for assetname, time_start in parsed])))
+    timeStarts = {file: time_start for file, (_, time_start) in zip(hd5Files, parsed)}
+
+    #Backends
+    executor = None
+    if convertFunction is None:
+        executor = ProcessPoolExecutor(max_workers=convertWorkers)
+        convertFunction = _default_convert_function(geotiffFolder, executor, convertOptions or {})
+    if uploadFunction is None:
+        uploadFunction = _default_upload_function(bucket, transferCommand)
+    if startIngestion is None or newTaskId is None:
+        import ee
+    if startIngestion is None:
+        startIngestion = ee.data.startIngestion
+    if newTaskId is None:
+        newTaskId = ee.data.newTaskId
+
+    #startIngestion is idempotent per request id, so retries reuse the id of the file
+    def ingest(file, uri, requestId):
+        manifest = {'name': 'projects/earthengine-legacy/assets/users/' + destination + '/' + assetnames[file],
+                    'tilesets': [{'sources': [{'uris': [uri]}]}],
+                    'startTime': timeStarts[file].strftime('%Y-%m-%dT%H:%M:%SZ')}
+        response = startIngestion(requestId, manifest)
+        return response.get('id', requestId) if isinstance(response, dict) else requestId
+
+    stages = {'convert': _with_retries(convertFunction, 'convert', retries, backoff),
+              'upload': _with_retries(uploadFunction, 'upload', retries, backoff),
+              'ingest': _with_retries(ingest, 'ingest', retries, backoff)}
+
+    summary = {'tasks': {}, 'skipped': [], 'failed': []}
+    startTime = time.time()
+    progress = {'done': 0}
+
+    #Each transition is one flushed line of the journal, so recording does not grow with the run
+    journal = open(journalPath, 'a')
+
+    def record(file, **entry):
+        line = json.dumps(dict(entry, file=file), sort_keys=True) + '\n'
+        with checkpointLock:
+            checkpoint.setdefault(file, {}).update(entry)
+            journal.write(line)
+            journal.flush()
+
+    def finish(file):
+        with checkpointLock:
+            progress['done'] += 1
+            percentageComplete = progress['done']/max(len(hd5Files), 1)*100
+        print(str(percentageComplete) + "% Complete")
+        _progress('bm_pipeline', progress['done'], len(hd5Files))
+
+    #Queues between stages; None tells a worker its input is exhausted
+    convertQueue = queue.Queue()
+    uploadQueue = queue.Queue(maxsize=queueSize)
+    ingestQueue = queue.Queue(maxsize=queueSize)
+
+    #Check the tasks submitted by an earlier run
+    submitted = {file: checkpoint[file]['task'] for file in hd5Files
+                 if checkpoint.get(file, {}).get('stage') == 'submitted'}
+    for poll in range(unknownPolls + 1 if submitted else 0):
+        if poll:
+            time.sleep(pollInterval)
+        statuses = list_task_states(list(submitted.values()), listOperations=listOperations)
+        for file, taskId in list(submitted.items()):
+            state = statuses[taskId]['state']
+            if state == 'UNKNOWN':
+                continue
+            del submitted[file]
+            if state == 'COMPLETED':
+                record(file, stage='ingested')
+            elif state not in PIPELINE_LIVE_TASK_STATES:
+                print('RESUBMITTING ', file, ' TASK ', taskId, ' ', state)
+                record(file, stage='uploaded', request=None)
+        if not submitted:
+            break
+    for file, taskId in submitted.items():
+        print('RESUBMITTING ', file, ' TASK ', taskId, ' UNKNOWN')
+        record(file, stage='uploaded')
+
+    #Resume each file from the last stage it reached
+    for file in hd5Files:
+        entry = checkpoint.get(file, {})
+        if entry.get('stage') == 'ingested':
+            summary['skipped'].append(file)
+            finish(file)
+        elif entry.get('stage') == 'submitted':
+            summary['tasks'][file] = entry['task']
+            finish(file)
+        elif entry.get('stage') == 'uploaded':
+            convertQueue.put((file, 'upload', entry['uri']))
+        elif entry.get('stage') == 'converted' and os.path.exists(entry['geotiff']):
+            convertQueue.put((file, 'converted', entry['geotiff']))
+        else:
+            convertQueue.put((file, 'convert', os.path.join(hd5Folder, file)))
+    print('FILES TO PROCESS: ', len(hd5Files) - len(summary['skipped']) - len(summary['tasks']),
+          ' SKIPPED: ', len(summary['skipped']), ' RUNNING: ', len(summary['tasks']))
+
+    def fail(file, stage, error):
+        with checkpointLock:
+            summary['failed'].append((file, stage, repr(error)))
+        finish(file)
+
+    #Stage workers. Resumed files pass through earlier stages untouched, keeping queue order.
+    #Checkpoint writes fail the file like the stage itself, so a worker never dies
+    def convert_worker():
+        while True:
+            item = convertQueue.get()
+            if item is None:
+                return
+            file, stage, value = item
+            if stage == 'convert':
+                try:
+                    value = stages['convert'](value)
+                    record(file, stage='converted', geotiff=value)
+                except Exception as e:
+                    fail(file, 'convert', e)
+                    continue
+                _count('files', stage='convert')
+                stage = 'converted'
+            uploadQueue.put((file, stage, value))
+
+    def upload_worker():
+        while True:
+            item = uploadQueue.get()
+            if item is None:
+                return
+            file, stage, value = item
+            if stage == 'converted':
+                try:
+                    value = stages['upload'](value)
+                    record(file, stage='uploaded', uri=value)
+                except Exception as e:
+                    fail(file, 'upload', e)
+                    continue
+                _count('files', stage='upload')
+            ingestQueue.put((file, value))
+
+    def ingest_worker():
+        while True:
+            item = ingestQueue.get()
+            if item is None:
+                return
+            file, uri = item
+            try:
+                with checkpointLock:
+                    requestId = checkpoint.get(file, {}).get('request')
+                if requestId is None:
+                    requestId = newTaskId()[0]
+                    record(file, request=requestId)
+                taskId = stages['ingest'](file, uri, requestId)
+                record(file, stage='submitted', task=taskId)
+            except Exception as e:
+                fail(file, 'ingest', e)
+                continue
+            _count('remote_calls', stage='ingest')
+            with checkpointLock:
+                summary['tasks'][file] = taskId
+            finish(file)
+
+    #Start every stage, then close each queue once the stage feeding it has finished
+    pools = []
+    for worker, count in ((convert_worker, convertWorkers), (upload_worker, uploadWorkers), (ingest_worker, ingestWorkers)):
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        pools.append(threads)
+    try:
+        for threads, inputQueue in zip(pools, (convertQueue, uploadQueue, ingestQueue)):
+            for _ in threads:
+                inputQueue.put(None)
+            for thread in threads:
+                thread.join()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+        #Compact the journal into the checkpoint; a crash before the removal only replays it again
+        with checkpointLock:
+            journal.close()
+            _save_manifest(checkpoint, checkpointPath)
+        os.remove(journalPath)
+
+    summary['failed'].sort()
+    summary['seconds'] = time.time() - startTime
+    print('SUBMITTED ', len(summary['tasks']), ' SKIPPED ', len(summary['skipped']), ' FAILED ', len(summary['failed']),
+          ' IN ', round(summary['seconds'], 1), ' s')
+    return summary
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local zonal statistics over Black Marble GeoTIFFs, without Earth Engine.
+"""
+
+import calendar
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from osgeo import gdal
+from osgeo import ogr
+
+from .analysis import _convert_timeunit
+from .blackmarble import BM_RADIANCE_FILL
+from .bm_names import parse_bm_filename
+
+
+# =============================================================================
+# %% 6 - LOCAL ZONAL STATISTICS OVER BLACK MARBLE GEOTIFFS
+# =============================================================================
+
+#Region weight matrices, keyed by raster grid and region source
+_weight_matrix_cache = {}
+_weight_matrix_lock = threading.Lock()
+
+
+def _regions_fingerprint(regions):
+    """IDENTIFY A REGION SOURCE FOR THE WEIGHT MATRIX CACHE
+    
+    Args:
+        regions: Str path of an OGR-readable vector file, or GeoJSON FeatureCollection dictionary
+    
+    Returns:
+        fingerprint: Str, sha256 of the GeoJSON, or of the path and modification time of the file
+    """
+    
+    if isinstance(regions, dict):
+        text = json.dumps(regions, sort_keys=True)
+    else:
+        text = os.path.abspath(regions) + str(os.path.getmtime(regions))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _region_weight_matrix(geoTransform, xsize, ysize, regions, FeatureID, allTouched=False):
+    """RASTERIZE REGION POLYGONS INTO A SPARSE PIXEL-TO-REGION WEIGHT MATRIX
+    
+    Each polygon is rasterized only over the window of its bounding box. A pixel 
+    belongs to a region when its center falls inside the polygon (or when it is 
+    touched by it, with allTouched). Regions must be in the coordinate system of the raster.
+    
+    Args:
+        geoTransform: Tuple, gdal geotransform of the raster grid
+        xsize: int, number of raster columns
+        ysize: int, number of raster rows
+        regions: Str path of an OGR-readable vector file, or GeoJSON FeatureCollection dictionary
+        FeatureID: str, property of each region to use as its label
+        allTouched: Boolean, include every pixel touched by a polygon
+    
+    Returns:
+        weights: scipy.sparse.csr_matrix of shape (number of regions, xsize * ysize), 1 where a pixel is in a region
+        featureIDs: List, FeatureID of each matrix row
+    """
+    
+    from scipy import sparse
+    
+    source = ogr.Open(json.dumps(regions) if isinstance(regions, dict) else regions)
+    layer = source.GetLayer()
+    gt0, gt1, _, gt3, _, gt5 = geoTransform
+    memDriver = ogr.GetDriverByName('Memory')
+    
+    rows = []
+    cols = []
+    featureIDs = []
+    for feature in layer:
+        regionIndex = len(featureIDs)
+        featureIDs.append(feature.GetField(FeatureID))
+        geom = feature.GetGeometryRef()
+        if geom is None:
+            continue
+        
+        #Pixel window covering the polygon bounding box
+        minx, maxx, miny, maxy = geom.GetEnvelope()
+        col0 = max(int(np.floor((minx - gt0) / gt1)), 0)
+        col1 = min(int(np.ceil((maxx - gt0) / gt1)), xsize)
+        row0 = max(int(np.floor((maxy - gt3) / gt5)), 0)
+        row1 = min(int(np.ceil((miny - gt3) / gt5)), ysize)
+        if col1 <= col0 or row1 <= row0:
+            continue
+        
+        #Rasterize the polygon over its window
+        window = gdal.GetDriverByName('MEM').Create('', col1 - col0, row1 - row0, 1, gdal.GDT_Byte)
+        window.SetGeoTransform((gt0 + col0 * gt1, gt1, 0, gt3 + row0 * gt5, 0, gt5))
+        memSource = memDriver.CreateDataSource('')
+        memLayer = memSource.CreateLayer('region', geom_type=ogr.wkbUnknown)
+        memFeature = ogr.Feature(memLayer.GetLayerDefn())
+        memFeature.SetGeometry(geom.Clone())
+        memLayer.CreateFeature(memFeature)
+        gdal.RasterizeLayer(window, [1], memLayer, burn_values=[1], 
+                            options=['ALL_TOUCHED=TRUE'] if allTouched else [])
+        
+        windowRows, windowCols = np.nonzero(window.ReadAsArray())
+        cols.append((windowRows + row0) * xsize + (windowCols + col0))
+        rows.append(np.full(len(windowRows), regionIndex))
+    
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=int)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=int)
+    weights = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(featureIDs), xsize * ysize))
+    weights.sum_duplicates()
+    return weights, featureIDs
+
+
+def _cached_region_weight_matrix(dataset, regions, FeatureID, allTouched=False, cacheFolder=None):
+    """GET THE WEIGHT MATRIX OF A RASTER GRID, BUILDING IT ONLY ONCE PER GRID
+    
+    Args:
+        dataset: gdal.Dataset defining the raster grid
+        regions, FeatureID, allTouched: see _region_weight_matrix
+        cacheFolder: Str, directory to also keep weight matrices in across runs. If None, only kept in memory
+    
+    Returns:
+        weights, featureIDs: see _region_weight_matrix
+    """
+    
+    from scipy import sparse
+    
+    geoTransform = tuple(dataset.GetGeoTransform())
+    key = hashlib.sha256(json.dumps([geoTransform, dataset.RasterXSize, dataset.RasterYSize,
+                                     _regions_fingerprint(regions), FeatureID, allTouched]).encode()).hexdigest()
+    
+    with _weight_matrix_lock:
+        if key not in _weight_matrix_cache:
+            matrixPath = os.path.join(cacheFolder, key + '.npz') if cacheFolder is not None else None
+            if matrixPath is not None and os.path.exists(matrixPath):
+                with open(matrixPath[:-4] + '.json') as f:
+                    featureIDs = json.load(f)
+                _weight_matrix_cache[key] = (sparse.load_npz(matrixPath), featureIDs)
+            else:
+                weights, featureIDs = _region_weight_matrix(geoTransform, dataset.RasterXSize, dataset.RasterYSize,
+                                                            regions, FeatureID, allTouched)
+                if matrixPath is not None:
+                    os.makedirs(cacheFolder, exist_ok=True)
+                    sparse.save_npz(matrixPath, weights)
+                    with open(matrixPath[:-4] + '.json', 'w') as f:
+                        json.dump(featureIDs, f)
+                _weight_matrix_cache[key] = (weights, featureIDs)
+        return _weight_matrix_cache[key]
+
+
+def _grouped_region_stats(weights, values, valid, stats):
+    """REDUCE PIXEL VALUES PER REGION FOR EACH REQUESTED STATISTIC
+    
+    mean, sum and count are sparse matrix-vector products. median, min and max
+    sort the pixels of each region once and pick from the sorted groups.
+    
+    Args:
+        weights: scipy.sparse.csr_matrix, pixel-to-region weight matrix
+        values: 1D numpy array of pixel values
+        valid: 1D boolean numpy array, False for nodata pixels
+        stats: List of str, 'mean', 'sum', 'count', 'median', 'min' and/or 'max'
+    
+    Returns:
+        results: Dictionary of statistic name to 1D numpy array with one value per region (NaN if no valid pixel)
+    """
+    
+    results = {}
+    filled = np.where(valid, values, 0)
+    counts = weights @ valid.astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if 'sum' in stats or 'mean' in stats:
+            sums = weights @ filled
+            results['sum'] = np.where(counts > 0, sums, np.nan)
+            results['mean'] = sums / counts
+    results['count'] = counts
+    
+    if any(stat in stats for stat in ('median', 'min', 'max')):
+        
+        #Sort the valid pixels of all regions by (region, value) in one pass
+        nRegions = weights.shape[0]
+        regionOfEntry = np.repeat(np.arange(nRegions), np.diff(weights.indptr))
+        entryValues = values[weights.indices]
+        keep = valid[weights.indices]
+        regionOfEntry = regionOfEntry[keep]
+        entryValues = entryValues[keep]
+        order = np.lexsort((entryValues, regionOfEntry))
+        sortedValues = entryValues[order]
+        
+        groupCounts = np.bincount(regionOfEntry, minlength=nRegions)
+        starts = np.cumsum(groupCounts) - groupCounts
+        hasPixels = groupCounts > 0
+        lastIndex = max(len(sortedValues) - 1, 0)
+        
+        def pick(positions):
+            out = np.full(nRegions, np.nan)
+            if len(sortedValues):
+                out[hasPixels] = sortedValues[np.minimum(positions, lastIndex)][hasPixels]
+            return out
+        
+        results['min'] = pick(starts)
+        results['max'] = pick(starts + groupCounts - 1)
+        results['median'] = (pick(starts + (groupCounts - 1) // 2) + pick(starts + groupCounts // 2)) / 2
+    
+    return {stat: results[stat] for stat in stats}
+
+
+def _local_reduce_file(rasterPath, regions, FeatureID, band, stats, noData, allTouched, cacheFolder, timeFunction):
+    """REDUCE ONE GEOTIFF OVER THE REGIONS
+    
+    Returns:
+        time_start: int, system:time_start of the raster in milliseconds
+        featureIDs: List, FeatureID of each region
+        results: Dictionary of statistic name to per-region values, see _grouped_region_stats
+    """
+    
+    dataset = gdal.Open(rasterPath, gdal.GA_ReadOnly)
+    weights, featureIDs = _cached_region_weight_matrix(dataset, regions, FeatureID, allTouched, cacheFolder)
+    
+    rasterBand = dataset.GetRasterBand(band)
+    values = rasterBand.ReadAsArray().ravel().astype(float)
+    #Unmasked conversions carry no nodata, and their fill pixels must not count as radiance
+    if noData is None:
+        noData = rasterBand.GetNoDataValue()
+    if noData is None:
+        noData = BM_RADIANCE_FILL
+    valid = ~np.isnan(values)
+    if noData != 'none':
+        valid &= values != noData
+    
+    return timeFunction(rasterPath), featureIDs, _grouped_region_stats(weights, values, valid, stats)
+
+
+def _bm_time_start(rasterPath):
+    """GET system:time_start IN MILLISECONDS OF A BLACK MARBLE FILE FROM ITS NAME, AS IN bmA2_gee_import"""
+    
+    assetname, time_start = parse_bm_filename(rasterPath)
+    return int(calendar.timegm(time_start.timetuple()) * 1000)
+
+
+def local_regions_reducer(rasterFiles,
+                          regions,
+                          FeatureID='BAIRRO',
+                          band=1,
+                          stats='mean',
+                          timeunit='integer',
+                          noData=None,
+                          allTouched=False,
+                          workers=4,
+                          cacheFolder=None,
+                          timeFunction=None):
+    """DEVELOP A DATAFRAME OF REGION STATISTICS FROM LOCAL BLACK MARBLE GEOTIFFS
+    
+    A local counterpart of time_series_regions_reducer for the geotiffs written by
+    bm_hd5_to_geotiff. The region polygons are rasterized once per raster grid into a
+    sparse pixel-to-region weight matrix, so each day's mean or sum per region is a
+    single sparse matrix-vector product. Files are reduced in parallel on a thread pool.
+    
+    Args:
+        rasterFiles: Str path of a directory of geotiffs, or list of geotiff paths
+        regions: Str path of an OGR-readable vector file, or GeoJSON FeatureCollection dictionary,
+            in the coordinate system of the rasters (EPSG:4326 for bm_hd5_to_geotiff output)
+        FeatureID: str, property of each region to use as column labels in output
+        band: int, 1-based index of the raster band to reduce
+        stats: str or list of str, 'mean', 'sum', 'count', 'median', 'min' or 'max'
+        timeunit: str, format of system:time_start. If 'date', it is converted to datetime
+        noData: float, pixel value to ignore. If None, the nodata value of the band is used, or
+            BM_RADIANCE_FILL for bands without one. 'none' ignores no pixel value
+        allTouched: Boolean, include every pixel touched by a polygon instead of pixel centers only
+        workers: int, number of files reduced at the same time
+        cacheFolder: Str, directory to keep weight matrices in across runs. If None, only kept in memory
+        timeFunction: callable taking a raster path and returning its system:time_start in milliseconds.
+            Defaults to the Black Marble file name parsing of bmA2_gee_import
+    
+    Returns:
+        df: Dataframe with (FeatureIDs + system:time_start) as columns for a single statistic, or 
+            (FeatureID, statistic) MultiIndex columns for a list of statistics, and rows for each file in time order
+    """
+    
+    if timeFunction is None:
+        timeFunction = _bm_time_start
+    if isinstance(rasterFiles, str):
+        rasterFiles = [os.path.join(rasterFiles, name) for name in sorted(os.listdir(rasterFiles)) 
+                       if name.endswith('.tif')]
+    multiStats = not isinstance(stats, str)
+    statList = list(stats) if multiStats else [stats]
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda rasterPath: _local_reduce_file(rasterPath, regions, FeatureID, band, statList,
+                                                                          noData, allTouched, cacheFolder, timeFunction),
+                                    rasterFiles))
+    results.sort(key=lambda result: result[0])
+    
+    featureIDs = results[0][1] if results else []
+    rows = [np.column_stack([result[2][stat] for stat in statList]).ravel() for result in results]
+    columns = pd.MultiIndex.from_tuples([(feature, stat) for feature in featureIDs for stat in statList])
+    df = pd.DataFrame(np.array(rows).reshape(len(rows), len(columns)), columns=columns)
+    df[('system:time_start', '')] = [result[0] for result in results]
+    
+    #Keep the single-level columns of time_series_regions_reducer for a single statistic
+    if not multiStats:
+        df.columns = list(featureIDs) + ['system:time_start']
+    
+    return _convert_timeunit(df, timeunit)
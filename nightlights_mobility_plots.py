@@ -8,35 +8,21 @@ Created on Tue Oct  4 12:26:42 2022
 
 import csv
 import datetime
-import pandas as pd
 # import dateutil
 import matplotlib.pyplot as plt
-import numpy as np
+import gee_custom_utilities as gcu
+import gee_custom_loaders as gcl
 
 
 
 def AvgAndChange(dataf, columnList, periodLength, baselines):
-    dataf_out = dataf
-    for index, row in dataf.iterrows():
-        dfDate = index
-        rollingSet = dataf[(dataf.index > (dfDate - datetime.timedelta(days=(periodLength + 1)))) &
-                        (dataf.index < (dfDate + datetime.timedelta(days=1)))]
-        for entry, baseline in zip(columnList, baselines):
-            rollingAvg = rollingSet[entry].mean()
-            dataf_out.loc[index,'30 Day Average of ' + entry] = rollingAvg
-            dataf_out.loc[index, 'Rolling Average Percent Change of ' + entry] = (rollingAvg - baseline)/baseline
-            dataf_out.loc[index, 'Percent Change of ' + entry] = (row[entry] - baseline)/baseline
-            
-    return dataf_out
+    return gcu.rolling_avg_and_change(dataf, columnList, periodLength,
+                                      baselines=baselines,
+                                      avgLabel='30 Day Average of ')
 
 
 # %% Nightlights
-df = pd.read_csv('/home/jackreid/Downloads/temp/dailyCountyAveragesTable.csv')
-
-for index, row in df.iterrows():
-    df.loc[index, 'Date'] = datetime.datetime.strptime(row['system:index'][0:10], '%Y-%m-%d')
-    
-df.set_index('Date', inplace=True)
+df = gcl.load_nightlights('/home/jackreid/Downloads/temp/dailyCountyAveragesTable.csv')
 
 
 df_jan2020 = df[(df.index > datetime.datetime(2020,1,2)) &
@@ -59,16 +45,11 @@ dfPlot = df.loc[df.index > datetime.datetime(2020,2,14)]
 
 # %% Mobility
 
-dfMob = pd.read_csv('/home/jackreid/Downloads/temp/google_mobility/santaClara_county_full.csv')
+dfMob = gcl.load_mobility('/home/jackreid/Downloads/temp/google_mobility/santaClara_county_full.csv')
 
-for index, row in dfMob.iterrows():
-    dfMob.loc[index, 'Date'] = datetime.datetime.strptime(row['date'], '%Y-%m-%d')
-    mobArray = np.asarray([row['transit_stations_percent_change_from_baseline'],
-                row['workplaces_percent_change_from_baseline'],
-                row['retail_and_recreation_percent_change_from_baseline']])
-    dfMob.loc[index, 'AvgMobility'] = np.average(mobArray)
-    
-dfMob.set_index('Date', inplace=True)
+dfMob['AvgMobility'] = dfMob[['transit_stations_percent_change_from_baseline',
+                              'workplaces_percent_change_from_baseline',
+                              'retail_and_recreation_percent_change_from_baseline']].mean(axis=1, skipna=False)
 
 dfMob = AvgAndChange(dfMob, ['AvgMobility'], 30, [1])
 
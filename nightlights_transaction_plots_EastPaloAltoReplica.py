@@ -8,46 +8,29 @@ Created on Tue Oct  4 12:26:42 2022
 
 import csv
 import datetime
-import pandas as pd
 # import dateutil
 import matplotlib.pyplot as plt
-import numpy as np
+import gee_custom_utilities as gcu
+import gee_custom_loaders as gcl
 
 
 rollingAvgPeriod = 14
 
 def AvgAndChange(dataf, columnList, periodLength, baselines):
-    dataf_out = dataf
-    for index, row in dataf.iterrows():
-        dfDate = index
-        rollingSet = dataf[(dataf.index > (dfDate - datetime.timedelta(days=(periodLength + 1)))) &
-                        (dataf.index < (dfDate + datetime.timedelta(days=1)))]
-        for entry, baseline in zip(columnList, baselines):
-            rollingAvg = rollingSet[entry].mean()
-            dataf_out.loc[index,'Rolling Average of ' + entry] = rollingAvg
-            dataf_out.loc[index, 'Rolling Average Percent Change of ' + entry] = (rollingAvg - baseline)/baseline
-            dataf_out.loc[index, 'Percent Change of ' + entry] = (row[entry] - baseline)/baseline
-
-    return dataf_out
+    return gcu.rolling_avg_and_change(dataf, columnList, periodLength,
+                                      baselines=baselines,
+                                      avgLabel='Rolling Average of ')
 
 
 # %% Nightlights
-df = pd.read_csv('/home/jackreid/Documents/School/Research/Space_Enabled/Code/Nightlights-Mobility/dailyEastPaloAltoAveragesTable.csv')
-
-for index, row in df.iterrows():
-    df.loc[index, 'Date'] = datetime.datetime.strptime(row['system:index'][0:10], '%Y-%m-%d')
-    
-# df.set_index('Date', inplace=True)
+df = gcl.load_nightlights('/home/jackreid/Documents/School/Research/Space_Enabled/Code/Nightlights-Mobility/dailyEastPaloAltoAveragesTable.csv')
 
 censusTracts = df['NAME'].unique();
 
-dfTractList = [];
-for tract in censusTracts:
-    dfTractList.append(df[df['NAME'] == tract])
+dfTractList = list(gcl.split_tracts(df, 'NAME', censusTracts).values())
     
 dfPlotList = [];
 for dfTract in dfTractList:
-    dfTract.set_index('Date', inplace=True)
 
     df_jan2020 = dfTract[(dfTract.index > datetime.datetime(2020,1,2)) &
                     (dfTract.index < datetime.datetime(2020,2,7))]
@@ -60,23 +43,15 @@ for dfTract in dfTractList:
 
 # %% Mobility
 
-dfMob = pd.read_csv('/home/jackreid/Documents/School/Research/Space_Enabled/Code/Nightlights-Mobility/replica/replica-trends-east-palo-alto-ca-oct-6-2022 (1)/east-palo-alto--ca_spend-by-merchant-location_in-person-spend_tract_-full-week_from_week_of_dec-30--2019_to_week_of_sep-26--2022.csv')
+dfMob = gcl.load_replica_spend('/home/jackreid/Documents/School/Research/Space_Enabled/Code/Nightlights-Mobility/replica/replica-trends-east-palo-alto-ca-oct-6-2022 (1)/east-palo-alto--ca_spend-by-merchant-location_in-person-spend_tract_-full-week_from_week_of_dec-30--2019_to_week_of_sep-26--2022.csv')
+
+dfMob['Transactions'] = dfMob['restaurants_bars_spend_fullweek']
 
-dfMobTractList = [];
-for tract in censusTracts:
-    dfMobTractList.append(dfMob[(dfMob['tract'].str[0:4] == str(tract))])
+dfMobTractList = list(gcl.split_tracts(dfMob, 'NAME', censusTracts).values())
 
 dfMobPlotList = [];
 for dfTract in dfMobTractList:
     
-    for index, row in dfTract.iterrows():
-        dfTract.loc[index, 'Date'] = datetime.datetime.strptime(row['week_starting'], '%m-%d-%Y')
-        # mobArray = np.asarray([row['grocery_stores_spend_fullweek'],
-        #             row['workplaces_percent_change_from_baseline'],
-        #             row['retail_and_recreation_percent_change_from_baseline']])
-        # dfMob.loc[index, 'AvgMobility'] = np.average(mobArray)
-        dfTract.loc[index, 'Transactions'] = row['restaurants_bars_spend_fullweek']
-    dfTract.set_index('Date', inplace=True)
     df_jan2020 = dfTract[(dfTract.index > datetime.datetime(2020,1,2)) &
                     (dfTract.index < datetime.datetime(2020,2,7))]
     mob_baseline = [df_jan2020['Transactions'].mean()]